@@ -0,0 +1,272 @@
+"""Synthetic Project Generator.
+
+Generates a C++ project of a configurable size for benchmarking Cake.
+The project is built with a variant of the dummy compiler, so it builds
+anywhere without a real toolchain.
+
+Usage::
+  python generate.py [options] <projectDir>
+
+@see: Cake Build System (http://sourceforge.net/projects/cake-build)
+@copyright: Copyright (c) 2010 Lewis Baker, Stuart McMahon.
+@license: Licensed under the MIT license.
+"""
+
+import optparse
+import os
+import os.path
+import random
+import sys
+
+class ProjectParameters(object):
+  """The size and shape of a generated project.
+  """
+
+  sources = 500
+  """Total number of source files, spread evenly across the libraries.
+  @type: int
+  """
+  headers = 200
+  """Number of header files.
+  @type: int
+  """
+  includes = 10
+  """Number of headers included directly by each source file.
+  @type: int
+  """
+  headerIncludes = 2
+  """Number of headers included by each header. Headers only include
+  headers with a lower number, so there are no include cycles.
+  @type: int
+  """
+  libraries = 10
+  """Number of static libraries.
+  @type: int
+  """
+  programs = 2
+  """Number of programs. Each program links every library.
+  @type: int
+  """
+  seed = 1
+  """Seed used to choose the includes, so a project can be regenerated
+  exactly.
+  @type: int
+  """
+
+  def __init__(self, **keywords):
+    for name, value in keywords.items():
+      if not hasattr(ProjectParameters, name):
+        raise TypeError("Unknown parameter '%s'" % name)
+      setattr(self, name, value)
+
+  def asDict(self):
+    """Get the parameters as a dictionary.
+
+    @rtype: dict of string->int
+    """
+    return dict(
+      (name, getattr(self, name))
+      for name in _parameterNames
+      )
+
+_parameterNames = [
+  "sources",
+  "headers",
+  "includes",
+  "headerIncludes",
+  "libraries",
+  "programs",
+  "seed",
+  ]
+
+_configScript = '''\
+import re
+
+from cake.engine import Variant
+from cake.script import Script
+from cake.library.compilers.dummy import DummyCompiler
+
+_includeRe = re.compile(r'^#include "(.+)"', re.MULTILINE)
+
+class BenchmarkCompiler(DummyCompiler):
+  """Dummy compiler that scans sources for their included headers, so
+  that objects depend on their headers as they would with a real
+  compiler.
+  """
+
+  def getObjectCommands(self, target, source, pch, shared):
+    compile, args, canBeCached = DummyCompiler.getObjectCommands(
+      self, target, source, pch, shared
+      )
+
+    def compileAndScan():
+      dependencies = compile()
+      abspath = self.configuration.abspath
+      pending = [source]
+      seen = set(pending)
+      while pending:
+        f = open(abspath(pending.pop()), "rt")
+        try:
+          text = f.read()
+        finally:
+          f.close()
+        for header in _includeRe.findall(text):
+          header = "include/" + header
+          if header not in seen:
+            seen.add(header)
+            pending.append(header)
+            dependencies.append(header)
+      return dependencies
+
+    return compileAndScan, args, canBeCached
+
+configuration = Script.getCurrent().configuration
+
+compiler = BenchmarkCompiler(configuration=configuration)
+compiler.addIncludePath("include")
+compiler.objectCachePath = configuration.abspath("cache")
+compiler.cacheAllOutputs = True
+
+variant = Variant()
+variant.tools["compiler"] = compiler
+configuration.addVariant(variant)
+'''
+
+_buildScript = '''\
+from cake.tools import compiler
+
+libraries = []
+%(libraries)s
+%(programs)s
+'''
+
+def _writeFile(path, text):
+  dirPath = os.path.dirname(path)
+  if not os.path.isdir(dirPath):
+    os.makedirs(dirPath)
+  f = open(path, "wt")
+  try:
+    f.write(text)
+  finally:
+    f.close()
+
+def generateProject(projectDir, parameters):
+  """Generate a synthetic project.
+
+  @param projectDir: The directory to generate the project in.
+  @type projectDir: string
+
+  @param parameters: The size and shape of the project.
+  @type parameters: L{ProjectParameters}
+
+  @return: The path of the header included by the most source files,
+  relative to projectDir.
+  @rtype: string
+  """
+  rand = random.Random(parameters.seed)
+  headerCount = max(parameters.headers, 1)
+  includeCounts = [0] * headerCount
+
+  for i in xrange(headerCount):
+    lines = ["#pragma once"]
+    for h in rand.sample(xrange(i), min(i, parameters.headerIncludes)):
+      lines.append('#include "h%i.h"' % h)
+    lines.append("int h%i(int x);" % i)
+    _writeFile(
+      os.path.join(projectDir, "include", "h%i.h" % i),
+      "\n".join(lines) + "\n",
+      )
+
+  libraryCount = max(parameters.libraries, 1)
+  libraryLines = []
+  for l in xrange(libraryCount):
+    sources = []
+    for s in xrange(l, parameters.sources, libraryCount):
+      headers = rand.sample(
+        xrange(headerCount),
+        min(headerCount, parameters.includes),
+        )
+      lines = []
+      for h in headers:
+        includeCounts[h] += 1
+        lines.append('#include "h%i.h"' % h)
+      lines.append("int s%i(int x) { return x + %i; }" % (s, s))
+      sourcePath = "lib%i/s%i.cpp" % (l, s)
+      _writeFile(os.path.join(projectDir, sourcePath), "\n".join(lines) + "\n")
+      sources.append(sourcePath)
+
+    libraryLines.append(
+      "libraries.append(compiler.library(\n"
+      "  target='build/lib/lib%i',\n"
+      "  sources=compiler.objects(\n"
+      "    targetDir='build/obj/lib%i',\n"
+      "    sources=%r,\n"
+      "    ),\n"
+      "  ))" % (l, l, sources)
+      )
+
+  programLines = []
+  for p in xrange(parameters.programs):
+    sourcePath = "prog%i/main.cpp" % p
+    _writeFile(
+      os.path.join(projectDir, sourcePath),
+      "int main() { return 0; }\n",
+      )
+    programLines.append(
+      "compiler.program(\n"
+      "  target='build/bin/prog%i',\n"
+      "  sources=compiler.objects(targetDir='build/obj/prog%i', sources=[%r]) + libraries,\n"
+      "  )" % (p, p, sourcePath)
+      )
+
+  _writeFile(os.path.join(projectDir, "config.cake"), _configScript)
+  _writeFile(
+    os.path.join(projectDir, "build.cake"),
+    _buildScript % {
+      "libraries": "\n".join(libraryLines),
+      "programs": "\n".join(programLines),
+      },
+    )
+
+  mostIncluded = includeCounts.index(max(includeCounts))
+  return "include/h%i.h" % mostIncluded
+
+def addParameterOptions(parser):
+  """Add an option for each project parameter to an OptionParser.
+
+  @param parser: The parser to add the options to.
+  @type parser: optparse.OptionParser
+  """
+  for name in _parameterNames:
+    parser.add_option(
+      "--" + name,
+      dest=name,
+      type="int",
+      default=getattr(ProjectParameters, name),
+      help="default: %default",
+      )
+
+def getParameters(options):
+  """Get the project parameters from parsed options.
+
+  @param options: Options parsed by a parser passed to
+  L{addParameterOptions}.
+
+  @rtype: L{ProjectParameters}
+  """
+  return ProjectParameters(**dict(
+    (name, getattr(options, name)) for name in _parameterNames
+    ))
+
+def main(args):
+  parser = optparse.OptionParser(usage="%prog [options] <projectDir>")
+  addParameterOptions(parser)
+  options, args = parser.parse_args(args)
+  if len(args) != 1:
+    parser.error("expected a project directory")
+
+  generateProject(args[0], getParameters(options))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
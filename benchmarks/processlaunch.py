@@ -0,0 +1,160 @@
+"""Process Launch Benchmark.
+
+Measures the overhead of launching many tiny compiles the way Cake does,
+comparing a command run through a shell (shell=True, as Cake runs
+commands whose arguments need escaping) with the program executed
+directly (as Cake runs all other commands on POSIX).
+
+Each mode compiles an empty C file the given number of times, running
+as many compiles at once as there are jobs. The results are written as
+JSON so they can be compared between runs.
+
+Usage::
+  python processlaunch.py [options]
+
+@see: Cake Build System (http://sourceforge.net/projects/cake-build)
+@copyright: Copyright (c) 2010 Lewis Baker, Stuart McMahon.
+@license: Licensed under the MIT license.
+"""
+
+import json
+import optparse
+import os
+import os.path
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(rootDir, "src"))
+
+import cake.supervisor
+
+from cake.library.compilers import _escapeArgs
+
+def runLaunches(supervisor, args, count, shell, cwd):
+  """Run a command many times and return how long it took.
+
+  @param supervisor: The supervisor to run the processes with.
+  @type supervisor: L{cake.supervisor.ProcessSupervisor}
+
+  @param args: The arguments of the command.
+  @type args: list of string
+
+  @param count: The number of times to run the command.
+  @type count: int
+
+  @param shell: Whether to run the command through a shell.
+  @type shell: bool
+
+  @param cwd: The directory to run the command in.
+  @type cwd: string
+
+  @return: The total wall time in seconds.
+  @rtype: float
+  """
+  if shell:
+    popenArgs = " ".join(_escapeArgs(args))
+  else:
+    popenArgs = list(args)
+
+  failures = []
+  finished = threading.Semaphore(0)
+  def callback(result):
+    if result.exitCode != 0:
+      failures.append(result)
+    finished.release()
+
+  startTime = time.time()
+  for _ in xrange(count):
+    supervisor.run(popenArgs, callback, shell=shell, cwd=cwd)
+  for _ in xrange(count):
+    finished.acquire()
+  wallTime = time.time() - startTime
+
+  if failures:
+    result = failures[0]
+    raise RuntimeError("%s failed: %s" % (
+      args[0], result.error or result.stderr))
+  return wallTime
+
+def main(args):
+  parser = optparse.OptionParser(usage="%prog [options]")
+  parser.add_option(
+    "-n", "--count",
+    dest="count",
+    type="int",
+    default=2000,
+    help="Number of compiles to run in each mode (default: %default).",
+    )
+  parser.add_option(
+    "-j", "--jobs",
+    dest="jobs",
+    type="int",
+    default=8,
+    help="Number of compiles to run at once (default: %default).",
+    )
+  parser.add_option(
+    "--compiler",
+    dest="compiler",
+    default="/usr/bin/cc",
+    help="The compiler to run (default: %default).",
+    )
+  parser.add_option(
+    "-o", "--output",
+    dest="output",
+    default=None,
+    help="Write the JSON results to OUTPUT rather than stdout.",
+    metavar="OUTPUT",
+    )
+  options, args = parser.parse_args(args)
+  if args:
+    parser.error("unexpected arguments: %s" % " ".join(args))
+  if not cake.supervisor.isAvailable():
+    parser.error("process launching can only be compared on POSIX")
+
+  workDir = tempfile.mkdtemp(prefix="cakelaunch")
+  try:
+    f = open(os.path.join(workDir, "empty.c"), "wt")
+    try:
+      f.write("int empty;\n")
+    finally:
+      f.close()
+    compileArgs = [options.compiler, "-c", "empty.c", "-o", os.devnull]
+
+    supervisor = cake.supervisor.ProcessSupervisor(options.jobs)
+    scenarios = {}
+    for name, shell in (("shell", True), ("direct", False)):
+      wallTime = runLaunches(supervisor, compileArgs, options.count, shell, workDir)
+      scenarios[name] = {
+        "wallTime": wallTime,
+        "msPerCompile": wallTime * 1000.0 / options.count,
+        }
+  finally:
+    shutil.rmtree(workDir)
+
+  results = {
+    "count": options.count,
+    "jobs": options.jobs,
+    "compiler": options.compiler,
+    "python": platform.python_version(),
+    "platform": sys.platform,
+    "scenarios": scenarios,
+    }
+  text = json.dumps(results, indent=2, sort_keys=True, separators=(",", ": "))
+
+  if options.output:
+    f = open(options.output, "wt")
+    try:
+      f.write(text + "\n")
+    finally:
+      f.close()
+  else:
+    sys.stdout.write(text + "\n")
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,212 @@
+"""Build Benchmarks.
+
+Generates a synthetic project and measures how long Cake takes to build
+it in several scenarios:
+  - cold: Build from scratch with an empty object cache.
+  - null: Build again with nothing changed.
+  - touchHeader: Rebuild after changing the most included header.
+  - objectCacheHit: Rebuild after deleting the build outputs, so every
+    object is restored from the object cache.
+
+The results are written as JSON so they can be compared between runs.
+
+Usage::
+  python runbenchmarks.py [options]
+
+@see: Cake Build System (http://sourceforge.net/projects/cake-build)
+@copyright: Copyright (c) 2010 Lewis Baker, Stuart McMahon.
+@license: Licensed under the MIT license.
+"""
+
+import json
+import optparse
+import os
+import os.path
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import generate
+
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+runScript = os.path.join(rootDir, "src", "run.py")
+
+# Metrics reported by 'cake --metrics-json' that are included in results.
+_metricNames = [
+  "buildTime",
+  "scriptExecutionTime",
+  "scriptsExecuted",
+  "targetsChecked",
+  "targetsRebuilt",
+  "objectCacheHits",
+  "objectCacheMisses",
+  "subprocesses",
+  ]
+
+def _runProcess(args, cwd):
+  """Run a process and return its exit code and peak RSS.
+
+  @return: A tuple of the exit code and the peak resident set size of
+  the process in kilobytes, or None if it can't be measured on this
+  platform.
+  """
+  devNull = open(os.devnull, "w")
+  try:
+    p = subprocess.Popen(args=args, cwd=cwd, stdout=devNull, stderr=subprocess.STDOUT)
+  finally:
+    devNull.close()
+
+  if hasattr(os, "wait4"):
+    pid, status, rusage = os.wait4(p.pid, 0)
+    p.returncode = os.WEXITSTATUS(status)
+    peakRss = rusage.ru_maxrss
+    if sys.platform == "darwin":
+      peakRss //= 1024 # Reported in bytes rather than kilobytes
+    return p.returncode, peakRss
+  else:
+    return p.wait(), None
+
+def runCake(projectDir, jobs):
+  """Build a project and return measurements of the build.
+
+  @param projectDir: The directory of the project to build.
+  @type projectDir: string
+
+  @param jobs: The number of jobs to build with.
+  @type jobs: int
+
+  @return: A dictionary of measurement names to values.
+  @rtype: dict
+  """
+  metricsPath = os.path.join(projectDir, "metrics.json")
+  args = [
+    sys.executable,
+    runScript,
+    "-j%i" % jobs,
+    "--metrics-json=" + metricsPath,
+    ]
+
+  startTime = time.time()
+  exitCode, peakRss = _runProcess(args, projectDir)
+  wallTime = time.time() - startTime
+
+  if exitCode != 0:
+    raise RuntimeError("cake failed with exit code %i" % exitCode)
+
+  f = open(metricsPath, "rt")
+  try:
+    metrics = json.load(f)
+  finally:
+    f.close()
+
+  result = {
+    "wallTime": wallTime,
+    "peakRssKb": peakRss,
+    }
+  for name in _metricNames:
+    result[name] = metrics.get(name, 0)
+  return result
+
+def _touchFile(path):
+  f = open(path, "at")
+  try:
+    f.write("// touched\n")
+  finally:
+    f.close()
+  # Make sure the timestamp changes even on file systems with a coarse
+  # timestamp resolution.
+  now = time.time() + 2
+  os.utime(path, (now, now))
+
+def runBenchmarks(projectDir, parameters, jobs):
+  """Generate a project and run each benchmark scenario against it.
+
+  @param projectDir: The directory to generate the project in. It
+  should be empty or not exist.
+  @type projectDir: string
+
+  @param parameters: The size and shape of the project.
+  @type parameters: L{generate.ProjectParameters}
+
+  @param jobs: The number of jobs to build with.
+  @type jobs: int
+
+  @return: A dictionary of scenario names to measurements.
+  @rtype: dict
+  """
+  header = generate.generateProject(projectDir, parameters)
+
+  results = {}
+  results["cold"] = runCake(projectDir, jobs)
+  results["null"] = runCake(projectDir, jobs)
+
+  _touchFile(os.path.join(projectDir, header))
+  results["touchHeader"] = runCake(projectDir, jobs)
+
+  shutil.rmtree(os.path.join(projectDir, "build"))
+  results["objectCacheHit"] = runCake(projectDir, jobs)
+
+  return results
+
+def main(args):
+  parser = optparse.OptionParser(usage="%prog [options]")
+  generate.addParameterOptions(parser)
+  parser.add_option(
+    "-j", "--jobs",
+    dest="jobs",
+    type="int",
+    default=1,
+    help="Number of jobs to build with (default: %default).",
+    )
+  parser.add_option(
+    "-o", "--output",
+    dest="output",
+    default=None,
+    help="Write the JSON results to OUTPUT rather than stdout.",
+    metavar="OUTPUT",
+    )
+  parser.add_option(
+    "--keep",
+    dest="keep",
+    action="store_true",
+    default=False,
+    help="Don't delete the generated project when finished.",
+    )
+  options, args = parser.parse_args(args)
+  if args:
+    parser.error("unexpected arguments: %s" % " ".join(args))
+
+  parameters = generate.getParameters(options)
+  projectDir = tempfile.mkdtemp(prefix="cakebench")
+  try:
+    scenarios = runBenchmarks(projectDir, parameters, options.jobs)
+  finally:
+    if options.keep:
+      sys.stderr.write("Project kept in %s\n" % projectDir)
+    else:
+      shutil.rmtree(projectDir)
+
+  results = {
+    "parameters": parameters.asDict(),
+    "jobs": options.jobs,
+    "python": platform.python_version(),
+    "platform": sys.platform,
+    "scenarios": scenarios,
+    }
+  text = json.dumps(results, indent=2, sort_keys=True, separators=(",", ": "))
+
+  if options.output:
+    f = open(options.output, "wt")
+    try:
+      f.write(text + "\n")
+    finally:
+      f.close()
+  else:
+    sys.stdout.write(text + "\n")
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,6 @@
+#ifndef FOO_H_INCLUDED
+#define FOO_H_INCLUDED
+
+extern int Foo(int x);
+
+#endif
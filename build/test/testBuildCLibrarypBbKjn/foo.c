@@ -0,0 +1,6 @@
+#include "foo.h"
+
+int Foo(int x)
+{
+  return x * x;
+}
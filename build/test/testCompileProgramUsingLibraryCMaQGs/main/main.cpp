@@ -0,0 +1,7 @@
+#include "printer.h"
+
+int main()
+{
+    printText("Hello world!\n");
+    return 0;
+}
@@ -0,0 +1,6 @@
+#ifndef PRINTER_INCLUDED_H
+#define PRINTER_INCLUDED_H
+
+void printText(const char *text);
+
+#endif
@@ -0,0 +1,8 @@
+#include "printer.h"
+
+#include <stdio.h>
+
+void printText(const char *text)
+{
+	printf("%s", text);
+}
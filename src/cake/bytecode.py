@@ -11,7 +11,11 @@ import marshal
 import os
 import sys
 import struct
-import platform
+import tempfile
+import threading
+import time
+
+import cake.hash
 
 # Magic header written at start of file
 _MAGIC = imp.get_magic()
@@ -21,7 +25,7 @@ _NOTMAGIC = '\0' * _MAGIC_LEN
 assert _MAGIC != _NOTMAGIC
 
 # Define an internal helper according to the platform
-if platform.system() in ['Darwin']:
+if sys.platform == 'darwin':
   import MacOS
   def _setCreatorType(file):
     MacOS.SetCreatorAndType(file, 'Pyth', 'PYC ')
@@ -117,3 +121,178 @@ def loadCode(file, cfile=None, dfile=None, cached=True):
       pass
   
   return codeobject
+
+class ByteCodePack(object):
+  """A single file that caches the byte code of many scripts.
+
+  The whole pack is read with a single read when first used and written
+  back by L{save}, dropping any scripts that no longer exist. A
+  script's cached byte code is used if the script's size and
+  modification time are unchanged. Otherwise, or if the script was
+  modified so recently that its timestamp can't be trusted, the script
+  is read and its digest compared with the one that was cached.
+
+  Usage::
+    pack = ByteCodePack("/path/to/scripts.pack")
+    code = pack.loadCode("/path/to/build.cake")
+    pack.save()
+  """
+
+  MAGIC = "CKBP".encode("latin-1")
+  """A magic value stored at the start of pack files to ensure they are
+  valid.
+  """
+
+  racyTime = 2.0
+  """Scripts modified less than this many seconds before they were
+  cached are always checked by digest, as they may have been modified
+  again without their timestamp changing.
+  @type: float
+  """
+
+  def __init__(self, path):
+    """Construct a pack that reads from and writes to the given file.
+
+    @param path: The path of the pack file.
+    @type path: string
+    """
+    self.path = path
+    self._lock = threading.Lock()
+    self._entries = None
+    self._modified = False
+
+  def _getEntries(self):
+    self._lock.acquire()
+    try:
+      if self._entries is None:
+        self._entries = self._load()
+      return self._entries
+    finally:
+      self._lock.release()
+
+  def _load(self):
+    try:
+      f = open(self.path, "rb")
+      try:
+        data = f.read()
+      finally:
+        f.close()
+    except EnvironmentError:
+      return {}
+
+    header = self.MAGIC + _MAGIC
+    if not data.startswith(header):
+      return {} # Different format or Python version
+    try:
+      entries = marshal.loads(data[len(header):])
+    except Exception:
+      return {}
+    if not isinstance(entries, dict):
+      return {}
+    return entries
+
+  def loadCode(self, file, dfile=None):
+    """Load the code object for the specified python file.
+
+    @param file: Absolute path of the source file to load.
+    @type file: string
+
+    @param dfile: If specified, the path of the file to show in error
+    messages. Defaults to C{file}.
+    @type dfile: string
+
+    @return: The code object resulting from compiling the python source
+    file. This can be executed by the 'exec' statement/function.
+    """
+    entries = self._getEntries()
+    self._lock.acquire()
+    try:
+      entry = entries.get(file, None)
+    finally:
+      self._lock.release()
+
+    stat = os.stat(file)
+    if entry is not None:
+      size, mtime, digest, cacheTime, codeString = entry
+      if size == stat.st_size and \
+        mtime == stat.st_mtime and \
+        cacheTime - mtime > self.racyTime:
+        return marshal.loads(codeString)
+
+    f = open(file, "rU")
+    try:
+      codestring = f.read()
+    finally:
+      f.close()
+    newDigest = cake.hash.sha1(codestring).digest()
+
+    if entry is not None and entry[2] == newDigest:
+      # Only the timestamp changed (eg. after a checkout).
+      codeString = entry[4]
+      codeobject = marshal.loads(codeString)
+    else:
+      # Source needs a trailing newline to compile correctly
+      if not codestring.endswith('\n'):
+        codestring = codestring + '\n'
+      codeobject = __builtin__.compile(codestring, dfile or file, 'exec')
+      codeString = marshal.dumps(codeobject)
+
+    newEntry = (stat.st_size, stat.st_mtime, newDigest, time.time(), codeString)
+    self._lock.acquire()
+    try:
+      entries[file] = newEntry
+      self._modified = True
+    finally:
+      self._lock.release()
+
+    return codeobject
+
+  def save(self):
+    """Save the pack file if any scripts were compiled or restamped since
+    it was loaded, or if it holds scripts that no longer exist.
+
+    Scripts that weren't loaded by this build are kept, as a build of
+    one part of a tree (or another build sharing the cache) won't load
+    them all. Only scripts that have been renamed or deleted are dropped.
+
+    @raise EnvironmentError: If the pack file could not be written.
+    """
+    self._lock.acquire()
+    try:
+      if self._entries is None:
+        return
+      stale = [f for f in self._entries if not os.path.isfile(f)]
+      if not self._modified and not stale:
+        return
+      for f in stale:
+        del self._entries[f]
+      data = self.MAGIC + _MAGIC + marshal.dumps(self._entries)
+      self._modified = False
+    finally:
+      self._lock.release()
+
+    dirPath = os.path.dirname(self.path)
+    if dirPath and not os.path.isdir(dirPath):
+      os.makedirs(dirPath)
+
+    # Write to a uniquely named temporary file first so a failed write
+    # can't leave a truncated pack behind and concurrent builds sharing
+    # the cache don't write to the same file.
+    fd, tmpPath = tempfile.mkstemp(
+      prefix=os.path.basename(self.path) + ".",
+      suffix=".tmp",
+      dir=dirPath or os.curdir,
+      )
+    try:
+      f = os.fdopen(fd, "wb")
+      try:
+        f.write(data)
+      finally:
+        f.close()
+      if os.path.exists(self.path):
+        os.remove(self.path) # Windows can't rename over an existing file.
+      os.rename(tmpPath, self.path)
+    except:
+      if os.path.exists(tmpPath):
+        os.remove(tmpPath)
+      raise
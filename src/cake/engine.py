@@ -6,6 +6,7 @@
 """
 
 import codecs
+import collections
 import threading
 import traceback
 import sys
@@ -24,6 +25,7 @@ import cake.task
 import cake.path
 import cake.hash
 import cake.filesys
+import cake.stats
 import cake.threadpool
 
 from cake.script import Script as _Script
@@ -41,6 +43,194 @@ class DependencyInfoError(Exception):
   """
   pass
 
+# Version of the directory cache file format.
+_directoryCacheVersion = 1
+
+# Directories modified less than this many seconds before being listed
+# are not cached.
+_directoryCacheRacyTime = 2.0
+
+def _internPath(path):
+  """Intern a path string so equal paths share a single object.
+  
+  Unicode paths can't be interned and are returned unchanged.
+  """
+  if type(path) is str:
+    return intern(path)
+  return path
+
+def _loadDependencyInfo(depPath):
+  """Load a dependency info file.
+
+  @param depPath: The path of the dependency info file.
+  @type depPath: string
+
+  @return: The DependencyInfo object stored in the file.
+  @rtype: L{DependencyInfo}
+
+  @raise DependencyInfoError: if the dependency info could not be loaded.
+  """
+  # Read entire file at once otherwise thread-switching will kill performance.
+  try:
+    fileContents = cake.filesys.readFile(depPath)
+  except EnvironmentError:
+    raise DependencyInfoError("doesn't exist")
+  
+  # Split magic signature from the pickled dependency info.
+  magicLength = len(DependencyInfo.MAGIC)
+  dependencyString = fileContents[:-magicLength]
+  dependencyMagic = fileContents[-magicLength:]
+  
+  if dependencyMagic != DependencyInfo.MAGIC:
+    raise DependencyInfoError("has an invalid signature")
+
+  try:      
+    dependencyInfo = pickle.loads(dependencyString)
+  except:
+    raise DependencyInfoError("could not be understood")
+  
+  # Check that the dependency info is valid  
+  if not isinstance(dependencyInfo, DependencyInfo):
+    raise DependencyInfoError("has an invalid instance")
+
+  if dependencyInfo.version != DependencyInfo.VERSION:
+    raise DependencyInfoError("version has changed")
+
+  return dependencyInfo
+
+def _checkDependencies(dependencyInfo, args, abspath, getTimestamp, getDigest=None):
+  """Check the args, targets and dependencies of a DependencyInfo.
+
+  If getDigest is given then a dependency whose timestamp has changed is
+  only considered changed if its digest differs from the one recorded in
+  the DependencyInfo. The recorded timestamp of a dependency whose
+  contents haven't changed is updated in the DependencyInfo.
+
+  @return: A tuple of the string reason to build or None if the target
+  is up to date, and True if any recorded timestamps were updated.
+  @rtype: tuple of (string or None, bool)
+  """
+  if args != dependencyInfo.args:
+    return "'" + repr(args) + "' != '" + repr(dependencyInfo.args) + "'", False
+  
+  # Targets may be files or directories.
+  exists = cake.filesys.exists
+  for target in dependencyInfo.targets:
+    if not exists(abspath(target)):
+      return "'" + target + "' doesn't exist", False
+  
+  paths = dependencyInfo.depPaths
+  timestamps = dependencyInfo.depTimestamps
+  digests = dependencyInfo.depDigests
+  if getDigest is None or digests is None:
+    getDigest = None
+  assert len(paths) == len(timestamps)
+  refreshed = False
+  for i in xrange(len(paths)):
+    path = paths[i]
+    try:
+      timestamp = getTimestamp(abspath(path))
+      if timestamp != timestamps[i]:
+        if getDigest is None or getDigest(abspath(path)) != digests[i]:
+          return "'" + path + "' has been changed", False
+        timestamps[i] = timestamp
+        refreshed = True
+    except EnvironmentError:
+      return "'" + path + "' no longer exists", False
+  
+  return None, refreshed
+
+def _checkDependencyInfoJob(depPath, targetPath, args, baseDir, checkDigests=False):
+  """Process pool job that checks if a target is up to date.
+
+  Timestamps are not cached between jobs as the worker process is not
+  notified when files are changed by the build.
+
+  @return: A tuple of the string reason to build or None if the target
+  is up to date, and True if the dependency info was updated because
+  dependencies were found to be unchanged by comparing digests.
+  @rtype: tuple of (string or None, bool)
+  """
+  try:
+    dependencyInfo = _loadDependencyInfo(depPath)
+  except DependencyInfoError, e:
+    return "'" + targetPath + ".dep' " + str(e), False
+
+  def abspath(path):
+    if not os.path.isabs(path):
+      path = os.path.join(baseDir, path)
+    return path
+
+  timestamps = {}
+  def getTimestamp(path):
+    timestamp = timestamps.get(path, None)
+    if timestamp is None:
+      timestamp = timestamps[path] = os.stat(path).st_mtime
+    return timestamp
+
+  if checkDigests:
+    getDigest = _calculateFileDigest
+  else:
+    getDigest = None
+
+  reasonToBuild, refreshed = _checkDependencies(
+    dependencyInfo,
+    args,
+    abspath,
+    getTimestamp,
+    getDigest,
+    )
+  if reasonToBuild is None and refreshed:
+    _storeDependencyInfo(depPath, dependencyInfo)
+  return reasonToBuild, refreshed
+
+def _storeDependencyInfo(depPath, dependencyInfo):
+  """Store a dependency info file.
+
+  @param depPath: The path of the dependency info file.
+  @type depPath: string
+
+  @param dependencyInfo: The dependency info object to store.
+  @type dependencyInfo: L{DependencyInfo}
+  """
+  dependencyString = pickle.dumps(dependencyInfo, pickle.HIGHEST_PROTOCOL)
+  cake.filesys.writeFile(depPath, dependencyString + DependencyInfo.MAGIC)
+
+def _setModificationTime(path, timestamp):
+  """Set the modification time of a file.
+
+  os.utime() truncates the time to whole microseconds so half a
+  microsecond is added to round it instead. Otherwise setting a timestamp
+  read back from os.stat() can set a time a microsecond earlier.
+
+  @param path: The path of the file.
+  @type path: string
+  @param timestamp: The new modification time in seconds since the epoch.
+  @type timestamp: float
+  """
+  os.utime(path, (time.time(), timestamp + 0.0000005))
+
+def _calculateFileDigest(path):
+  """Calculate the SHA1 digest of a file's contents.
+
+  @param path: Path of the file to digest.
+  @type path: string
+
+  @return: The SHA1 digest of the file's contents.
+  @rtype: string of 20 bytes
+  """
+  hasher = cake.hash.sha1()
+  f = open(path, 'rb')
+  try:
+    blockSize = 512 * 1024
+    data = f.read(blockSize)
+    while data:
+      hasher.update(data)
+      data = f.read(blockSize)
+  finally:
+    f.close()
+  return hasher.digest()
+
 class Variant(object):
   """A container for build configuration information.
   
@@ -132,6 +322,61 @@ class Variant(object):
     v.tools = dict((name, tool.clone()) for name, tool in self.tools.iteritems())
     return v
 
+class ResourcePool(object):
+  """Limits how many tasks that use a resource execute at once.
+  
+  Tasks waiting for the pool are queued rather than blocking a thread,
+  and a task keeps its place in the pool until it and any tasks it
+  completes after have finished, eg. until the process it runs exits.
+  
+  @ivar name: The name of the pool.
+  @type name: string
+  @ivar depth: The maximum number of tasks executed at once.
+  @type depth: int
+  """
+  
+  def __init__(self, name, depth):
+    self.name = name
+    self.depth = depth
+    self._lock = threading.Lock()
+    self._queue = collections.deque()
+    self._running = 0
+    
+  def start(self, task):
+    """Start a task once the pool has room for it.
+    
+    @param task: The task to start.
+    @type task: L{Task}
+    """
+    self._lock.acquire()
+    try:
+      if self._running >= self.depth:
+        self._queue.append(task)
+        return
+      self._running += 1
+    finally:
+      self._lock.release()
+    
+    self._startTask(task)
+    
+  def _startTask(self, task):
+    task.addCallback(self._taskCompleted)
+    task.start(immediate=True)
+    
+  def _taskCompleted(self):
+    self._lock.acquire()
+    try:
+      if self._queue and self._running <= self.depth:
+        task = self._queue.popleft()
+      else:
+        task = None
+        self._running -= 1
+    finally:
+      self._lock.release()
+    
+    if task is not None:
+      self._startTask(task)
+
 class Engine(object):
   """Main object that holds all of the singleton resources for a build.
   
@@ -143,6 +388,22 @@ class Engine(object):
   Python code on the same thread we can avoid the expensive GIL locking.  
   @type scriptThreadPool: L{ThreadPool}
 
+  @ivar processPool: An optional pool of worker processes used to check
+  dependencies, calculate file digests and parse large dependency files
+  outside of the GIL. If None then this work is done in-process.
+  @type processPool: L{ProcessPool} or None
+
+  @ivar processSupervisor: An optional supervisor that runs the build's
+  child processes. Tools that support it can then wait for a process
+  without blocking a worker thread; the rest still block a thread while
+  their process runs. If None then each process is waited on by a
+  worker thread.
+  @type processSupervisor: L{ProcessSupervisor} or None
+
+  @ivar stats: Counters and timings collected over the course of the build.
+  Statistics are only collected once they have been enabled.
+  @type stats: L{Statistics}
+
   @ivar logger: The object used to output build messages.
   @type logger: L{Logger}
 
@@ -165,6 +426,8 @@ class Engine(object):
   The absolute path to the directory that should store
   script cache files. If None the script cache files will be put next to the
   script files themselves with a different extension (usually .cakec).
+  Otherwise the byte code of every script is stored in a single pack file
+  in this directory that is saved at the end of the build.
   @type: string or None
   """
   dependencyInfoPath = None
@@ -175,10 +438,53 @@ class Engine(object):
   target files themselves with a different extension (usually .dep).
   @type: string or None
   """
+  directoryCachePath = None
+  """Path to the directory listing cache file.
+  
+  The absolute path of a file used to store directory listings between
+  builds. A cached listing is reused for as long as the modification time
+  of its directory is unchanged. If None listings are only cached for the
+  duration of the build.
+  @type: string or None
+  """
   
   forceBuild = False
+  checkDigests = False
+  """Compare the contents of dependencies whose timestamps have changed.
+  
+  If True then the digests of dependencies are recorded in all dependency
+  info files. A dependency whose timestamp has changed since a target was
+  built is only considered changed if its contents have changed too, eg.
+  a file that was checked out again or extracted again from an archive
+  won't cause a rebuild. The dependency info is updated with the new
+  timestamps so the contents aren't compared again in the next build.
+  
+  This applies to every target checked against its dependency info,
+  including archives extracted by
+  L{cake.library.zipping.ZipTool.extract}. Files copied by
+  L{cake.library.filesys.FileSystemTool} and members added to an archive
+  by L{cake.library.zipping.ZipTool.compress} are still compared with
+  their sources by timestamp.
+  @type: bool
+  """
+  parallelScripts = False
+  """Execute independent scripts concurrently.
+  
+  If True then each build script is executed on the default thread pool
+  rather than on the single-threaded scriptThreadPool. This can speed up
+  the evaluation of large trees of scripts that spend time waiting on I/O,
+  at the cost of some GIL contention. Scripts included by another script
+  are still executed on the including script's thread.
+  @type: bool
+  """
   defaultConfigScriptName = "config.cake"
   maximumErrorCount = None
+  processPoolDigestThreshold = 16
+  """The minimum number of uncached file digests that will be calculated
+  using the process pool. Smaller batches are calculated in-process.
+
+  @type: int
+  """
   
   def __init__(self, logger, parser, args):
     """Default Constructor.
@@ -187,8 +493,17 @@ class Engine(object):
     self._timestampCache = {}
     self._digestCache = {}
     self._searchUpCache = {}
+    self._byteCodePack = None
+    self._byteCodePackLock = threading.Lock()
+    self._directoryCache = None
+    self._directoryCacheLock = threading.Lock()
+    self._directoryCacheModified = False
     self._configurations = {}
+    self._configurationsLock = threading.RLock()
     self.scriptThreadPool = cake.threadpool.ThreadPool(1)
+    self.processPool = None
+    self.processSupervisor = None
+    self.stats = cake.stats.Statistics(enabled=False)
     self.errors = []
     self.warnings = []
     self.failedTargets = []
@@ -199,6 +514,21 @@ class Engine(object):
     self.oscwd = os.getcwd() # Save original cwd in case someone changes it.
     self.buildSuccessCallbacks = []
     self.buildFailureCallbacks = []
+    self._resourcePools = {}
+    self._resourcePoolsLock = threading.Lock()
+
+  @property
+  def dependencyThreadPool(self):
+    """The thread pool that build tasks should check dependencies on.
+
+    This is the scriptThreadPool unless a process pool is in use, in which
+    case dependency checks are spread across the default thread pool so
+    that many checks can wait on the worker processes at once.
+    """
+    if self.processPool is None:
+      return self.scriptThreadPool
+    else:
+      return cake.task.getDefaultThreadPool()
 
   @property
   def errorCount(self):
@@ -291,22 +621,26 @@ class Engine(object):
     """
     configuration = self._configurations.get(path, None)
     if configuration is None:
-      # Note that we are potentially executing the configuration
-      # script multiple times, but will only keep the Configuration
-      # object that is registered first in self._configurations
-      # dictionary below. This avoids needing a separate mutex
-      # for configuration execution.
-      configuration = Configuration(path=path, engine=self)
-      script = _Script(
-        path=cake.path.baseName(path),
-        configuration=configuration,
-        variant=None,
-        engine=self,
-        task=None,
-        parent=None,
-        )
-      script.execute()
-      configuration = self._configurations.setdefault(path, configuration)
+      # Scripts may be executed in parallel (see parallelScripts) so
+      # make sure each config script is only executed once. The lock is
+      # reentrant as a config script may itself get other configurations.
+      self._configurationsLock.acquire()
+      try:
+        configuration = self._configurations.get(path, None)
+        if configuration is None:
+          configuration = Configuration(path=path, engine=self)
+          script = _Script(
+            path=cake.path.baseName(path),
+            configuration=configuration,
+            variant=None,
+            engine=self,
+            task=None,
+            parent=None,
+            )
+          script.execute()
+          self._configurations[path] = configuration
+      finally:
+        self._configurationsLock.release()
     return configuration
   
   def findConfiguration(self, path, configScriptName=None):
@@ -419,7 +753,60 @@ class Engine(object):
     for callback in self.buildFailureCallbacks:
       callback()
 
-  def createTask(self, func=None):
+  def addResourcePool(self, name, depth):
+    """Declare a named pool that limits how many tasks using it execute
+    at once.
+    
+    Tools can then run their heavier commands in the pool, eg. with
+    C{compiler.linkPool = "link"} or C{shell.run(..., pool="heavy_io")}.
+    Declaring a pool that already exists changes its depth.
+    
+    @param name: The name of the pool.
+    @type name: string
+    
+    @param depth: The maximum number of tasks that execute in the pool at
+    once.
+    @type depth: int
+    
+    @return: The pool.
+    @rtype: L{ResourcePool}
+    """
+    if depth < 1:
+      raise ValueError("resource pool depth must be at least 1")
+    
+    self._resourcePoolsLock.acquire()
+    try:
+      pool = self._resourcePools.get(name, None)
+      if pool is None:
+        pool = self._resourcePools[name] = ResourcePool(name, depth)
+      else:
+        pool.depth = depth
+      return pool
+    finally:
+      self._resourcePoolsLock.release()
+  
+  def getResourcePool(self, name):
+    """Get a pool declared with L{addResourcePool}.
+    
+    @param name: The name of the pool.
+    @type name: string
+    
+    @return: The pool.
+    @rtype: L{ResourcePool}
+    
+    @raise BuildError: If no pool with that name has been declared.
+    """
+    self._resourcePoolsLock.acquire()
+    try:
+      pool = self._resourcePools.get(name, None)
+    finally:
+      self._resourcePoolsLock.release()
+    
+    if pool is None:
+      self.raiseError("cake: unknown resource pool '%s'\n" % name)
+    return pool
+  
+  def createTask(self, func=None, pool=None):
     """Construct a new task that will call the specified function.
     
     This function wraps the function in an exception handler that prints out
@@ -430,12 +817,30 @@ class Engine(object):
     the task has been started.
     @type func: any callable
     
+    @param pool: The name of a resource pool that the function must be
+    called in, or None to call it as soon as the task is executed.
+    @type pool: string or None
+    
     @return: The newly created Task.
     @rtype: L{Task}
+    
+    @raise BuildError: If the pool has not been declared.
     """
     if func is None:
       return cake.task.Task()
     
+    if pool is not None:
+      resourcePool = self.getResourcePool(pool)
+      
+      # Wait for room in the pool only once the task executes, so a
+      # task that is never required never takes up a place in the pool.
+      def startInPool():
+        pooledTask = self.createTask(func)
+        resourcePool.start(pooledTask)
+        return pooledTask
+      
+      return self.createTask(startInPool)
+    
     # Save the script that created the task so that the task
     # inherits that same script when executed.
     currentScript = _Script.getCurrent()
@@ -522,23 +927,40 @@ class Engine(object):
     byteCode = self._byteCodeCache.get(path, None)
     if byteCode is None:
       # Cache the code in a user-supplied directory if provided.
-      if self.scriptCachePath is not None:
-        assert cake.path.isAbs(path) # Need an absolute path to get a unique hash.
-        pathDigest = cake.hash.sha1(path.encode("utf8")).digest()
-        pathDigestStr = cake.hash.hexlify(pathDigest)
-        cacheFilePath = cake.path.join(
-          self.scriptCachePath,
-          pathDigestStr[0],
-          pathDigestStr[1],
-          pathDigestStr[2],
-          pathDigestStr
-          )
-        cake.filesys.makeDirs(cake.path.dirName(cacheFilePath))
+      if self.scriptCachePath is not None and cached:
+        assert cake.path.isAbs(path) # Need an absolute path to be unique.
+        byteCode = self._getByteCodePack().loadCode(path)
       else:
-        cacheFilePath = None
-      byteCode = cake.bytecode.loadCode(path, cfile=cacheFilePath, cached=cached)
+        byteCode = cake.bytecode.loadCode(path, cached=cached)
       self._byteCodeCache[path] = byteCode
     return byteCode
+
+  def _getByteCodePack(self):
+    # Scripts executing in parallel must share the same pack or the
+    # byte code loaded into the others won't be saved.
+    self._byteCodePackLock.acquire()
+    try:
+      byteCodePack = self._byteCodePack
+      if byteCodePack is None or byteCodePack.path != self._getByteCodePackPath():
+        byteCodePack = cake.bytecode.ByteCodePack(self._getByteCodePackPath())
+        self._byteCodePack = byteCodePack
+      return byteCodePack
+    finally:
+      self._byteCodePackLock.release()
+
+  def _getByteCodePackPath(self):
+    return cake.path.join(self.scriptCachePath, "scripts.pack")
+
+  def saveScriptCache(self):
+    """Save the byte code of scripts compiled during the build.
+
+    Does nothing if L{scriptCachePath} is None or no scripts have been
+    compiled.
+
+    @raise EnvironmentError: If the script cache could not be written.
+    """
+    if self._byteCodePack is not None:
+      self._byteCodePack.save()
     
   def notifyFileChanged(self, path):
     """Let the engine know a file has changed.
@@ -562,13 +984,92 @@ class Engine(object):
     """
     timestamp = self._timestampCache.get(path, None)
     if timestamp is None:
+      self.stats.add("timestampCacheMisses")
       # Assuming here that os.stat() returns the modification time in
       # seconds since the unix time epoch (Jan 1 1970 UTC).
       stat = os.stat(path)
       timestamp = stat.st_mtime
       self._timestampCache[path] = timestamp
+    else:
+      self.stats.add("timestampCacheHits")
     return timestamp
 
+  def listDirectory(self, path):
+    """List the entries of a directory.
+
+    Listings are cached by the directory's modification time, so a
+    directory is only listed again once files have been added to or
+    removed from it.
+
+    @param path: The absolute path of the directory to list.
+    @type path: string
+
+    @return: A list of (name, isDir, isLink) tuples. See
+    L{cake.filesys.listDirectory}.
+    @rtype: list of (string, bool, bool)
+
+    @raise EnvironmentError: If the directory could not be listed.
+    """
+    timestamp = os.stat(path).st_mtime
+    directoryCache = self._getDirectoryCache()
+    cached = directoryCache.get(path, None)
+    if cached is not None and cached[0] == timestamp:
+      self.stats.add("directoryCacheHits")
+      return cached[1]
+
+    self.stats.add("directoryCacheMisses")
+    entries = cake.filesys.listDirectory(path)
+
+    # Don't cache a directory modified very recently. It may be modified
+    # again without its timestamp changing.
+    if time.time() - timestamp > _directoryCacheRacyTime:
+      directoryCache[path] = (timestamp, entries)
+      self._directoryCacheModified = True
+    return entries
+
+  def _getDirectoryCache(self):
+    directoryCache = self._directoryCache
+    if directoryCache is None:
+      self._directoryCacheLock.acquire()
+      try:
+        directoryCache = self._directoryCache
+        if directoryCache is None:
+          directoryCache = self._loadDirectoryCache()
+          self._directoryCache = directoryCache
+      finally:
+        self._directoryCacheLock.release()
+    return directoryCache
+
+  def _loadDirectoryCache(self):
+    if self.directoryCachePath is None:
+      return {}
+    try:
+      version, directoryCache = pickle.loads(
+        cake.filesys.readFile(self.directoryCachePath)
+        )
+    except Exception:
+      return {} # Missing or corrupt, start again.
+    if version != _directoryCacheVersion:
+      return {}
+    return directoryCache
+
+  def saveDirectoryCache(self):
+    """Save directory listings to the directory cache file.
+
+    Does nothing if L{directoryCachePath} is None or no directories were
+    listed since the cache was loaded.
+
+    @raise EnvironmentError: If the cache file could not be written.
+    """
+    if self.directoryCachePath is None or not self._directoryCacheModified:
+      return
+    self._directoryCacheModified = False
+    cacheString = pickle.dumps(
+      (_directoryCacheVersion, self._directoryCache),
+      pickle.HIGHEST_PROTOCOL,
+      )
+    cake.filesys.writeFile(self.directoryCachePath, cacheString)
+
   def updateFileDigestCache(self, path, timestamp, digest):
     """Update the internal cache of file digests with a new entry.
     
@@ -593,20 +1094,42 @@ class Engine(object):
     key = (path, timestamp)
     digest = self._digestCache.get(key, None)
     if digest is None:
-      hasher = cake.hash.sha1()
-      f = open(path, 'rb')
-      try:
-        blockSize = 512 * 1024
-        data = f.read(blockSize)
-        while data:
-          hasher.update(data)
-          data = f.read(blockSize)
-      finally:
-        f.close()
-      digest = hasher.digest()
+      self.stats.add("digestCacheMisses")
+      digest = _calculateFileDigest(path)
       self._digestCache[key] = digest
+    else:
+      self.stats.add("digestCacheHits")
       
     return digest
+
+  def getFileDigests(self, paths):
+    """Get the SHA1 digests of a list of files' contents.
+
+    If a process pool is in use then digests that are not already cached
+    are calculated across the worker processes.
+
+    @param paths: Paths of the files to digest.
+    @type paths: list of string
+
+    @return: The SHA1 digests of the files' contents.
+    @rtype: list of string of 20 bytes
+    """
+    getTimestamp = self.getTimestamp
+    keys = [(path, getTimestamp(path)) for path in paths]
+
+    digestCache = self._digestCache
+    if self.processPool is not None:
+      uncachedPaths = [k[0] for k in keys if k not in digestCache]
+      if len(uncachedPaths) >= self.processPoolDigestThreshold:
+        digests = self.processPool.map(_calculateFileDigest, uncachedPaths)
+        for path, digest in zip(uncachedPaths, digests):
+          digestCache[(path, getTimestamp(path))] = digest
+        self.stats.add("digestCacheMisses", len(uncachedPaths))
+        self.stats.add("digestCacheHits", len(keys) - len(uncachedPaths))
+        return [digestCache[key] for key in keys]
+
+    getFileDigest = self.getFileDigest
+    return [getFileDigest(key[0]) for key in keys]
     
   def getDependencyInfo(self, target):
     """Load the dependency info for the specified target.
@@ -622,35 +1145,12 @@ class Engine(object):
     
     @raise DependencyInfoError: if the dependency info could not be retrieved.
     """
-    depPath = self.getDependencyInfoPath(target)
-    
-    # Read entire file at once otherwise thread-switching will kill performance.
+    startTime = time.time()
     try:
-      fileContents = cake.filesys.readFile(depPath)
-    except EnvironmentError:
-      raise DependencyInfoError("doesn't exist")
-    
-    # Split magic signature from the pickled dependency info.
-    magicLength = len(DependencyInfo.MAGIC)
-    dependencyString = fileContents[:-magicLength]
-    dependencyMagic = fileContents[-magicLength:]
-    
-    if dependencyMagic != DependencyInfo.MAGIC:
-      raise DependencyInfoError("has an invalid signature")
-
-    try:      
-      dependencyInfo = pickle.loads(dependencyString)
-    except:
-      raise DependencyInfoError("could not be understood")
-    
-    # Check that the dependency info is valid  
-    if not isinstance(dependencyInfo, DependencyInfo):
-      raise DependencyInfoError("has an invalid instance")
-
-    if dependencyInfo.version != DependencyInfo.VERSION:
-      raise DependencyInfoError("version has changed")
-
-    return dependencyInfo
+      return _loadDependencyInfo(self.getDependencyInfoPath(target))
+    finally:
+      self.stats.add("dependencyInfoLoads")
+      self.stats.add("dependencyInfoLoadTime", time.time() - startTime)
   
   def getDependencyInfoPath(self, target):
     """Get the path of a dependency info file given it's associated target.
@@ -682,10 +1182,8 @@ class Engine(object):
     """
     depPath = self.getDependencyInfoPath(target)
 
-    dependencyString = pickle.dumps(dependencyInfo, pickle.HIGHEST_PROTOCOL)
- 
     try:
-      cake.filesys.writeFile(depPath, dependencyString + DependencyInfo.MAGIC)
+      _storeDependencyInfo(depPath, dependencyInfo)
     except Exception, e:
       msg = "cake: Error writing dependency info to %s: %s" % (depPath, e)
       self.raiseError(msg, targets=dependencyInfo.targets)
@@ -699,6 +1197,12 @@ class DependencyInfo(object):
   @type targets: list of strings
   @ivar args: The arguments used for the build.
   @type args: usually a list of string's
+  @ivar targetTimestamps: The timestamps of the targets when they were
+  built or None if they weren't recorded.
+  @type targetTimestamps: list of float or None
+  @ivar targetDigests: The digests of the targets when they were built
+  or None if they weren't recorded.
+  @type targetDigests: list of string or None
   """
   
   VERSION = 3
@@ -723,6 +1227,8 @@ class DependencyInfo(object):
     self.depPaths = None
     self.depTimestamps = None
     self.depDigests = None
+    self.targetTimestamps = None
+    self.targetDigests = None
 
 class Configuration(object):
   """A configuration is a collection of related Variants.
@@ -768,6 +1274,8 @@ class Configuration(object):
     self.engine = engine
     self.path = path
     self.dir = cake.path.dirName(path)
+    self._abspathCache = {}
+    self._normAbspathCache = {}
     self.baseDir = self.dir
     self.scriptGlobals = {}
     self._variants = {}
@@ -787,9 +1295,22 @@ class Configuration(object):
     """
     return path
 
+  def _getBaseDir(self):
+    return self._baseDir
+
+  def _setBaseDir(self, baseDir):
+    self._baseDir = baseDir
+    self._abspathCache.clear()
+    self._normAbspathCache.clear()
+
+  baseDir = property(_getBaseDir, _setBaseDir)
+
   def abspath(self, path):
     """Convert a path to be absolute.
     
+    Results are cached, so converting the same path again is a single
+    dictionary lookup.
+    
     @param path: The path to convert to an absolute path.
     @type path: string
     
@@ -797,9 +1318,32 @@ class Configuration(object):
     appended to self.baseDir, otherwise returns the path unchanged.
     @rtype: string
     """
-    if not os.path.isabs(path):
-      path = os.path.join(self.baseDir, path)
-    return path
+    absPath = self._abspathCache.get(path, None)
+    if absPath is None:
+      if os.path.isabs(path):
+        absPath = _internPath(path)
+      else:
+        absPath = _internPath(os.path.join(self._baseDir, path))
+      self._abspathCache[path] = absPath
+    return absPath
+
+  def normAbspath(self, path):
+    """Convert a path to be absolute and normalised.
+    
+    Equivalent to os.path.normpath(self.abspath(path)), but results
+    are cached.
+    
+    @param path: The path to convert.
+    @type path: string
+    
+    @return: The normalised absolute path.
+    @rtype: string
+    """
+    absPath = self._normAbspathCache.get(path, None)
+    if absPath is None:
+      absPath = _internPath(os.path.normpath(self.abspath(path)))
+      self._normAbspathCache[path] = absPath
+    return absPath
     
   def addVariant(self, variant):
     """Register a new variant with this engine.
@@ -918,7 +1462,12 @@ class Configuration(object):
             "script",
             "Executing %s\n" % script.path,
             )
-          script.execute()
+          startTime = time.time()
+          try:
+            script.execute()
+          finally:
+            self.engine.stats.add("scriptsExecuted")
+            self.engine.stats.add("scriptExecutionTime", time.time() - startTime)
         task = self.engine.createTask(execute)
         script = _Script(
           path=path,
@@ -935,7 +1484,11 @@ class Configuration(object):
             "Finished %s\n" % script.path,
             )
           )
-        task.lazyStart(threadPool=self.engine.scriptThreadPool)
+        if self.engine.parallelScripts:
+          threadPool = None # Use the default thread pool.
+        else:
+          threadPool = self.engine.scriptThreadPool
+        task.lazyStart(threadPool=threadPool)
     finally:
       self._executedLock.release()
 
@@ -951,7 +1504,8 @@ class Configuration(object):
     @param dependencies: A list of file paths of dependencies.
     @type dependencies: list of string
     @param calculateDigests: Whether or not to store the digests of
-    dependencies in the DependencyInfo.
+    dependencies in the DependencyInfo. Digests are always stored if
+    L{Engine.checkDigests} is enabled.
     @type calculateDigests: bool
     
     @return: A DependencyInfo object.
@@ -962,11 +1516,63 @@ class Configuration(object):
     paths = [abspath(p) for p in paths]
     getTimestamp = self.engine.getTimestamp
     dependencyInfo.depTimestamps = [getTimestamp(p) for p in paths]
-    if calculateDigests:
-      getFileDigest = self.engine.getFileDigest
-      dependencyInfo.depDigests = [getFileDigest(p) for p in paths]
+    if calculateDigests or self.engine.checkDigests:
+      dependencyInfo.depDigests = self.engine.getFileDigests(paths)
     return dependencyInfo
 
+  def preserveUnchangedTargets(self, dependencyInfo, oldDependencyInfo):
+    """Restore the previous timestamps of targets whose contents didn't
+    change when they were rebuilt.
+    
+    Targets that depend on a rebuilt target whose contents are
+    byte-identical to the previous build then don't need rebuilding
+    themselves. The digests and timestamps of the targets are recorded in
+    the new dependency info so they can be compared after the next build.
+    
+    @param dependencyInfo: The new dependency info of the targets.
+    @type dependencyInfo: L{DependencyInfo}
+    @param oldDependencyInfo: The dependency info from the previous build
+    of the targets or None if there isn't any.
+    @type oldDependencyInfo: L{DependencyInfo} or None
+    """
+    engine = self.engine
+    abspath = self.abspath
+    paths = [abspath(t) for t in dependencyInfo.targets]
+    for path in paths:
+      engine.notifyFileChanged(path) # The targets were just rebuilt
+    timestamps = [engine.getTimestamp(p) for p in paths]
+    digests = engine.getFileDigests(paths)
+    
+    # Dependency info from older versions won't have these attributes.
+    oldTimestamps = getattr(oldDependencyInfo, "targetTimestamps", None)
+    oldDigests = getattr(oldDependencyInfo, "targetDigests", None)
+    if oldTimestamps is None or oldDigests is None or \
+       oldDependencyInfo.targets != dependencyInfo.targets:
+      oldTimestamps = oldDigests = [None] * len(paths)
+    
+    for i in xrange(len(paths)):
+      path = paths[i]
+      if digests[i] == oldDigests[i]:
+        timestamp = oldTimestamps[i]
+      else:
+        # Set the timestamp we already have so it is rounded to what
+        # os.utime() can set and can be restored exactly after the next
+        # build.
+        timestamp = timestamps[i]
+      try:
+        _setModificationTime(path, timestamp)
+      except EnvironmentError:
+        continue
+      engine.notifyFileChanged(path)
+      newTimestamp = engine.getTimestamp(path)
+      engine.updateFileDigestCache(path, newTimestamp, digests[i])
+      if digests[i] == oldDigests[i] and timestamps[i] != newTimestamp:
+        engine.stats.add("unchangedTargets")
+      timestamps[i] = newTimestamp
+    
+    dependencyInfo.targetTimestamps = timestamps
+    dependencyInfo.targetDigests = digests
+
   def storeDependencyInfo(self, dependencyInfo):
     """Call this method after a target was built to save the
     dependencies of the target.
@@ -988,42 +1594,79 @@ class Configuration(object):
     @param args: The current arguments.
     @type args: list of string 
 
+    If the engine has a process pool then the check is performed by a
+    worker process and the previous DependencyInfo is only loaded by this
+    process if the target needs to be rebuilt.
+
     @return: A tuple containing the previous DependencyInfo or None if not
     found, and the string reason to build or None if the target is up
-    to date.
+    to date. The DependencyInfo is always None for an up to date target
+    checked by the engine's process pool.
     @rtype: tuple of (L{DependencyInfo} or None, string or None)
     """
-    abspath = self.abspath
-    absTargetPath = abspath(targetPath)
+    engine = self.engine
+    absTargetPath = self.abspath(targetPath)
+
+    dependencyInfo, reasonToBuild = self._checkDependencyInfo(
+      targetPath,
+      absTargetPath,
+      args,
+      )
+
+    engine.stats.add("targetsChecked")
+    if reasonToBuild is not None:
+      engine.stats.add("targetsRebuilt")
+
+    return dependencyInfo, reasonToBuild
+
+  def _checkDependencyInfo(self, targetPath, absTargetPath, args):
+    engine = self.engine
+    if engine.processPool is not None and not engine.forceBuild:
+      reasonToBuild, refreshed = engine.processPool.apply(
+        _checkDependencyInfoJob,
+        (
+          engine.getDependencyInfoPath(absTargetPath),
+          targetPath,
+          args,
+          self.baseDir,
+          engine.checkDigests,
+          ),
+        )
+      if refreshed:
+        engine.stats.add("targetsRefreshed")
+      if reasonToBuild is None:
+        return None, None
+      try:
+        return engine.getDependencyInfo(absTargetPath), reasonToBuild
+      except DependencyInfoError:
+        return None, reasonToBuild
+
     try:
-      dependencyInfo = self.engine.getDependencyInfo(absTargetPath)
+      dependencyInfo = engine.getDependencyInfo(absTargetPath)
     except DependencyInfoError, e:
       return None, "'" + targetPath + ".dep' " + str(e)
 
-    if self.engine.forceBuild:
+    if engine.forceBuild:
       return dependencyInfo, "rebuild has been forced"
 
-    if args != dependencyInfo.args:
-      return dependencyInfo, "'" + repr(args) + "' != '" + repr(dependencyInfo.args) + "'"
-    
-    isFile = cake.filesys.isFile
-    for target in dependencyInfo.targets:
-      if not isFile(abspath(target)):
-        return dependencyInfo, "'" + target + "' doesn't exist"
-    
-    getTimestamp = self.engine.getTimestamp
-    paths = dependencyInfo.depPaths
-    timestamps = dependencyInfo.depTimestamps
-    assert len(paths) == len(timestamps)
-    for i in xrange(len(paths)):
-      path = paths[i]
-      try:
-        if getTimestamp(abspath(path)) != timestamps[i]:
-          return dependencyInfo, "'" + path + "' has been changed"
-      except EnvironmentError:
-        return dependencyInfo, "'" + path + "' no longer exists" 
-    
-    return dependencyInfo, None
+    if engine.checkDigests:
+      getDigest = engine.getFileDigest
+    else:
+      getDigest = None
+
+    reasonToBuild, refreshed = _checkDependencies(
+      dependencyInfo,
+      args,
+      self.abspath,
+      engine.getTimestamp,
+      getDigest,
+      )
+    if reasonToBuild is None and refreshed:
+      # Only the timestamps of the dependencies have changed, record the
+      # new timestamps so we don't need to compare contents again.
+      engine.stats.add("targetsRefreshed")
+      engine.storeDependencyInfo(absTargetPath, dependencyInfo)
+    return dependencyInfo, reasonToBuild
 
   def checkReasonToBuild(self, targets, sources):
     """Check for a reason to build given a list of targets and sources.
@@ -1036,7 +1679,15 @@ class Configuration(object):
     @return: A reason to build if a rebuild is required, otherwise None.
     @rtype: string or None 
     """
-  
+    reasonToBuild = self._checkReasonToBuild(targets, sources)
+
+    self.engine.stats.add("targetsChecked")
+    if reasonToBuild is not None:
+      self.engine.stats.add("targetsRebuilt")
+
+    return reasonToBuild
+
+  def _checkReasonToBuild(self, targets, sources):
     abspath = self.abspath
     
     if self.engine.forceBuild:
@@ -1095,7 +1746,6 @@ class Configuration(object):
     addToDigest = hasher.update
     
     encodeToUtf8 = lambda value, encode=codecs.utf_8_encode: encode(value)[0]
-    getFileDigest = self.engine.getFileDigest
     
     # Include the paths of the targets in the digest
     for target in dependencyInfo.targets:
@@ -1105,10 +1755,12 @@ class Configuration(object):
     addToDigest(encodeToUtf8(repr(dependencyInfo.args)))
 
     abspath = self.abspath
-    for path in dependencyInfo.depPaths:
+    paths = dependencyInfo.depPaths
+    digests = self.engine.getFileDigests([abspath(p) for p in paths])
+    for i in xrange(len(paths)):
       # Include the dependency file's path and content digest in
       # this digest.
-      addToDigest(encodeToUtf8(path))
-      addToDigest(getFileDigest(abspath(path)))
+      addToDigest(encodeToUtf8(paths[i]))
+      addToDigest(digests[i])
       
     return hasher.digest()
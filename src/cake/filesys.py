@@ -5,9 +5,12 @@
 @license: Licensed under the MIT license.
 """
 
+import fnmatch
 import shutil
 import os
 import os.path
+import re
+import stat
 import time
 
 import cake.path
@@ -131,7 +134,35 @@ def makeDirs(path):
     if not os.path.isdir(path):
       raise
 
-def walkTree(path, recursive=True, includeMatch=None):
+def listDirectory(path):
+  """List the entries of a directory.
+
+  @param path: The path of the directory to list.
+  @type path: string
+
+  @return: A list of (name, isDir, isLink) tuples, one for each file or
+  directory in the directory. Symbolic links are followed when deciding
+  whether an entry is a directory.
+  @rtype: list of (string, bool, bool)
+
+  @raise EnvironmentError: If the directory could not be listed.
+  """
+  entries = []
+  for name in os.listdir(path):
+    entryPath = os.path.join(path, name)
+    try:
+      mode = os.lstat(entryPath).st_mode
+    except EnvironmentError:
+      continue # Deleted since it was listed
+    isLink = stat.S_ISLNK(mode)
+    if isLink:
+      isDir = os.path.isdir(entryPath)
+    else:
+      isDir = stat.S_ISDIR(mode)
+    entries.append((name, isDir, isLink))
+  return entries
+
+def walkTree(path, recursive=True, includeMatch=None, listDirectory=listDirectory):
   """Walk a directory for file and directory names.
 
   @param path: The path of the directory to search under.
@@ -147,31 +178,102 @@ def walkTree(path, recursive=True, includeMatch=None):
   expression function such as re.compile().match or re.match.
   @type includeMatch: any callable 
 
+  @param listDirectory: A callable used to list the entries of each
+  directory. See L{listDirectory}.
+  @type listDirectory: any callable
+
   @return: A sequence of file and directory paths relative
   to the specified directory path.
   """
   if recursive:
-    firstChar = len(path) + 1
-    for dirPath, dirNames, fileNames in os.walk(path):
-      dirPath = dirPath[firstChar:] # Make dirPath relative to path
-
-      newDirNames = []
-      for name in dirNames:
-        path = os.path.join(dirPath, name)
-        if includeMatch is None or includeMatch(path):
-          newDirNames.append(name)
-          yield path
-      dirNames[:] = newDirNames # Modify dirNames so we don't recurse into excluded directories.
+    dirPaths = [""]
+    while dirPaths:
+      dirPath = dirPaths.pop()
+      try:
+        entries = listDirectory(os.path.join(path, dirPath))
+      except EnvironmentError:
+        continue # Skip directories we can't list, as os.walk() does.
+
+      fileNames = []
+      newDirPaths = []
+      for name, isDir, isLink in entries:
+        if isDir:
+          subPath = os.path.join(dirPath, name)
+          if includeMatch is None or includeMatch(subPath):
+            if not isLink: # Don't follow links, as os.walk() does.
+              newDirPaths.append(subPath)
+            yield subPath
+        else:
+          fileNames.append(name)
 
       for name in fileNames:
-        path = os.path.join(dirPath, name)
-        if includeMatch is None or includeMatch(path):
-          yield path
+        subPath = os.path.join(dirPath, name)
+        if includeMatch is None or includeMatch(subPath):
+          yield subPath
+
+      # Visit sub-directories in the order they were listed.
+      newDirPaths.reverse()
+      dirPaths.extend(newDirPaths)
   else:
-    for name in os.listdir(path):
+    for name, isDir, isLink in listDirectory(path):
       if includeMatch is None or includeMatch(name):
         yield name
 
+def _hasMagic(s):
+  return _magicRe.search(s) is not None
+
+_magicRe = re.compile('[*?[]')
+
+def iglob(pathname, listDirectory=listDirectory):
+  """Find the paths matching a glob-style pattern.
+
+  This behaves like the standard glob.iglob() but lists directories
+  using the supplied callable.
+
+  @param pathname: A glob-style file-name pattern. eg. '*.txt'
+  @type pathname: string
+
+  @param listDirectory: A callable used to list the entries of each
+  directory. See L{listDirectory}.
+  @type listDirectory: any callable
+
+  @return: A sequence of paths that match the pattern.
+  """
+  if not _hasMagic(pathname):
+    if os.path.lexists(pathname):
+      yield pathname
+    return
+
+  dirName, baseName = os.path.split(pathname)
+  if not dirName:
+    for name in _globInDirectory(os.curdir, baseName, listDirectory):
+      yield name
+    return
+
+  if dirName != pathname and _hasMagic(dirName):
+    dirNames = iglob(dirName, listDirectory)
+  else:
+    dirNames = [dirName]
+
+  for dirName in dirNames:
+    if _hasMagic(baseName):
+      for name in _globInDirectory(dirName, baseName, listDirectory):
+        yield os.path.join(dirName, name)
+    elif baseName:
+      if os.path.lexists(os.path.join(dirName, baseName)):
+        yield os.path.join(dirName, baseName)
+    elif os.path.isdir(dirName):
+      yield os.path.join(dirName, baseName)
+
+def _globInDirectory(dirName, pattern, listDirectory):
+  try:
+    names = [entry[0] for entry in listDirectory(dirName)]
+  except EnvironmentError:
+    return []
+  if pattern[0] != '.':
+    names = [name for name in names if name[0] != '.']
+  return fnmatch.filter(names, pattern)
+
 def readFile(path):
   """Read data from a file.
 
@@ -5,9 +5,22 @@
 @license: Licensed under the MIT license.
 """
 
+import re
+
+# Matches an escaped line break.
+_continuationRe = re.compile(r'\\\r?\n')
+
+# Matches the ':' that separates a rule's targets from its dependencies.
+# Requiring whitespace after the ':' skips drive letters, eg. 'c:/foo.h'.
+_ruleSeparatorRe = re.compile(r':(?:\s|$)')
+
+# Matches a single path. Paths are separated by whitespace, but may
+# contain spaces escaped with a backslash.
+_pathRe = re.compile(r'(?:\\ |\S)+')
+
 def parseDependencyFile(path, targetSuffix):
   """Parse a .d file and return the list of dependencies.
-  
+
   @param path: The path to the dependency file.
   @type path: string
   @param targetSuffix: Suffix used by targets.
@@ -15,41 +28,48 @@ def parseDependencyFile(path, targetSuffix):
   @return: A list of dependencies.
   @rtype: list of string
   """
-  dependencies = []
-  uniqueDeps = set()
-
-  def addPath(path):
-    if path and path not in uniqueDeps:
-      uniqueDeps.add(path)
-      path = path.replace('\\ ', ' ') # fix escaped spaces
-      dependencies.append(path)
-
   f = open(path, 'rt')
   try:
     text = f.read()
-    text = text.replace('\\\n', ' ') # join escaped lines
-    text = text.replace('\n', ' ') # join other lines
-    text = text.lstrip() # strip leading whitespace
-
-    # Find the 'target:' rule
-    i = text.find(targetSuffix + ':')
-    if i != -1:
-      text = text[i+len(targetSuffix)+1:] # strip target + ':'
-
-      while True:
-        text = text.lstrip() # strip leading whitespace
-
-        i = text.find(' ')
-        while i != -1 and text[i-1] == '\\': # Skip escaped spaces
-          i = text.find(' ', i+1)
-        
-        if i == -1:
-          addPath(text)
-          break
-        else:
-          addPath(text[:i])
-          text = text[i:]
   finally:
     f.close()
-  
+
+  return parseDependencies(text, targetSuffix)
+
+def parseDependencies(text, targetSuffix):
+  """Parse the contents of a .d file and return the list of dependencies.
+
+  The dependencies of every rule that has a target ending in targetSuffix
+  are returned, in the order they first appear. Parsing takes time linear
+  in the size of the text.
+
+  @param text: The contents of the dependency file.
+  @type text: string
+  @param targetSuffix: Suffix used by targets.
+  @type targetSuffix: string
+  @return: A list of dependencies.
+  @rtype: list of string
+  """
+  dependencies = []
+  uniqueDeps = set()
+
+  text = _continuationRe.sub(' ', text) # join escaped lines
+
+  for line in text.splitlines():
+    # Find the 'targets:' part of the rule
+    m = _ruleSeparatorRe.search(line)
+    if m is None:
+      continue
+
+    for target in _pathRe.findall(line, 0, m.start()):
+      if target.endswith(targetSuffix):
+        break
+    else:
+      continue # Not a rule for our target
+
+    for path in _pathRe.findall(line, m.end()):
+      if path not in uniqueDeps:
+        uniqueDeps.add(path)
+        dependencies.append(path.replace('\\ ', ' ')) # fix escaped spaces
+
   return dependencies
@@ -76,8 +76,20 @@ class Tool(object):
   
   @type: bool
   """
+
+  _copyOnWrite = frozenset()
+  """Names of attributes whose values are shared between clones.
+
+  These values are not copied when the tool is cloned. Instead the
+  original and the clone share the same value until one of them calls
+  L{_modifiable} to get its own copy. Methods that modify one of these
+  values in-place must do so through L{_modifiable}.
+
+  @type: frozenset of string
+  """
   
   def __init__(self, configuration):
+    self.__shared = set()
     self.__memoise = {}
     self.configuration = configuration
     self.engine = configuration.engine
@@ -85,6 +97,7 @@ class Tool(object):
   def __setattr__(self, name, value):
     if name != '_Tool__memoise' and hasattr(self, '_Tool__memoise'):
       self._clearCache()
+      self.__shared.discard(name)
     super(Tool, self).__setattr__(name, value)
   
   def _clearCache(self):
@@ -92,16 +105,49 @@ class Tool(object):
     """
     self.__memoise.clear()
   
+  def _modifiable(self, name):
+    """Return the value of an attribute so that it may be modified
+    in-place.
+
+    If the value is shared with a clone then it is copied first.
+
+    @param name: The name of the attribute.
+    @type name: string
+
+    @return: The value of the attribute, owned by this tool.
+    """
+    value = getattr(self, name)
+    if name in self.__shared:
+      value = cloneTools(value)
+      setattr(self, name, value)
+    return value
+
   def clone(self):
     """Return an independent clone of this tool.
     
     The default clone behaviour performs a deep copy of any builtin
     types, and a clone of any Tool-derived objects. Everything else
-    will be shallow copied. You should override this method if you
-    need a more sophisticated clone.
+    will be shallow copied. Attributes named in L{_copyOnWrite} are
+    shared with the clone until they are modified. You should override
+    this method if you need a more sophisticated clone.
     """
+    copyOnWrite = self._copyOnWrite
+    shared = self.__shared
+
+    state = {}
+    for name, value in self.__dict__.iteritems():
+      if name in copyOnWrite:
+        shared.add(name)
+        state[name] = value
+      else:
+        state[name] = cloneTools(value)
+
+    # The memoised results are still valid for the clone.
+    state['_Tool__memoise'] = self.__memoise.copy()
+    state['_Tool__shared'] = set(shared)
+
     new = object.__new__(self.__class__)
-    new.__dict__ = cloneTools(self.__dict__)
+    new.__dict__ = state
     return new
 
 def cloneTools(obj):
@@ -9,10 +9,12 @@ import sys
 import weakref
 import os
 import os.path
-import datetime
+import re
+import time
 import tempfile
 import subprocess
 import itertools
+import threading
 try:
   import cPickle as pickle
 except ImportError:
@@ -22,20 +24,15 @@ import cake.filesys
 import cake.hash
 import cake.path
 import cake.system
-import cake.zipping
 
+from cake.engine import DependencyInfoError
 from cake.gnu import parseDependencyFile
 from cake.async import AsyncResult, waitForAsyncResult, flatten, getResult
 from cake.target import FileTarget, getPath, getPaths, getTask, getTasks
 from cake.task import Task
 from cake.library import Tool, memoise
 from cake.script import Script
-
-def _totalSeconds(td):
-  """Return the total number of seconds for a datetime.timedelta value.
-  """
-  return (td.microseconds + (
-    td.seconds + td.days * 24 * 3600) * 10**6) / float(10**6)
+from cake.supervisor import ProcessResult
 
 class CompilerNotFoundError(Exception):
   """Exception raised when a compiler cannot be found.
@@ -65,6 +62,9 @@ class PchTarget(CompilerTarget):
   @type object: L{FileTarget}
   @ivar header: The #include used to build the pch.
   @type header: string
+  @ivar forceInclude: Whether objects using the pch must force include
+  the header as their sources don't include it themselves.
+  @type forceInclude: bool
   """
   def __init__(self, path, task, compiler, header, object):
     CompilerTarget.__init__(self, path, task, compiler)
@@ -74,6 +74,7 @@ class PchTarget(CompilerTarget):
     else:
       self.object = FileTarget(object, task)
     self.header = header
+    self.forceInclude = False
 
 class ObjectTarget(CompilerTarget):
   """An object target.
@@ -198,6 +199,116 @@ def _escapeArg(arg):
 def _escapeArgs(args):
   return [_escapeArg(arg) for arg in args]
 
+# Arguments made only of these characters mean the same to a POSIX shell,
+# once escaped by _escapeArg(), as they do when executed directly.
+_shellSafeRe = re.compile(r'^[\w@%+=:,./\- ]+\Z')
+
+# Matches the file names generated for automatic precompiled headers.
+_autoPchNameRe = re.compile(r"^(autopch-[0-9a-f]{8})\.")
+
+_includeRe = re.compile(r'#\s*include\s*([<"])([^>"]+)[>"]')
+
+def _getLeadingIncludes(text):
+  """Return the headers included at the start of a source file.
+  
+  Only the #include lines that come before any other code or preprocessor
+  directive are returned, as the headers included after them may depend
+  on what came before.
+  
+  @param text: The contents of the source file.
+  @type text: string
+  
+  @return: The name of each header as it is included, eg. 'vector' or
+  'foo/bar.h', along with whether it was included with angle brackets.
+  @rtype: list of tuple(string, bool)
+  """
+  includes = []
+  inComment = False
+  for line in text.splitlines():
+    line = line.strip()
+    if inComment:
+      end = line.find("*/")
+      if end < 0:
+        continue
+      line = line[end + 2:].strip()
+      inComment = False
+    if line.startswith("/*"):
+      end = line.find("*/", 2)
+      if end < 0:
+        inComment = True
+        continue
+      line = line[end + 2:].strip()
+    if not line or line.startswith("//"):
+      continue
+    m = _includeRe.match(line)
+    if m is None:
+      break
+    includes.append((m.group(2), m.group(1) == "<"))
+  return includes
+
+def _needsShell(args):
+  """Return True if a shell is needed to interpret some arguments.
+  
+  @param args: The arguments of a command, including the program.
+  @type args: list of string
+  
+  @return: True if any argument contains characters that a shell would
+  interpret when run with the L{_escapeArgs} of the arguments.
+  @rtype: bool
+  """
+  for arg in args:
+    if not _shellSafeRe.match(arg):
+      return True
+  return False
+
+class _SharedCompile(object):
+  """The compile of an object that can be copied to other targets.
+  
+  @ivar target: Path of the object file being compiled.
+  @type target: string
+  @ivar task: A task that completes once the object is compiled.
+  @type task: L{Task}
+  @ivar dependencies: The dependencies of the object once it's compiled.
+  @type dependencies: list of string or None
+  """
+  
+  def __init__(self, target, task):
+    self.target = target
+    self.task = task
+    self.dependencies = None
+
+class _ProcessCommand(object):
+  """A command line prepared to be run by a compiler.
+  
+  @ivar executable: The program being run.
+  @type executable: string
+  @ivar target: Path of the target the command builds, or None.
+  @type target: string or None
+  @ivar args: The args to pass to subprocess.Popen().
+  @type args: string
+  @ivar keywords: Other arguments to pass to subprocess.Popen().
+  @type keywords: dict
+  @ivar argsPath: Path of the response file, or None if not used.
+  @type argsPath: string or None
+  @ivar debugString: The message output when debugging 'run'.
+  @type debugString: string
+  """
+  
+  def __init__(self, executable, target):
+    self.executable = executable
+    self.target = target
+    self.args = None
+    self.keywords = {}
+    self.argsPath = None
+    self.debugString = None
+  
+  def cleanup(self):
+    """Remove the response file once the command has run.
+    """
+    if self.argsPath is not None:
+      os.remove(self.argsPath)
+      self.argsPath = None
+
 class Compiler(Tool):
   """Base class for C/C++ compiler tools.
   """
@@ -403,6 +514,32 @@ class Compiler(Tool):
     MSVC: /INCREMENTAL
   @type: bool
   """
+  useIncrementalArchiving = False
+  """Use incremental archiving.
+  
+  If True then when a library needs rebuilding only the objects that
+  have changed since it was last built are replaced in the existing
+  library, and objects no longer in the library are removed from it.
+  Libraries are rebuilt from scratch if the library flags or the
+  archiver have changed.
+  
+  Related compiler options::
+    GCC:  ar r, ar d
+    MSVC: lib <library> <objects> /REMOVE:<object>
+  @type: bool
+  """
+  useThinArchives = False
+  """Use thin archives.
+  
+  If True then libraries reference their object files by path rather
+  than containing copies of them, which makes archiving much quicker
+  and saves disk space. The object files must not be moved or deleted
+  while the library is in use.
+  
+  Related compiler options::
+    GCC: ar T
+  @type: bool
+  """
   useFunctionLevelLinking = None
   """Use function-level linking.
   
@@ -481,6 +618,105 @@ class Compiler(Tool):
   files referring to paths in the wrong workspace.
   @type: string or None
   """
+  cacheAllOutputs = False
+  """Cache the outputs of precompiled headers, libraries, modules,
+  programs and resources.
+  
+  If True and L{objectCachePath} is set then the outputs of precompiling
+  headers, archiving, linking and resource compiling are stored in the
+  object cache along with object files. The outputs are restored from the cache rather
+  than being rebuilt if the command and the contents of all of its
+  inputs match a cached build. All outputs of the command, eg. a dll,
+  its import library and program database, are stored and restored
+  together.
+  @type: bool
+  """
+  useEarlyCutoff = False
+  """Avoid rebuilding targets that depend on unchanged outputs.
+  
+  If True then when a target is rebuilt but its outputs are byte-identical
+  to those of the previous build the outputs keep their previous
+  timestamps. Libraries and programs that depend on them then aren't
+  rebuilt, eg. after editing a comment in a header. The digests of all
+  outputs are calculated after each build to detect this.
+  
+  The compiler must produce the same output for the same input for
+  this to be effective.
+  
+  Related compiler options::
+    MSVC: /Brepro
+  @type: bool
+  """
+  shareIdenticalObjects = False
+  """Compile each source only once when compiled identically for several
+  targets.
+  
+  If True then when objects in different variants or configurations are
+  compiled from the same source with identical compiler arguments (other
+  than the path of the object) the source is only compiled once during a
+  build and the object is copied to the other targets. eg. release and
+  profile variants that only differ in their link flags.
+  
+  Compilers that embed the path of the object file in the object file
+  will embed the path of the object that was compiled in the copies.
+  Objects that can't be cached (eg. MSVC objects whose debug info is
+  written to a program database shared with other objects) are never
+  shared.
+  @type: bool
+  """
+  compilePool = None
+  """The name of the resource pool that compiles run in.
+  
+  If set then no more objects, precompiled headers and resources are
+  compiled at once than the depth of the pool, which must be declared
+  with L{cake.engine.Engine.addResourcePool}. If None then compiles are
+  only limited by the number of jobs.
+  @type: string or None
+  """
+  archivePool = None
+  """The name of the resource pool that libraries are archived in.
+  
+  If None then archiving is only limited by the number of jobs.
+  @type: string or None
+  """
+  useAutoPch = False
+  """Automatically precompile the headers most often included by objects.
+  
+  If True then objects() looks at the headers that its sources include
+  before any code of their own, and which of those were found outside
+  the project (system and third-party headers) when the objects were
+  last built. If enough objects include the same such headers a header
+  including them all is generated in the target directory, precompiled,
+  and used by those objects. The header is named after the headers it
+  includes and the arguments it's compiled with, so several calls to
+  objects() can share a target directory. Files generated for a previous
+  choice of headers are removed.
+  
+  The precompiled header is only rebuilt when the set of headers chosen
+  changes or the headers themselves change. Nothing is precompiled the
+  first time the objects are built, and sharedObjects() doesn't
+  precompile headers automatically. Objects given an explicit pch are
+  not affected.
+  @type: bool
+  """
+  autoPchThreshold = 0.5
+  """The fraction of objects that must include a header for it to be
+  automatically precompiled.
+  @type: float
+  """
+  autoPchMinimumObjects = 4
+  """The fewest objects worth automatically precompiling headers for.
+  @type: int
+  """
+  linkPool = None
+  """The name of the resource pool that programs and modules are linked in.
+  
+  Links can use much more memory and disk bandwidth than compiles, so
+  running fewer of them at once can avoid running out of memory, eg.
+  after C{configuration.engine.addResourcePool("link", 4)}. If None then
+  links are only limited by the number of jobs.
+  @type: string or None
+  """
   language = None
   """Set the compilation language.
   
@@ -631,12 +867,122 @@ class Compiler(Tool):
 
   @type: string or None
   """
+  processPoolDependencyFileSize = 64 * 1024
+  """The minimum size in bytes of a dependency file that will be parsed
+  using the engine's process pool, if it has one. Smaller files are parsed
+  in-process as they are quicker to parse than to send to a worker.
+
+  @type: int
+  """
   
   # The name of this compiler
   _name = 'unknown'
 
+  # These are only modified through the add*() and insert*() methods, so
+  # they can be shared between clones of the compiler.
+  _copyOnWrite = frozenset([
+    "_cFlags",
+    "_cppFlags",
+    "_mFlags",
+    "_mmFlags",
+    "_libraryFlags",
+    "_moduleFlags",
+    "_programFlags",
+    "_resourceFlags",
+    "_includePaths",
+    "_defines",
+    "_forcedIncludes",
+    "_libraryPaths",
+    "_libraries",
+    "_modules",
+    "_objectPrerequisites",
+    ])
+
+  def _copyOnWriteList(name, doc):
+    """Return a property giving public access to a shared list.
+
+    Reading the property gives this compiler its own copy of the list, so
+    modifying the list in-place won't change the compiler it was cloned
+    from or other clones.
+    """
+    def get(self):
+      return self._modifiable(name)
+    def set(self, value):
+      setattr(self, name, value)
+    return property(get, set, doc=doc)
+
+  cFlags = _copyOnWriteList(
+    "_cFlags",
+    "Flags used when compiling C sources.",
+    )
+  cppFlags = _copyOnWriteList(
+    "_cppFlags",
+    "Flags used when compiling C++ sources.",
+    )
+  mFlags = _copyOnWriteList(
+    "_mFlags",
+    "Flags used when compiling Objective-C sources.",
+    )
+  mmFlags = _copyOnWriteList(
+    "_mmFlags",
+    "Flags used when compiling Objective-C++ sources.",
+    )
+  libraryFlags = _copyOnWriteList(
+    "_libraryFlags",
+    "Flags used when archiving libraries.",
+    )
+  moduleFlags = _copyOnWriteList(
+    "_moduleFlags",
+    "Flags used when linking modules.",
+    )
+  programFlags = _copyOnWriteList(
+    "_programFlags",
+    "Flags used when linking programs.",
+    )
+  resourceFlags = _copyOnWriteList(
+    "_resourceFlags",
+    "Flags used when compiling resources.",
+    )
+  includePaths = _copyOnWriteList(
+    "_includePaths",
+    "Paths searched for included headers. See L{addIncludePath}.",
+    )
+  defines = _copyOnWriteList(
+    "_defines",
+    "Preprocessor defines. See L{addDefine}.",
+    )
+  forcedIncludes = _copyOnWriteList(
+    "_forcedIncludes",
+    "Headers included before every source. See L{addForcedInclude}.",
+    )
+  libraryPaths = _copyOnWriteList(
+    "_libraryPaths",
+    "Paths searched for libraries. See L{addLibraryPath}.",
+    )
+  libraries = _copyOnWriteList(
+    "_libraries",
+    "Libraries linked into modules and programs. See L{addLibrary}.",
+    )
+  modules = _copyOnWriteList(
+    "_modules",
+    "Modules copied alongside programs. See L{addModule}.",
+    )
+  objectPrerequisites = _copyOnWriteList(
+    "_objectPrerequisites",
+    "Prerequisites of every object. See L{addObjectPrerequisites}.",
+    )
+
+  del _copyOnWriteList
+
   # Map of engine to map of library path to list of object paths
   __libraryObjects = weakref.WeakKeyDictionary()
+  __libraryObjectsLock = threading.Lock()
+  # Map of engine to map of compile key to _SharedCompile
+  __sharedCompiles = weakref.WeakKeyDictionary()
+  __sharedCompilesLock = threading.Lock()
+  # Map of engine to map of automatic pch header path to PchTarget
+  __autoPchs = weakref.WeakKeyDictionary()
+  __autoPchsLock = threading.Lock()
   
   def __init__(
     self,
@@ -646,27 +992,27 @@ class Compiler(Tool):
     libraryPaths=None,
     ):
     super(Compiler, self).__init__(configuration)
-    self.cFlags = []
-    self.cppFlags = []
-    self.mFlags = []
-    self.mmFlags = []
-    self.libraryFlags = []
-    self.moduleFlags = []
-    self.programFlags = []
-    self.resourceFlags = []
+    self._cFlags = []
+    self._cppFlags = []
+    self._mFlags = []
+    self._mmFlags = []
+    self._libraryFlags = []
+    self._moduleFlags = []
+    self._programFlags = []
+    self._resourceFlags = []
     if includePaths is None:
-      self.includePaths = []
+      self._includePaths = []
     else:
-      self.includePaths = includePaths
-    self.defines = []
-    self.forcedIncludes = []
+      self._includePaths = includePaths
+    self._defines = []
+    self._forcedIncludes = []
     if libraryPaths is None:
-      self.libraryPaths = []
+      self._libraryPaths = []
     else:
-      self.libraryPaths = libraryPaths
-    self.libraries = []
-    self.modules = []
-    self.objectPrerequisites = []
+      self._libraryPaths = libraryPaths
+    self._libraries = []
+    self._modules = []
+    self._objectPrerequisites = []
     self.__binPaths = binPaths
 
   @property
@@ -693,7 +1039,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.cFlags.append(flag)
+    self._modifiable("_cFlags").append(flag)
     self._clearCache()
     
   def addCppFlag(self, flag):
@@ -702,7 +1048,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.cppFlags.append(flag)
+    self._modifiable("_cppFlags").append(flag)
     self._clearCache()
 
   def addMFlag(self, flag):
@@ -711,7 +1057,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.mFlags.append(flag)
+    self._modifiable("_mFlags").append(flag)
     self._clearCache()
 
   def addMmFlag(self, flag):
@@ -720,7 +1066,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.mmFlags.append(flag)
+    self._modifiable("_mmFlags").append(flag)
     self._clearCache()
     
   def addLibraryFlag(self, flag):
@@ -729,7 +1075,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.libraryFlags.append(flag)
+    self._modifiable("_libraryFlags").append(flag)
     self._clearCache()
     
   def addModuleFlag(self, flag):
@@ -738,7 +1084,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.moduleFlags.append(flag)
+    self._modifiable("_moduleFlags").append(flag)
     self._clearCache()
     
   def addProgramFlag(self, flag):
@@ -747,7 +1093,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.programFlags.append(flag)
+    self._modifiable("_programFlags").append(flag)
     self._clearCache()
 
   def addResourceFlag(self, flag):
@@ -756,7 +1102,7 @@ class Compiler(Tool):
     @param flag: The flag to add.
     @type flag: string
     """
-    self.resourceFlags.append(flag)
+    self._modifiable("_resourceFlags").append(flag)
     self._clearCache()
     
   def addIncludePath(self, path):
@@ -768,7 +1114,7 @@ class Compiler(Tool):
     @param path: The path to add.
     @type path: string
     """
-    self.includePaths.append(self.configuration.basePath(path))
+    self._modifiable("_includePaths").append(self.configuration.basePath(path))
     self._clearCache()
     
   def insertIncludePath(self, index, path):
@@ -782,7 +1128,7 @@ class Compiler(Tool):
     @param path: The path to add.
     @type path: string
     """
-    self.includePaths.insert(index, self.configuration.basePath(path))
+    self._modifiable("_includePaths").insert(index, self.configuration.basePath(path))
     self._clearCache()
         
   def getIncludePaths(self):
@@ -791,7 +1137,7 @@ class Compiler(Tool):
     The iterator will return include paths in the order they
     should be searched. 
     """
-    return self.includePaths
+    return tuple(self._includePaths)
 
   def addDefine(self, name, value=None):
     """Add a define to the preprocessor command-line.
@@ -805,9 +1151,9 @@ class Compiler(Tool):
     @type value: string or None
     """
     if value is None:
-      self.defines.append(name)
+      self._modifiable("_defines").append(name)
     else:
-      self.defines.append("%s=%s" % (name, value))
+      self._modifiable("_defines").append("%s=%s" % (name, value))
     self._clearCache()
     
   def insertDefine(self, index, name, value=None):
@@ -824,9 +1170,9 @@ class Compiler(Tool):
     @type value: string or None
     """
     if value is None:
-      self.defines.insert(index, name)
+      self._modifiable("_defines").insert(index, name)
     else:
-      self.defines.insert(index, "%s=%s" % (name, value))
+      self._modifiable("_defines").insert(index, "%s=%s" % (name, value))
     self._clearCache()
 
   def getDefines(self):
@@ -836,7 +1182,7 @@ class Compiler(Tool):
     set. Defines set later should have precedence over those set
     first.
     """
-    return self.defines
+    return tuple(self._defines)
 
   def addForcedInclude(self, path):
     """Add a file to be forcibly included on the command-line.
@@ -848,7 +1194,7 @@ class Compiler(Tool):
     to be relative to a previously defined includePath. 
     @type path: string
     """
-    self.forcedIncludes.append(self.configuration.basePath(path))
+    self._modifiable("_forcedIncludes").append(self.configuration.basePath(path))
     self._clearCache()
   
   def insertForcedInclude(self, index, path):
@@ -862,7 +1208,7 @@ class Compiler(Tool):
     to be relative to a previously defined includePath. 
     @type path: string
     """
-    self.forcedIncludes.insert(index, self.configuration.basePath(path))
+    self._modifiable("_forcedIncludes").insert(index, self.configuration.basePath(path))
     self._clearCache()
     
   def getForcedIncludes(self):
@@ -871,7 +1217,7 @@ class Compiler(Tool):
     The iterator will return forced includes in the order they
     should be included.
     """
-    return self.forcedIncludes
+    return tuple(self._forcedIncludes)
   
   def addObjectPrerequisites(self, prerequisites):
     """Add a prerequisite that must complete before building object files.
@@ -887,7 +1233,7 @@ class Compiler(Tool):
     The object file will not be built before all of the tasks associated with
     these have completed successfully.
     """
-    self.objectPrerequisites.append(prerequisites)
+    self._modifiable("_objectPrerequisites").append(prerequisites)
   
   def addLibrary(self, name):
     """Add a library to the list of libraries to link with.
@@ -898,7 +1244,7 @@ class Compiler(Tool):
     @param name: Name/path of the library to link with.
     @type name: string
     """
-    self.libraries.append(name)
+    self._modifiable("_libraries").append(name)
     self._clearCache()
 
   def insertLibrary(self, index, name):
@@ -912,7 +1258,7 @@ class Compiler(Tool):
     @param name: Name/path of the library to link with.
     @type name: string
     """
-    self.libraries.insert(index, name)
+    self._modifiable("_libraries").insert(index, name)
     self._clearCache()
     
   def getLibraries(self):
@@ -921,7 +1267,7 @@ class Compiler(Tool):
     The iterator will return libraries in the order they
     should be searched.
     """
-    return self.libraries
+    return tuple(self._libraries)
   
   def addLibraryPath(self, path):
     """Add a path to the list of library search paths.
@@ -932,7 +1278,7 @@ class Compiler(Tool):
     @param path: The path to add.
     @type path: string
     """
-    self.libraryPaths.append(self.configuration.basePath(path))
+    self._modifiable("_libraryPaths").append(self.configuration.basePath(path))
     self._clearCache()
 
   def insertLibraryPath(self, index, path):
@@ -946,7 +1292,7 @@ class Compiler(Tool):
     @param path: The path to add.
     @type path: string
     """
-    self.libraryPaths.insert(index, self.configuration.basePath(path))
+    self._modifiable("_libraryPaths").insert(index, self.configuration.basePath(path))
     self._clearCache()
       
   def getLibraryPaths(self):
@@ -955,7 +1301,7 @@ class Compiler(Tool):
     The iterator will return library paths in the order they
     should be searched.
     """
-    return self.libraryPaths
+    return tuple(self._libraryPaths)
 
   def addModule(self, path):
     """Add a module to the list of modules to copy.
@@ -963,7 +1309,7 @@ class Compiler(Tool):
     @param path: Path of the module to copy.
     @type path: string
     """
-    self.modules.append(self.configuration.basePath(path))
+    self._modifiable("_modules").append(self.configuration.basePath(path))
     self._clearCache()
     
   def copyModulesTo(self, targetDir, **kwargs):
@@ -1043,7 +1389,7 @@ class Compiler(Tool):
     # TODO: Handle copying .manifest files if present for MSVC
     # built DLLs.
 
-    return run(flatten(self.modules), targetDir)
+    return run(flatten(self._modules), targetDir)
 
   def pch(self, target, source, header, prerequisites=[],
           forceExtension=True, **kwargs):
@@ -1108,7 +1454,7 @@ class Compiler(Tool):
       return "Compiling %s\n" % os.path.normpath(source)
     
   def _pch(self, target, source, header, prerequisites=[],
-           forceExtension=True):
+           forceExtension=True, forceInclude=False):
     
     @waitForAsyncResult
     def run(target, source, header, prerequisites):
@@ -1126,7 +1472,7 @@ class Compiler(Tool):
           lambda t=target, s=source, h=header, o=object, c=self:
             c.buildPch(t, getPath(s), h, o)
           )
-        pchTask.lazyStartAfter(tasks, threadPool=self.engine.scriptThreadPool)
+        pchTask.lazyStartAfter(tasks, threadPool=self.engine.dependencyThreadPool)
       else:
         pchTask = None
       
@@ -1137,6 +1483,7 @@ class Compiler(Tool):
         header=header,
         object=object,
         )
+      pchTarget.forceInclude = forceInclude
       currentScript = Script.getCurrent()
       currentScript.getDefaultTarget().addTarget(pchTarget)
       currentScript.getTarget(cake.path.baseName(target)).addTarget(pchTarget)
@@ -1145,7 +1492,7 @@ class Compiler(Tool):
       
     allPrerequisites = flatten([
       prerequisites,
-      self.objectPrerequisites,
+      self._objectPrerequisites,
       self._getObjectPrerequisiteTasks(),
       ])
       
@@ -1235,7 +1582,7 @@ class Compiler(Tool):
           lambda t=target, s=sourcePath, p=pch, h=shared, c=self:
             c.buildObject(t, s, p, h)
           )
-        objectTask.lazyStartAfter(tasks, threadPool=self.engine.scriptThreadPool)
+        objectTask.lazyStartAfter(tasks, threadPool=self.engine.dependencyThreadPool)
       else:
         objectTask = None
       
@@ -1253,7 +1600,7 @@ class Compiler(Tool):
       
     allPrerequisites = flatten([
       prerequisites,
-      self.objectPrerequisites,
+      self._objectPrerequisites,
       self._getObjectPrerequisiteTasks(),
       ])
       
@@ -1264,7 +1611,7 @@ class Compiler(Tool):
     """Return a list of the tasks that are prerequisites for
     building an object file.
     """
-    return getTasks(self.forcedIncludes)
+    return getTasks(self._forcedIncludes)
     
   def objects(self, targetDir, sources, pch=None, prerequisites=[], **kwargs):
     """Build a collection of objects to a target directory.
@@ -1285,7 +1632,8 @@ class Compiler(Tool):
     @type prerequisites: list of Task or FileTarget
     
     @return: A list of FileTarget objects, one for each object being
-    built.
+    built. If a precompiled header was synthesized (see L{useAutoPch})
+    and the compiler builds an object with it, that object is included.
     """
     compiler = self.clone()
     for k, v in kwargs.iteritems():
@@ -1293,19 +1641,288 @@ class Compiler(Tool):
     
     @waitForAsyncResult
     def run(targetDir, sources, prerequisites):
+      autoPch = None
+      autoPchSources = frozenset()
+      if pch is None and compiler.useAutoPch and compiler.enabled:
+        autoPch, autoPchSources = compiler._getAutoPch(
+          targetDir,
+          [getPath(s) for s in sources],
+          prerequisites,
+          )
+      
       results = []
       for source in sources:
         sourcePath = getPath(source)
         sourceName = cake.path.baseNameWithoutExtension(sourcePath)
         targetPath = cake.path.join(targetDir, sourceName)
+        if sourcePath in autoPchSources:
+          sourcePch = autoPch
+        else:
+          sourcePch = pch
         results.append(compiler._object(targetPath, source,
-                                        pch=pch, prerequisites=prerequisites))
+                                        pch=sourcePch, prerequisites=prerequisites))
+      
+      if autoPch is not None and compiler.pchObjectSuffix is not None:
+        # The object built with the pch must be linked with the objects.
+        results.append(getPchObject(autoPch))
       return results
+    
+    @waitForAsyncResult
+    def getPchObject(pchTarget):
+      return pchTarget.object
 
     basePath = self.configuration.basePath
     
     return run(basePath(targetDir), basePath(flatten(sources)), prerequisites)
 
+  def _getAutoPch(self, targetDir, sources, prerequisites):
+    """Precompile the headers most often included by a set of sources.
+    
+    Headers are chosen from the dependencies recorded when the objects
+    were last built. See L{useAutoPch}.
+    
+    @param targetDir: Path of the directory the objects are built in.
+    @type targetDir: string
+    
+    @param sources: Paths of the source files.
+    @type sources: list of string
+    
+    @param prerequisites: Prerequisites of the objects.
+    @type prerequisites: list of Task or FileTarget
+    
+    @return: The precompiled header and the set of sources that should use
+    it, or (None, an empty set) if no headers are worth precompiling.
+    @rtype: tuple of (L{PchTarget} or L{AsyncResult} or None,
+    frozenset of string)
+    """
+    configuration = self.configuration
+    engine = self.engine
+    abspath = configuration.abspath
+    baseDir = os.path.normcase(os.path.join(configuration.baseDir, ""))
+    
+    absTargetDir = os.path.normcase(os.path.normpath(abspath(targetDir)))
+    
+    # Index the files the objects, and any previous precompiled headers,
+    # depended on when they were last built by their file name.
+    dependencyPaths = {}
+    def addDependencies(target):
+      try:
+        dependencyInfo = engine.getDependencyInfo(abspath(target))
+      except DependencyInfoError:
+        return False
+      for path in dependencyInfo.depPaths:
+        path = os.path.normcase(os.path.normpath(abspath(path)))
+        dependencyPaths.setdefault(os.path.basename(path), set()).add(path)
+      return True
+    
+    candidates = []
+    for source in sources:
+      target = cake.path.forceExtension(
+        cake.path.join(targetDir, cake.path.baseNameWithoutExtension(source)),
+        self.objectSuffix,
+        )
+      if not addDependencies(target):
+        continue # Not built yet
+      try:
+        text = cake.filesys.readFile(abspath(source))
+      except EnvironmentError:
+        continue
+      candidates.append((source, _getLeadingIncludes(text)))
+    
+    # Objects that used an automatic pch depended on it.
+    previousNames = set()
+    for name, paths in dependencyPaths.items():
+      match = _autoPchNameRe.match(name)
+      if match is None:
+        continue
+      for path in paths:
+        if os.path.dirname(path) == absTargetDir:
+          previousNames.add(match.group(1))
+          addDependencies(path)
+    
+    def isExternal(name):
+      name = os.path.normcase(os.path.normpath(name))
+      suffix = os.sep + name
+      paths = [
+        p for p in dependencyPaths.get(os.path.basename(name), ())
+        if p.endswith(suffix)
+        ]
+      if not paths:
+        return False
+      for p in paths:
+        if p.startswith(baseDir):
+          return False
+      return True
+    
+    # Only the external headers included before any of the project's own
+    # headers can be included ahead of the rest of the source.
+    includeCounts = {}
+    prefixes = []
+    for source, includes in candidates:
+      prefix = []
+      for include in includes:
+        if not isExternal(include[0]):
+          break
+        prefix.append(include)
+      for name, _ in prefix:
+        includeCounts[name] = includeCounts.get(name, 0) + 1
+      prefixes.append((source, prefix))
+    
+    minimumCount = max(
+      self.autoPchMinimumObjects,
+      self.autoPchThreshold * len(candidates),
+      )
+    headers = set(
+      name for name, count in includeCounts.iteritems()
+      if count >= minimumCount
+      )
+    if not headers:
+      return None, frozenset()
+    
+    # Objects can only share a precompiled header with sources of the same
+    # language, so use it for the most common extension.
+    usersByExtension = {}
+    for source, prefix in prefixes:
+      if headers.issubset(name for name, _ in prefix):
+        extension = os.path.normcase(cake.path.extension(source))
+        usersByExtension.setdefault(extension, []).append((source, prefix))
+    extension, users = max(
+      usersByExtension.iteritems(),
+      key=lambda item: len(item[1]),
+      )
+    if len(users) < self.autoPchMinimumObjects:
+      return None, frozenset()
+    
+    lines = [
+      "// Generated by Cake from the headers most often included by the",
+      "// sources of a set of objects in this directory.",
+      ]
+    for source, prefix in users:
+      for name, angled in prefix:
+        if name in headers:
+          headers.discard(name)
+          if angled:
+            lines.append("#include <%s>" % name)
+          else:
+            lines.append('#include "%s"' % name)
+    
+    headerText = "\n".join(lines) + "\n"
+    baseName = self._getAutoPchName(targetDir, headerText, extension)
+    headerPath = cake.path.join(targetDir, baseName + ".h")
+    sourcePath = cake.path.join(targetDir, baseName + extension)
+    users = frozenset(source for source, _ in users)
+    
+    # The header is named by its absolute path so that compilers that
+    # match the header by name find the same header however it's included.
+    absHeaderPath = abspath(headerPath)
+    key = os.path.join(absTargetDir, os.path.normcase(baseName + ".h"))
+    self.__autoPchsLock.acquire()
+    try:
+      autoPchs = self.__autoPchs.setdefault(engine, {})
+      pchTarget = autoPchs.get(key, None)
+      if pchTarget is not None:
+        # Another call is already precompiling the same headers.
+        return pchTarget, users
+      
+      # Remove the files generated for headers the objects no longer use,
+      # unless they're in use by another call in this build.
+      for name in previousNames:
+        if name != baseName and \
+          os.path.join(absTargetDir, name + ".h") not in autoPchs:
+          self._removeAutoPchFiles(absTargetDir, name)
+      
+      self._writeAutoPchFile(absHeaderPath, headerText)
+      self._writeAutoPchFile(
+        abspath(sourcePath),
+        '#include "%s"\n' % absHeaderPath,
+        )
+      
+      engine.logger.outputDebug(
+        "reason",
+        "Precompiling %i headers for %i objects in '%s'.\n" % (
+          len(lines) - 2, len(users), targetDir),
+        )
+      
+      pchTarget = autoPchs[key] = self._pch(
+        headerPath,
+        sourcePath,
+        absHeaderPath,
+        prerequisites,
+        forceInclude=True,
+        )
+    finally:
+      self.__autoPchsLock.release()
+    return pchTarget, users
+  
+  def _getAutoPchName(self, targetDir, headerText, extension):
+    """Get the base name of the files generated for an automatic pch.
+    
+    The name only changes when the headers precompiled or the arguments
+    they're precompiled with change, so that adding or removing sources
+    doesn't rebuild the pch and the objects using it.
+    
+    @return: The file name without any extension.
+    @rtype: string
+    """
+    # Get the arguments for a pch with a fixed name. A dependency file
+    # would be created for the probe if it weren't kept.
+    probe = self.clone()
+    probe.keepDependencyFile = True
+    placeholder = cake.path.join(targetDir, "autopch.h")
+    target = cake.path.forceExtension(placeholder, self.pchSuffix)
+    if self.pchObjectSuffix is None:
+      object = None
+    else:
+      object = cake.path.stripExtension(target) + self.pchObjectSuffix
+    _, args, _ = probe.getPchCommands(
+      target,
+      cake.path.stripExtension(placeholder) + extension,
+      self.configuration.abspath(placeholder),
+      object,
+      )
+    
+    digest = cake.hash.sha1(
+      "\0".join([headerText, extension, repr(args)])
+      ).hexdigest()
+    return "autopch-" + digest[:8]
+  
+  def _removeAutoPchFiles(self, absTargetDir, name):
+    """Remove the files generated for an automatic pch that is no longer
+    used, eg. the header, source, pch and its dependency info.
+    """
+    try:
+      fileNames = os.listdir(absTargetDir)
+    except EnvironmentError:
+      return
+    prefix = os.path.normcase(name + ".")
+    for fileName in fileNames:
+      if not os.path.normcase(fileName).startswith(prefix):
+        continue
+      path = os.path.join(absTargetDir, fileName)
+      try:
+        os.remove(path)
+      except EnvironmentError:
+        continue # Eg. still open elsewhere, it's harmless to leave it.
+      self.engine.notifyFileChanged(path)
+  
+  def _writeAutoPchFile(self, path, text):
+    """Write a generated file, leaving it untouched if it's unchanged so
+    that the precompiled header isn't rebuilt.
+    """
+    try:
+      if cake.filesys.readFile(path) == text:
+        return
+    except EnvironmentError:
+      pass
+    
+    try:
+      cake.filesys.writeFile(path, text)
+    except EnvironmentError, e:
+      self.engine.raiseError(
+        "cake: Error writing precompiled header source %s: %s\n" % (path, str(e)),
+        )
+    self.engine.notifyFileChanged(path)
+    
   def sharedObjects(self, targetDir, sources, pch=None, prerequisites=[],
                     **kwargs):
     """Build a collection of objects used by a shared library/module to a target directory.
@@ -1429,7 +2046,7 @@ class Compiler(Tool):
         tasks = getTasks(sources)
         tasks.extend(getTasks(prerequisites))
         libraryTask = self.engine.createTask(build)
-        libraryTask.lazyStartAfter(tasks, threadPool=self.engine.scriptThreadPool)
+        libraryTask.lazyStartAfter(tasks, threadPool=self.engine.dependencyThreadPool)
       else:
         libraryTask = None
       
@@ -1561,7 +2178,7 @@ class Compiler(Tool):
         tasks.extend(getTasks(prerequisites))
         tasks.extend(getTasks(self.getLibraries()))
         moduleTask = self.engine.createTask(build)
-        moduleTask.lazyStartAfter(tasks, threadPool=self.engine.scriptThreadPool)
+        moduleTask.lazyStartAfter(tasks, threadPool=self.engine.dependencyThreadPool)
       else:
         moduleTask = None
      
@@ -1663,7 +2280,7 @@ class Compiler(Tool):
         tasks.extend(getTasks(prerequisites))
         tasks.extend(getTasks(libraries))
         programTask = self.engine.createTask(build)
-        programTask.lazyStartAfter(tasks, threadPool=self.engine.scriptThreadPool)
+        programTask.lazyStartAfter(tasks, threadPool=self.engine.dependencyThreadPool)
       else:
         programTask = None
     
@@ -1757,7 +2374,7 @@ class Compiler(Tool):
         tasks = getTasks([source])
         tasks.extend(getTasks(prerequisites))
         resourceTask = self.engine.createTask(build)
-        resourceTask.lazyStartAfter(tasks, threadPool=self.engine.scriptThreadPool)
+        resourceTask.lazyStartAfter(tasks, threadPool=self.engine.dependencyThreadPool)
       else:
         resourceTask = None
       
@@ -1915,7 +2532,92 @@ class Compiler(Tool):
     processExitCode=None,
     allowResponseFile=True,
     ):
-
+    """Run a process, blocking until it has finished.
+    
+    @return: The paths of the files the process depends on.
+    @rtype: list of string
+    """
+    command = self._prepareProcess(args, target, allowResponseFile)
+    try:
+      supervisor = self.engine.processSupervisor
+      if supervisor is not None:
+        result = supervisor.runAndWait(command.args, **command.keywords)
+      else:
+        result = self._waitForProcess(command)
+    finally:
+      command.cleanup()
+    
+    return self._finishProcess(
+      command,
+      result,
+      processStdout,
+      processStderr,
+      processExitCode,
+      )
+  
+  def _runProcessAsync(
+    self,
+    args,
+    target=None,
+    processStdout=None,
+    processStderr=None,
+    processExitCode=None,
+    allowResponseFile=True,
+    ):
+    """Run a process without blocking a thread while it runs.
+    
+    The process is run by the engine's process supervisor if it has one,
+    otherwise it is run on a worker thread as for L{_runProcess}.
+    
+    @return: A task that completes with the paths of the files the
+    process depends on.
+    @rtype: L{Task}
+    """
+    engine = self.engine
+    supervisor = engine.processSupervisor
+    if supervisor is None:
+      def run():
+        return self._runProcess(
+          args,
+          target,
+          processStdout,
+          processStderr,
+          processExitCode,
+          allowResponseFile,
+          )
+      runTask = engine.createTask(run)
+      runTask.start(immediate=True)
+      return runTask
+    
+    command = self._prepareProcess(args, target, allowResponseFile)
+    results = []
+    
+    def finish():
+      return self._finishProcess(
+        command,
+        results[0],
+        processStdout,
+        processStderr,
+        processExitCode,
+        )
+    finishTask = engine.createTask(finish)
+    
+    def processFinished(result):
+      command.cleanup()
+      results.append(result)
+      finishTask.start(immediate=True)
+    
+    supervisor.run(command.args, processFinished, **command.keywords)
+    return finishTask
+  
+  def _prepareProcess(self, args, target, allowResponseFile):
+    """Prepare to run a process.
+    
+    Creates the target's directory and the response file, if one is used.
+    
+    @return: The command to run.
+    @rtype: L{_ProcessCommand}
+    """
     if target is not None:
       absTarget = self.configuration.abspath(target)
       try:
@@ -1924,110 +2626,146 @@ class Compiler(Tool):
         msg = "cake: Error creating target directory %s: %s\n" % (
           cake.path.dirName(target), str(e))
         self.engine.raiseError(msg, targets=[target])
-
+    
+    command = _ProcessCommand(args[0], target)
+    if allowResponseFile and self.useResponseFile:
+      argsTemp, command.argsPath = tempfile.mkstemp(text=True)
+      argsFileString = "\n".join(_escapeArgs(args[1:]))
+      argsFile = os.fdopen(argsTemp, "wt")
+      argsFile.write(argsFileString)
+      argsFile.close()
+      args = [args[0], '@' + command.argsPath]
+    
+    argsString = " ".join(_escapeArgs(args))
+    
+    command.debugString = "run: %s\n" % argsString
+    if command.argsPath is not None:
+      command.debugString += "contents of %s: %s\n" % (
+        command.argsPath, argsFileString)
+      
+    self.engine.logger.outputDebug(
+      "run",
+      command.debugString,
+      )
+    
+    if cake.system.isWindows():
+      # Use shell=False to avoid command line length limits.
+      command.keywords["executable"] = self.configuration.abspath(args[0])
+      command.keywords["shell"] = False
+      command.args = argsString
+    elif _needsShell(args):
+      # Use shell=True to allow arguments to be escaped exactly as they
+      # would be on the command line.
+      command.keywords["shell"] = True
+      command.args = argsString
+    else:
+      # There is nothing for a shell to interpret, so save starting one
+      # by executing the program directly.
+      command.keywords["shell"] = False
+      command.args = list(args)
+    command.keywords["cwd"] = self.configuration.baseDir
+    command.keywords["env"] = self._getProcessEnv()
+    return command
+  
+  def _waitForProcess(self, command):
+    """Run a process on the current thread.
+    
+    @param command: The command to run.
+    @type command: L{_ProcessCommand}
+    
+    @return: The outcome of running the process.
+    @rtype: L{cake.supervisor.ProcessResult}
+    """
+    result = ProcessResult()
     stdout = None
     stderr = None
-    argsPath = None
     try:
       stdout = tempfile.TemporaryFile(mode="w+t")
       stderr = tempfile.TemporaryFile(mode="w+t")
       
-      if allowResponseFile and self.useResponseFile:
-        argsTemp, argsPath = tempfile.mkstemp(text=True)
-        argsFileString = "\n".join(_escapeArgs(args[1:]))
-        argsFile = os.fdopen(argsTemp, "wt")
-        argsFile.write(argsFileString)
-        argsFile.close()
-        args = [args[0], '@' + argsPath]
-      
-      argsString = " ".join(_escapeArgs(args))
-      
-      debugString = "run: %s\n" % argsString
-      if argsPath is not None:
-        debugString += "contents of %s: %s\n" % (argsPath, argsFileString)
-        
-      self.engine.logger.outputDebug(
-        "run",
-        debugString,
-        )
-
-      isTiming = self.engine.logger.debugEnabled("time")
-      if isTiming:
-        start = datetime.datetime.utcnow()
-        
-      if cake.system.isWindows():
-        # Use shell=False to avoid command line length limits.
-        executable = self.configuration.abspath(args[0])
-        shell = False
-      else:
-        # Use shell=True to allow arguments to be escaped exactly as they
-        # would be on the command line.
-        executable = None
-        shell = True
-      
+      result.startTime = time.time()
       try:
         p = subprocess.Popen(
-          args=argsString,
-          executable=executable,
-          shell=shell,
-          cwd=self.configuration.baseDir,
-          env=self._getProcessEnv(),
+          args=command.args,
           stdin=subprocess.PIPE,
           stdout=stdout,
           stderr=stderr,
+          **command.keywords
           )
       except EnvironmentError, e:
-        self.engine.raiseError(
-          "cake: failed to launch %s: %s\n" % (args[0], str(e)),
-          targets=[target],
-          )
+        result.error = e
+        return result
       p.stdin.close()
   
-      exitCode = p.wait()
-  
-      if isTiming:
-        elapsed = (datetime.datetime.utcnow() - start)
-        totalSeconds = _totalSeconds(elapsed)
-        self.engine.logger.outputDebug(
-          "time",
-          "time: %.3fs %s\n" % (totalSeconds, debugString[5:]),
-          )
+      result.exitCode = p.wait()
+      result.endTime = time.time()
   
       stdout.seek(0)
       stderr.seek(0)
   
-      stdoutText = stdout.read() 
-      stderrText = stderr.read()
+      result.stdout = stdout.read() 
+      result.stderr = stderr.read()
     finally:
       if stdout is not None:
         stdout.close()
       if stderr is not None:
         stderr.close()
-      if argsPath is not None:
-        os.remove(argsPath)
+    return result
+  
+  def _finishProcess(self, command, result, processStdout, processStderr,
+                     processExitCode):
+    """Report the outcome of running a process.
+    
+    @param command: The command that was run.
+    @type command: L{_ProcessCommand}
+    
+    @param result: The outcome of running the command.
+    @type result: L{cake.supervisor.ProcessResult}
     
-    if stdoutText:
+    @return: The paths of the files the process depends on.
+    @rtype: list of string
+    """
+    executable = command.executable
+    target = command.target
+    
+    if result.error is not None:
+      self.engine.raiseError(
+        "cake: failed to launch %s: %s\n" % (executable, str(result.error)),
+        targets=[target],
+        )
+    
+    elapsed = result.endTime - result.startTime
+    self.engine.stats.add("subprocesses")
+    self.engine.stats.add("subprocessTime", elapsed)
+    
+    if self.engine.logger.debugEnabled("time"):
+      self.engine.logger.outputDebug(
+        "time",
+        "time: %.3fs %s\n" % (elapsed, command.debugString[5:]),
+        )
+    
+    if result.stdout:
       if processStdout is not None:
-        processStdout(stdoutText)
+        processStdout(result.stdout)
       else:
-        self._outputStdout(stdoutText)
+        self._outputStdout(result.stdout)
     
-    if stderrText:
+    if result.stderr:
       if processStderr is not None:
-        processStderr(stderrText)
+        processStderr(result.stderr)
       else:
-        self._outputStderr(stderrText)
+        self._outputStderr(result.stderr)
       
     if processExitCode is not None:
-      processExitCode(exitCode)
-    elif exitCode != 0:
+      processExitCode(result.exitCode)
+    elif result.exitCode != 0:
       self.engine.raiseError(
-        "%s: failed with exit code %i\n" % (args[0], exitCode),
+        "%s: failed with exit code %i\n" % (executable, result.exitCode),
         targets=[target],
         )
       
     # TODO: Return DLL's/EXE's used by gcc.exe or MSVC as well.
-    return [args[0]]
+    return [executable]
   
   def _scanDependencyFile(self, depPath, target):
     self.engine.logger.outputDebug(
@@ -2035,7 +2773,15 @@ class Compiler(Tool):
       "scan: %s\n" % depPath,
       )
         
-    dependencies = parseDependencyFile(
+    processPool = self.engine.processPool
+    if processPool is not None and \
+      os.path.getsize(depPath) >= self.processPoolDependencyFileSize:
+      dependencies = processPool.apply(
+        parseDependencyFile,
+        (depPath, cake.path.extension(target)),
+        )
+    else:
+      dependencies = parseDependencyFile(
         depPath,
         cake.path.extension(target),
         )
@@ -2091,19 +2837,27 @@ class Compiler(Tool):
     @type objectPaths: list of strings
     """
     path = os.path.normcase(os.path.normpath(path))
-    libraryObjects = self.__libraryObjects.setdefault(self.configuration, {})
+    # Scripts and build tasks may run concurrently so guard the
+    # non-atomic WeakKeyDictionary.setdefault().
+    self.__libraryObjectsLock.acquire()
+    try:
+      libraryObjects = self.__libraryObjects.setdefault(self.configuration, {})
+    finally:
+      self.__libraryObjectsLock.release()
     libraryObjects[path] = tuple(objectPaths)
   
   def buildPch(self, target, source, header, object):
-    compile, args, _ = self.getPchCommands(
+    compile, args, canBeCached = self.getPchCommands(
       target,
       source,
       header,
       object,
       )
     
+    configuration = self.configuration
+    
     # Check if the target needs building
-    _, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
+    oldDependencyInfo, reasonToBuild = configuration.checkDependencyInfo(target, args)
     if not reasonToBuild:
       return # Target is up to date
     self.engine.logger.outputDebug(
@@ -2111,35 +2865,50 @@ class Compiler(Tool):
       "Rebuilding '" + target + "' because " + reasonToBuild + ".\n",
       )
 
+    # Precompiled headers are often large and tied to a single build so
+    # they are only cached along with the other non-object outputs.
+    useCacheForThisPch = (
+      canBeCached and
+      self.cacheAllOutputs and
+      self.objectCachePath is not None
+      )
+
     targets = [target]
-    if object is not None:
-      targets.append(object)
+    if object is not None and useCacheForThisPch:
+      targets.append(object) # Both are stored in and restored from the cache.
+    
+    if useCacheForThisPch:
+      message = self.pchMessage(target, source, header=header, cached=True)
+      if self._restoreFromObjectCache(targets, args, oldDependencyInfo, message) is not None:
+        return
 
     def command():
       message = self.pchMessage(target, source, header=header, cached=False)
       self.engine.logger.outputInfo(message)
       return compile()
 
-    compileTask = self.engine.createTask(command)
+    compileTask = self.engine.createTask(command, pool=self.compilePool)
     compileTask.parent.completeAfter(compileTask)
     compileTask.start(immediate=True)
 
-    def storeDependencyInfo():
-      abspath = self.configuration.abspath
-      normpath = os.path.normpath
-      dependencies = [
-          normpath(abspath(p))
-          for p in compileTask.result
-          ]
-      newDependencyInfo = self.configuration.createDependencyInfo(
-        targets=[target],
+    def storeDependencyInfoAndCache():
+      if useCacheForThisPch:
+        dependencies = self._getCacheDependencyPaths(compileTask.result)
+      else:
+        normAbspath = configuration.normAbspath
+        dependencies = [normAbspath(p) for p in compileTask.result]
+      newDependencyInfo = configuration.createDependencyInfo(
+        targets=targets,
         args=args,
         dependencies=dependencies,
-        calculateDigests=False,
+        calculateDigests=useCacheForThisPch,
         )
-      self.configuration.storeDependencyInfo(newDependencyInfo)
+      self._storeDependencyInfo(newDependencyInfo, oldDependencyInfo)
+
+      if useCacheForThisPch:
+        self._storeInObjectCache(targets, dependencies, newDependencyInfo)
         
-    storeDependencyTask = self.engine.createTask(storeDependencyInfo)
+    storeDependencyTask = self.engine.createTask(storeDependencyInfoAndCache)
     storeDependencyTask.parent.completeAfter(storeDependencyTask)
     storeDependencyTask.startAfter(compileTask, immediate=True)
 
@@ -2171,122 +2940,35 @@ class Compiler(Tool):
       )
 
     useCacheForThisObject = canBeCached and self.objectCachePath is not None
-    cacheDepMagic = "CKCH" 
     
-    if useCacheForThisObject:
-      #######################
-      # USING OBJECT CACHE
-      #######################
-      
-      # Prime the file digest cache from previous run so we don't have
-      # to recalculate file digests for files that haven't changed.
-      if oldDependencyInfo is not None:
-        configuration.primeFileDigestCache(oldDependencyInfo)
-      
-      # We either need to make all paths that form the cache digest relative
-      # to the workspace root or all of them absolute.
-      targetDigestPath = configuration.abspath(target)
-      if self.objectCacheWorkspaceRoot is not None:
-        workspaceRoot = configuration.abspath(self.objectCacheWorkspaceRoot)
-        workspaceRoot = os.path.normcase(workspaceRoot)
-        targetDigestPathNorm = os.path.normcase(targetDigestPath)
-        if cake.path.commonPath(targetDigestPathNorm, workspaceRoot) == workspaceRoot:
-          targetDigestPath = targetDigestPath[len(workspaceRoot)+1:]
-          
-      # Find the directory that will contain all cached dependency
-      # entries for this particular target object file.
-      targetDigest = cake.hash.sha1(targetDigestPath.encode("utf8")).digest()
-      targetDigestStr = cake.hash.hexlify(targetDigest)
-      targetCacheDir = cake.path.join(
-        self.objectCachePath,
-        targetDigestStr[0],
-        targetDigestStr[1],
-        targetDigestStr
-        )
-      targetCacheDir = configuration.abspath(targetCacheDir)
-      
-      # Find all entries in the directory
-      entries = set()
-      
-      # If doing a force build, pretend the cache is empty
-      if not self.engine.forceBuild:
-        try:
-          entries.update(os.listdir(targetCacheDir))
-        except EnvironmentError:
-          # Target cache dir doesn't exist, treat as if no entries
-          pass
-      
-      hexChars = "0123456789abcdefABCDEF"
-      
-      # Try to find the dependency files
-      for entry in entries:
-        # Skip any entry that's not a SHA-1 hash
-        if len(entry) != 40:
-          continue
-        skip = False
-        for c in entry:
-          if c not in hexChars:
-            skip = True
-            break
-        if skip:
-          continue
-
-        cacheDepPath = cake.path.join(targetCacheDir, entry)
-        
-        try:
-          cacheDepContents = cake.filesys.readFile(cacheDepPath)
-        except EnvironmentError:
-          continue
-        
-        # Check for the correct signature to make sure the file isn't corrupt
-        cacheDepMagicLen = len(cacheDepMagic)
-        cacheDepSignature = cacheDepContents[-cacheDepMagicLen:]
-        cacheDepContents = cacheDepContents[:-cacheDepMagicLen]
-        
-        if cacheDepSignature != cacheDepMagic:
-          # Invalid signature
-          continue
-        
-        try:
-          candidateDependencies = pickle.loads(cacheDepContents)
-        except Exception:
-          # Invalid dependency file for this entry
-          continue
-        
-        if not isinstance(candidateDependencies, list):
-          # Data format change
-          continue
-        
-        try:
-          newDependencyInfo = configuration.createDependencyInfo(
-            targets=[target],
-            args=args,
-            dependencies=candidateDependencies,
-            )
-        except EnvironmentError:
-          # One of the dependencies didn't exist
-          continue
-        
-        # Check if the state of our files matches that of a cached object file.
-        cachedObjectDigest = configuration.calculateDigest(newDependencyInfo)
-        cachedObjectDigestStr = cake.hash.hexlify(cachedObjectDigest)
-        cachedObjectPath = cake.path.join(
-          self.objectCachePath,
-          cachedObjectDigestStr[0],
-          cachedObjectDigestStr[1],
-          cachedObjectDigestStr
+    sharedCompile = None
+    if self.shareIdenticalObjects and canBeCached:
+      sharedCompile, isOwner = self._getSharedCompile(target, args)
+      if sharedCompile is not None and not isOwner:
+        self._copySharedObject(
+          sharedCompile,
+          target,
+          args,
+          oldDependencyInfo,
+          self.objectMessage(target, source, pch=getPath(pch), shared=shared, cached=True),
+          useCacheForThisObject,
           )
-        cachedObjectPath = configuration.abspath(cachedObjectPath)
-        if cake.filesys.isFile(cachedObjectPath):
-          message = self.objectMessage(target, source, pch=getPath(pch), shared=shared, cached=True)
-          self.engine.logger.outputInfo(message)
-          try:
-            cake.zipping.decompressFile(cachedObjectPath, configuration.abspath(target))
-          except EnvironmentError:
-            continue # Invalid cache file
-          configuration.storeDependencyInfo(newDependencyInfo)
-          # Successfully restored object file and saved new dependency info file.
-          return
+        return
+    
+    if useCacheForThisObject:
+      message = self.objectMessage(target, source, pch=getPath(pch), shared=shared, cached=True)
+      try:
+        newDependencyInfo = self._restoreFromObjectCache([target], args, oldDependencyInfo, message)
+      except:
+        # Don't leave other targets waiting for this compile.
+        if sharedCompile is not None:
+          sharedCompile.task.cancel()
+        raise
+      if newDependencyInfo is not None:
+        if sharedCompile is not None:
+          sharedCompile.dependencies = newDependencyInfo.depPaths
+          sharedCompile.task.start()
+        return
 
     # Else, if we get here we didn't find the object in the cache so we need
     # to actually execute the build.
@@ -2298,25 +2980,7 @@ class Compiler(Tool):
     def storeDependencyInfoAndCache():
       # Since we are sharing this object in the object cache we need to
       # make any paths in this workspace relative to the current workspace.
-      abspath = configuration.abspath
-      normpath = os.path.normpath
-      dependencies = []
-      if self.objectCacheWorkspaceRoot is None:
-        dependencies = [
-          normpath(abspath(p))
-          for p in compileTask.result
-          ]
-      else:
-        workspaceRoot = os.path.normcase(
-          configuration.abspath(self.objectCacheWorkspaceRoot)
-          ) + os.path.sep
-        workspaceRootLen = len(workspaceRoot)
-        for path in compileTask.result:
-          path = normpath(abspath(path))
-          pathNorm = os.path.normcase(path)
-          if pathNorm.startswith(workspaceRoot):
-            path = path[workspaceRootLen:]
-          dependencies.append(path)
+      dependencies = self._getCacheDependencyPaths(compileTask.result)
       
       newDependencyInfo = configuration.createDependencyInfo(
         targets=[target],
@@ -2324,53 +2988,539 @@ class Compiler(Tool):
         dependencies=dependencies,
         calculateDigests=useCacheForThisObject,
         )
-      configuration.storeDependencyInfo(newDependencyInfo)
+      self._storeDependencyInfo(newDependencyInfo, oldDependencyInfo)
 
       # Finally update the cache if necessary
       if useCacheForThisObject:
-        try:
-          objectDigest = configuration.calculateDigest(newDependencyInfo)
-          objectDigestStr = cake.hash.hexlify(objectDigest)
-          
-          dependencyDigest = cake.hash.sha1()
-          for dep in dependencies:
-            dependencyDigest.update(dep.encode("utf8"))
-          dependencyDigest = dependencyDigest.digest()
-          dependencyDigestStr = cake.hash.hexlify(dependencyDigest)
-          
-          cacheDepPath = cake.path.join(
-            targetCacheDir,
-            dependencyDigestStr
-            )
-          cacheObjectPath = cake.path.join(
-            self.objectCachePath,
-            objectDigestStr[0],
-            objectDigestStr[1],
-            objectDigestStr,
-            )
-          cacheObjectPath = configuration.abspath(cacheObjectPath)
-
-          # Copy the object file first, then the dependency file
-          # so that other processes won't find the dependency until
-          # the object file is ready.
-          cake.zipping.compressFile(configuration.abspath(target), cacheObjectPath)
-          
-          if not cake.filesys.isFile(cacheDepPath):
-            dependencyString = pickle.dumps(dependencies, pickle.HIGHEST_PROTOCOL)       
-            cake.filesys.writeFile(cacheDepPath, dependencyString + cacheDepMagic)
-            
-        except EnvironmentError:
-          # Don't worry if we can't put the object in the cache
-          # The build shouldn't fail.
-          pass
-    
-    compileTask = self.engine.createTask(command)
+        self._storeInObjectCache([target], dependencies, newDependencyInfo)
+      
+      if sharedCompile is not None:
+        sharedCompile.dependencies = dependencies
+    
+    compileTask = self.engine.createTask(command, pool=self.compilePool)
     compileTask.parent.completeAfter(compileTask)
     compileTask.start(immediate=True)
 
     storeDependencyTask = self.engine.createTask(storeDependencyInfoAndCache)
     storeDependencyTask.parent.completeAfter(storeDependencyTask)
     storeDependencyTask.startAfter(compileTask, immediate=True)
+    
+    if sharedCompile is not None:
+      sharedCompile.task.startAfter(storeDependencyTask)
+
+  def _getSharedCompile(self, target, args):
+    """Find or register the compile of an object that may be shared with
+    other targets compiled identically during this build.
+    
+    @param target: Path of the target object file.
+    @type target: string
+    
+    @param args: The args of the compile.
+    @type args: list of string
+    
+    @return: A tuple of the L{_SharedCompile} and True if the caller
+    registered it and must compile the object, or (None, False) if the
+    compile can't be shared.
+    @rtype: tuple of (L{_SharedCompile} or None, bool)
+    """
+    if not isinstance(args, (list, tuple)):
+      return None, False
+    
+    # The args name the target, so replace it with a placeholder to
+    # match the same compile of other targets. The environment can
+    # change the output too, eg. a different PATH finds another compiler.
+    key = [
+      self.configuration.baseDir,
+      self.__class__.__name__,
+      tuple(sorted(self._getProcessEnv().iteritems())),
+      ]
+    for arg in args:
+      if not isinstance(arg, basestring):
+        return None, False
+      key.append(arg.replace(target, "\0"))
+    key = tuple(key)
+    
+    engine = self.engine
+    self.__sharedCompilesLock.acquire()
+    try:
+      sharedCompiles = self.__sharedCompiles.setdefault(engine, {})
+      sharedCompile = sharedCompiles.get(key, None)
+      if sharedCompile is not None:
+        return sharedCompile, False
+      sharedCompile = sharedCompiles[key] = _SharedCompile(
+        target,
+        engine.createTask(),
+        )
+      return sharedCompile, True
+    finally:
+      self.__sharedCompilesLock.release()
+  
+  def _copySharedObject(self, sharedCompile, target, args, oldDependencyInfo,
+                        message, calculateDigests):
+    """Copy an object compiled for another target once it is built.
+    
+    @param sharedCompile: The compile to copy the object of.
+    @type sharedCompile: L{_SharedCompile}
+    
+    @param target: Path of the target object file.
+    @type target: string
+    
+    @param args: The args of the compile.
+    
+    @param oldDependencyInfo: The target's previous dependency info or None.
+    @type oldDependencyInfo: L{cake.engine.DependencyInfo} or None
+    
+    @param message: The message to output when the object is copied.
+    @type message: string
+    
+    @param calculateDigests: Whether to store the digests of the
+    dependencies in the new dependency info.
+    @type calculateDigests: bool
+    """
+    configuration = self.configuration
+    
+    def copy():
+      self.engine.logger.outputInfo(message)
+      
+      absTarget = configuration.abspath(target)
+      cake.filesys.makeDirs(cake.path.dirName(absTarget))
+      cake.filesys.copyFile(configuration.abspath(sharedCompile.target), absTarget)
+      self.engine.notifyFileChanged(absTarget)
+      self.engine.stats.add("sharedCompiles")
+      
+      newDependencyInfo = configuration.createDependencyInfo(
+        targets=[target],
+        args=args,
+        dependencies=sharedCompile.dependencies,
+        calculateDigests=calculateDigests,
+        )
+      self._storeDependencyInfo(newDependencyInfo, oldDependencyInfo)
+    
+    copyTask = self.engine.createTask(copy)
+    copyTask.parent.completeAfter(copyTask)
+    copyTask.startAfter(sharedCompile.task, immediate=True)
+
+  def _storeDependencyInfo(self, dependencyInfo, oldDependencyInfo):
+    """Store the dependency info of a target after it was built.
+    
+    If L{useEarlyCutoff} is enabled any outputs that are unchanged since
+    the previous build keep their previous timestamps.
+    
+    @param dependencyInfo: The new dependency info of the target.
+    @type dependencyInfo: L{cake.engine.DependencyInfo}
+    
+    @param oldDependencyInfo: The target's previous dependency info or None.
+    @type oldDependencyInfo: L{cake.engine.DependencyInfo} or None
+    """
+    if self.useEarlyCutoff:
+      self.configuration.preserveUnchangedTargets(dependencyInfo, oldDependencyInfo)
+    self.configuration.storeDependencyInfo(dependencyInfo)
+
+  _cacheMagic = "CKCH"
+  
+  def _getCacheDependencyPaths(self, dependencies):
+    """Get the paths of dependencies as they are stored in the object cache.
+    
+    Paths under the L{objectCacheWorkspaceRoot} are made relative to it
+    so that workspaces at different paths can share the cache.
+    
+    @param dependencies: The paths of the dependencies.
+    @type dependencies: list of string
+    
+    @return: The normalised paths of the dependencies.
+    @rtype: list of string
+    """
+    normAbspath = self.configuration.normAbspath
+    if self.objectCacheWorkspaceRoot is None:
+      return [normAbspath(p) for p in dependencies]
+    
+    workspaceRoot = os.path.normcase(
+      self.configuration.abspath(self.objectCacheWorkspaceRoot)
+      ) + os.path.sep
+    workspaceRootLen = len(workspaceRoot)
+    paths = []
+    for path in dependencies:
+      path = normAbspath(path)
+      pathNorm = os.path.normcase(path)
+      if pathNorm.startswith(workspaceRoot):
+        path = path[workspaceRootLen:]
+      paths.append(path)
+    return paths
+  
+  def _getCacheEntryPath(self, digest):
+    """Get the path of the object cache entry for a digest.
+    
+    The entry's first output is stored at this path. Any other outputs
+    are stored alongside it, see L{_storeCacheEntry}.
+    
+    @param digest: The digest of the build's inputs.
+    @type digest: string of 20 bytes
+    
+    @rtype: string
+    """
+    digestStr = cake.hash.hexlify(digest)
+    return self.configuration.abspath(cake.path.join(
+      self.objectCachePath,
+      digestStr[0],
+      digestStr[1],
+      digestStr,
+      ))
+  
+  def _getCacheTargetDir(self, target):
+    """Get the directory that holds the cached dependency lists of a target.
+    
+    @param target: Path of the target file.
+    @type target: string
+    
+    @rtype: string
+    """
+    configuration = self.configuration
+    
+    # We either need to make all paths that form the cache digest relative
+    # to the workspace root or all of them absolute.
+    targetDigestPath = configuration.abspath(target)
+    if self.objectCacheWorkspaceRoot is not None:
+      workspaceRoot = configuration.abspath(self.objectCacheWorkspaceRoot)
+      workspaceRoot = os.path.normcase(workspaceRoot)
+      targetDigestPathNorm = os.path.normcase(targetDigestPath)
+      if cake.path.commonPath(targetDigestPathNorm, workspaceRoot) == workspaceRoot:
+        targetDigestPath = targetDigestPath[len(workspaceRoot)+1:]
+        
+    targetDigest = cake.hash.sha1(targetDigestPath.encode("utf8")).digest()
+    targetDigestStr = cake.hash.hexlify(targetDigest)
+    targetCacheDir = cake.path.join(
+      self.objectCachePath,
+      targetDigestStr[0],
+      targetDigestStr[1],
+      targetDigestStr
+      )
+    return configuration.abspath(targetCacheDir)
+  
+  def _restoreCacheEntry(self, cacheEntryPath, targets, message):
+    """Restore the outputs of a build from an object cache entry.
+    
+    @param cacheEntryPath: The path of the cache entry.
+    @type cacheEntryPath: string
+    
+    @param targets: The paths of the targets the build must produce.
+    @type targets: list of string
+    
+    @param message: The message to output if the entry is restored.
+    @type message: string
+    
+    @return: The paths of all targets restored from the entry, or None
+    if there was no valid entry.
+    @rtype: list of string or None
+    """
+    if not cake.filesys.isFile(cacheEntryPath):
+      return None
+    
+    try:
+      outputsString = cake.filesys.readFile(cacheEntryPath + ".outputs")
+    except EnvironmentError:
+      # Entry with a single output
+      outputs = [targets[0]]
+    else:
+      magicLen = len(self._cacheMagic)
+      if outputsString[-magicLen:] != self._cacheMagic:
+        return None # Invalid signature
+      try:
+        outputs = pickle.loads(outputsString[:-magicLen])
+      except Exception:
+        return None
+      if not isinstance(outputs, list):
+        return None # Data format change
+    
+    for target in targets:
+      if target not in outputs:
+        return None # Entry doesn't have all the outputs we need
+    
+    self.engine.logger.outputInfo(message)
+    
+    from cake.zipping import decompressFile
+    abspath = self.configuration.abspath
+    restoredBytes = 0
+    try:
+      for i in xrange(len(outputs)):
+        if i == 0:
+          outputPath = cacheEntryPath
+        else:
+          outputPath = "%s.%i" % (cacheEntryPath, i)
+        absTarget = abspath(outputs[i])
+        decompressFile(outputPath, absTarget)
+        restoredBytes += os.path.getsize(absTarget)
+    except EnvironmentError:
+      return None # Invalid cache file
+    
+    self.engine.stats.add("objectCacheHits")
+    self.engine.stats.add("objectCacheRestoredBytes", restoredBytes)
+    return outputs
+  
+  def _storeCacheEntry(self, cacheEntryPath, targets):
+    """Store the outputs of a build in an object cache entry.
+    
+    The first target is stored at the entry's path. Any other targets are
+    stored at the entry's path with a '.<index>' suffix and listed in a
+    '.outputs' file. The first target is written last so that other
+    processes won't find the entry until all of its outputs are ready.
+    
+    @param cacheEntryPath: The path of the cache entry.
+    @type cacheEntryPath: string
+    
+    @param targets: The paths of the targets produced by the build.
+    @type targets: list of string
+    
+    @raise EnvironmentError: If the entry could not be written.
+    """
+    from cake.zipping import compressFile
+    abspath = self.configuration.abspath
+    for i in xrange(1, len(targets)):
+      compressFile(abspath(targets[i]), "%s.%i" % (cacheEntryPath, i))
+    if len(targets) > 1:
+      outputsString = pickle.dumps(list(targets), pickle.HIGHEST_PROTOCOL)
+      cake.filesys.writeFile(
+        cacheEntryPath + ".outputs",
+        outputsString + self._cacheMagic,
+        )
+    compressFile(abspath(targets[0]), cacheEntryPath)
+  
+  def _restoreFromObjectCache(self, targets, args, oldDependencyInfo, message):
+    """Try to restore the outputs of a compile from the object cache.
+    
+    The dependencies of a compile aren't known until it has run, so the
+    cache keeps the lists of dependencies previously seen for the first
+    target and checks for an entry matching each of them in turn.
+    
+    @param targets: The paths of the targets of the compile.
+    @type targets: list of string
+    
+    @param args: The args of the compile.
+    
+    @param oldDependencyInfo: The target's previous dependency info or None.
+    @type oldDependencyInfo: L{cake.engine.DependencyInfo} or None
+    
+    @param message: The message to output if the targets are restored.
+    @type message: string
+    
+    @return: The new dependency info of the targets if they were
+    restored, or None if they need to be built.
+    @rtype: L{cake.engine.DependencyInfo} or None
+    """
+    configuration = self.configuration
+    
+    # Prime the file digest cache from previous run so we don't have
+    # to recalculate file digests for files that haven't changed.
+    if oldDependencyInfo is not None:
+      configuration.primeFileDigestCache(oldDependencyInfo)
+    
+    # Find the directory that will contain all cached dependency
+    # entries for this particular target.
+    targetCacheDir = self._getCacheTargetDir(targets[0])
+    
+    # Find all entries in the directory
+    entries = set()
+    
+    # If doing a force build, pretend the cache is empty
+    if not self.engine.forceBuild:
+      try:
+        entries.update(os.listdir(targetCacheDir))
+      except EnvironmentError:
+        # Target cache dir doesn't exist, treat as if no entries
+        pass
+    
+    hexChars = "0123456789abcdefABCDEF"
+    cacheDepMagic = self._cacheMagic
+    cacheDepMagicLen = len(cacheDepMagic)
+    
+    # Try to find the dependency files
+    for entry in entries:
+      # Skip any entry that's not a SHA-1 hash
+      if len(entry) != 40:
+        continue
+      skip = False
+      for c in entry:
+        if c not in hexChars:
+          skip = True
+          break
+      if skip:
+        continue
+
+      cacheDepPath = cake.path.join(targetCacheDir, entry)
+      
+      try:
+        cacheDepContents = cake.filesys.readFile(cacheDepPath)
+      except EnvironmentError:
+        continue
+      
+      # Check for the correct signature to make sure the file isn't corrupt
+      cacheDepSignature = cacheDepContents[-cacheDepMagicLen:]
+      cacheDepContents = cacheDepContents[:-cacheDepMagicLen]
+      
+      if cacheDepSignature != cacheDepMagic:
+        # Invalid signature
+        continue
+      
+      try:
+        candidateDependencies = pickle.loads(cacheDepContents)
+      except Exception:
+        # Invalid dependency file for this entry
+        continue
+      
+      if not isinstance(candidateDependencies, list):
+        # Data format change
+        continue
+      
+      try:
+        newDependencyInfo = configuration.createDependencyInfo(
+          targets=targets,
+          args=args,
+          dependencies=candidateDependencies,
+          )
+      except EnvironmentError:
+        # One of the dependencies didn't exist
+        continue
+      
+      # Check if the state of our files matches that of a cached build.
+      cacheEntryPath = self._getCacheEntryPath(
+        configuration.calculateDigest(newDependencyInfo)
+        )
+      if self._restoreCacheEntry(cacheEntryPath, targets, message) is not None:
+        self._storeDependencyInfo(newDependencyInfo, oldDependencyInfo)
+        # Successfully restored the targets and saved new dependency info file.
+        return newDependencyInfo
+
+    self.engine.stats.add("objectCacheMisses")
+    return None
+  
+  def _storeInObjectCache(self, targets, dependencies, dependencyInfo):
+    """Store the outputs of a compile in the object cache.
+    
+    @param targets: The paths of the targets of the compile.
+    @type targets: list of string
+    
+    @param dependencies: The paths of the dependencies of the compile as
+    returned by L{_getCacheDependencyPaths}.
+    @type dependencies: list of string
+    
+    @param dependencyInfo: The new dependency info of the targets.
+    @type dependencyInfo: L{cake.engine.DependencyInfo}
+    """
+    configuration = self.configuration
+    try:
+      cacheEntryPath = self._getCacheEntryPath(
+        configuration.calculateDigest(dependencyInfo)
+        )
+      
+      dependencyDigest = cake.hash.sha1()
+      for dep in dependencies:
+        dependencyDigest.update(dep.encode("utf8"))
+      dependencyDigest = dependencyDigest.digest()
+      dependencyDigestStr = cake.hash.hexlify(dependencyDigest)
+      
+      cacheDepPath = cake.path.join(
+        self._getCacheTargetDir(targets[0]),
+        dependencyDigestStr
+        )
+
+      # Copy the outputs first, then the dependency file
+      # so that other processes won't find the dependency until
+      # the outputs are ready.
+      self._storeCacheEntry(cacheEntryPath, targets)
+      
+      if not cake.filesys.isFile(cacheDepPath):
+        dependencyString = pickle.dumps(dependencies, pickle.HIGHEST_PROTOCOL)       
+        cake.filesys.writeFile(cacheDepPath, dependencyString + self._cacheMagic)
+        
+    except EnvironmentError:
+      # Don't worry if we can't put the outputs in the cache
+      # The build shouldn't fail.
+      pass
+  
+  def _runCachedCommand(self, target, args, build, scan, message, cachedMessage,
+                        oldDependencyInfo=None, calculateDigests=False):
+    """Run a build command, restoring its outputs from the object cache
+    if L{cacheAllOutputs} is enabled and the cache has a matching entry.
+    
+    Unlike a compile, the inputs of a link or archive are known before
+    it runs so the cache is looked up directly by the digest of the
+    args and the dependencies returned by scan.
+    
+    @param target: Path of the main target file.
+    @type target: string
+    
+    @param args: The args of the command.
+    
+    @param build: The function that builds the targets.
+    
+    @param scan: The function that returns a (targets, dependencies) tuple.
+    
+    @param message: The message to output if the command is run.
+    @type message: string
+    
+    @param cachedMessage: The message to output if the targets are
+    restored from the cache.
+    @type cachedMessage: string
+    
+    @param oldDependencyInfo: The target's previous dependency info or None.
+    @type oldDependencyInfo: L{cake.engine.DependencyInfo} or None
+    
+    @param calculateDigests: Whether to store the digests of the
+    dependencies in the new dependency info.
+    @type calculateDigests: bool
+    """
+    configuration = self.configuration
+    
+    cacheEntryPath = None
+    if self.cacheAllOutputs and self.objectCachePath is not None:
+      _, dependencies = scan()
+      try:
+        keyDependencyInfo = configuration.createDependencyInfo(
+          targets=[target],
+          args=args,
+          dependencies=self._getCacheDependencyPaths(dependencies),
+          )
+        cacheEntryPath = self._getCacheEntryPath(
+          configuration.calculateDigest(keyDependencyInfo)
+          )
+      except EnvironmentError:
+        pass # One of the dependencies didn't exist, let the build report it
+    
+      if cacheEntryPath is not None and not self.engine.forceBuild:
+        targets = self._restoreCacheEntry(cacheEntryPath, [target], cachedMessage)
+        if targets is not None:
+          newDependencyInfo = configuration.createDependencyInfo(
+            targets=targets,
+            args=args,
+            dependencies=dependencies,
+            calculateDigests=calculateDigests,
+            )
+          self._storeDependencyInfo(newDependencyInfo, oldDependencyInfo)
+          return
+        
+      self.engine.stats.add("objectCacheMisses")
+    
+    self.engine.logger.outputInfo(message)
+    
+    build()
+    
+    targets, dependencies = scan()
+    
+    newDependencyInfo = configuration.createDependencyInfo(
+      targets=targets,
+      args=args,
+      dependencies=dependencies,
+      calculateDigests=calculateDigests,
+      )
+    
+    self._storeDependencyInfo(newDependencyInfo, oldDependencyInfo)
+    
+    if cacheEntryPath is not None:
+      try:
+        self._storeCacheEntry(cacheEntryPath, targets)
+      except EnvironmentError:
+        # Don't worry if we can't put the outputs in the cache
+        # The build shouldn't fail.
+        pass
   
   def getPchCommands(self, target, source, header, object):
     """Get the command-lines for compiling a precompiled header.
@@ -2415,8 +3565,17 @@ class Compiler(Tool):
     
     args = repr(archive)
     
+    update = None
+    if self.useIncrementalArchiving:
+      updateCommands = self.getLibraryUpdateCommand(target, sources)
+      if updateCommands is not None:
+        update, scan = updateCommands
+        # Keep the members separate from the command so we can tell
+        # which members were added or removed since the last build.
+        args = [repr(update), list(sources)]
+    
     # Check if the target needs building
-    _, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
+    oldDependencyInfo, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
     if not reasonToBuild:
       return # Target is up to date
     self.engine.logger.outputDebug(
@@ -2424,23 +3583,39 @@ class Compiler(Tool):
       "Rebuilding '" + target + "' because " + reasonToBuild + ".\n",
       )
 
-    def command():
-      message = self.libraryMessage(target, sources, cached=False)
-      self.engine.logger.outputInfo(message)
-      
+    def build():
+      if update is not None and oldDependencyInfo is not None:
+        if cake.filesys.isFile(self.configuration.abspath(target)):
+          _, dependencies = scan()
+          members = self._getChangedLibraryMembers(
+            oldDependencyInfo,
+            args,
+            dependencies,
+            )
+          if members is not None:
+            changed, removed = members
+            self.engine.logger.outputDebug(
+              "reason",
+              "Updating %i and removing %i members of '%s'.\n" % (
+                len(changed), len(removed), target),
+              )
+            update(changed, removed)
+            return
       archive()
-      
-      targets, dependencies = scan()
-      
-      newDependencyInfo = self.configuration.createDependencyInfo(
-        targets=targets,
-        args=args,
-        dependencies=dependencies,
+
+    def command():
+      self._runCachedCommand(
+        target,
+        args,
+        build,
+        scan,
+        message=self.libraryMessage(target, sources, cached=False),
+        cachedMessage=self.libraryMessage(target, sources, cached=True),
+        oldDependencyInfo=oldDependencyInfo,
+        calculateDigests=update is not None,
         )
-      
-      self.configuration.storeDependencyInfo(newDependencyInfo)
 
-    archiveTask = self.engine.createTask(command)
+    archiveTask = self.engine.createTask(command, pool=self.archivePool)
     archiveTask.parent.completeAfter(archiveTask)
     archiveTask.start(immediate=True)
   
@@ -2453,6 +3628,63 @@ class Compiler(Tool):
     """
     self.engine.raiseError("Don't know how to archive %s\n" % target, targets=[target])
   
+  def getLibraryUpdateCommand(self, target, sources):
+    """Get the command for updating the members of an existing library.
+    
+    Used instead of L{getLibraryCommand} when L{useIncrementalArchiving}
+    is enabled. The args of the update command should not include the
+    members of the library.
+    
+    @return: A tuple (update, scan) where update is the function to call
+    with (changed, removed) lists of the paths of the objects to replace
+    in and remove from the library, and scan is a function that when
+    called returns a (targets, dependencies) tuple. Returns None if the
+    library can't be updated, in which case it is rebuilt from scratch.
+    """
+    return None
+  
+  def _getChangedLibraryMembers(self, oldDependencyInfo, args, dependencies):
+    """Find the members of a library that have changed since it was built.
+    
+    @param oldDependencyInfo: The library's previous dependency info.
+    @type oldDependencyInfo: L{cake.engine.DependencyInfo}
+    
+    @param args: The current [command, members] args of the library.
+    @type args: list
+    
+    @param dependencies: The current dependencies of the library.
+    @type dependencies: list of string
+    
+    @return: A tuple (changed, removed) of the paths of the members that
+    were changed or added and the paths of the members that were removed,
+    or None if the library must be rebuilt from scratch.
+    @rtype: tuple of (list of string, list of string) or None
+    """
+    oldArgs = oldDependencyInfo.args
+    if not isinstance(oldArgs, list) or len(oldArgs) != 2 or oldArgs[0] != args[0]:
+      return None # Not built incrementally or the command has changed
+    if not oldDependencyInfo.depDigests:
+      return None
+    
+    configuration = self.configuration
+    configuration.primeFileDigestCache(oldDependencyInfo)
+    oldDigests = dict(zip(oldDependencyInfo.depPaths, oldDependencyInfo.depDigests))
+    
+    abspath = configuration.abspath
+    digests = self.engine.getFileDigests([abspath(p) for p in dependencies])
+    
+    members = set(args[1])
+    changed = []
+    for i in xrange(len(dependencies)):
+      path = dependencies[i]
+      if oldDigests.get(path, None) != digests[i]:
+        if path not in members:
+          return None # The archiver has changed
+        changed.append(path)
+    
+    removed = [p for p in oldArgs[1] if p not in members]
+    return changed, removed
+  
   def buildModule(self, target, sources, importLibrary, installName):
     """Perform the actual build of a module.
     """
@@ -2461,7 +3693,7 @@ class Compiler(Tool):
     args = [repr(link), repr(scan)]
     
     # Check if the target needs building
-    _, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
+    oldDependencyInfo, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
     if not reasonToBuild:
       return # Target is up to date
     self.engine.logger.outputDebug(
@@ -2470,22 +3702,17 @@ class Compiler(Tool):
       )
 
     def command():
-      message = self.moduleMessage(target, sources, cached=False)
-      self.engine.logger.outputInfo(message)
-      
-      link()
-    
-      targets, dependencies = scan()
-      
-      newDependencyInfo = self.configuration.createDependencyInfo(
-        targets=targets,
-        args=args,
-        dependencies=dependencies,
+      self._runCachedCommand(
+        target,
+        args,
+        link,
+        scan,
+        message=self.moduleMessage(target, sources, cached=False),
+        cachedMessage=self.moduleMessage(target, sources, cached=True),
+        oldDependencyInfo=oldDependencyInfo,
         )
-      
-      self.configuration.storeDependencyInfo(newDependencyInfo)
   
-    moduleTask = self.engine.createTask(command)
+    moduleTask = self.engine.createTask(command, pool=self.linkPool)
     moduleTask.parent.completeAfter(moduleTask)
     moduleTask.start(immediate=True)
   
@@ -2517,7 +3744,7 @@ class Compiler(Tool):
     args = [repr(link), repr(scan)]
     
     # Check if the target needs building
-    _, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
+    oldDependencyInfo, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
     if not reasonToBuild:
       return # Target is up to date
     self.engine.logger.outputDebug(
@@ -2526,22 +3753,17 @@ class Compiler(Tool):
       )
 
     def command():
-      message = self.programMessage(target, sources, cached=False)
-      self.engine.logger.outputInfo(message)
-          
-      link()
-    
-      targets, dependencies = scan()
-      
-      newDependencyInfo = self.configuration.createDependencyInfo(
-        targets=targets,
-        args=args,
-        dependencies=dependencies,
+      self._runCachedCommand(
+        target,
+        args,
+        link,
+        scan,
+        message=self.programMessage(target, sources, cached=False),
+        cachedMessage=self.programMessage(target, sources, cached=True),
+        oldDependencyInfo=oldDependencyInfo,
         )
-      
-      self.configuration.storeDependencyInfo(newDependencyInfo)
 
-    programTask = self.engine.createTask(command)
+    programTask = self.engine.createTask(command, pool=self.linkPool)
     programTask.parent.completeAfter(programTask)
     programTask.start(immediate=True)
 
@@ -2576,7 +3798,7 @@ class Compiler(Tool):
     args = repr(compile)
     
     # Check if the target needs building
-    _, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
+    oldDependencyInfo, reasonToBuild = self.configuration.checkDependencyInfo(target, args)
     if not reasonToBuild:
       return # Target is up to date
     self.engine.logger.outputDebug(
@@ -2585,22 +3807,17 @@ class Compiler(Tool):
       )
 
     def command():
-      message = self.resourceMessage(target, source, cached=False)
-      self.engine.logger.outputInfo(message)
-      
-      compile()
-      
-      targets, dependencies = scan()
-      
-      newDependencyInfo = self.configuration.createDependencyInfo(
-        targets=targets,
-        args=args,
-        dependencies=dependencies,
+      self._runCachedCommand(
+        target,
+        args,
+        compile,
+        scan,
+        message=self.resourceMessage(target, source, cached=False),
+        cachedMessage=self.resourceMessage(target, source, cached=True),
+        oldDependencyInfo=oldDependencyInfo,
         )
-      
-      self.configuration.storeDependencyInfo(newDependencyInfo)
 
-    resourceTask = self.engine.createTask(command)
+    resourceTask = self.engine.createTask(command, pool=self.compilePool)
     resourceTask.parent.completeAfter(resourceTask)
     resourceTask.start(immediate=True)
   
@@ -57,6 +57,8 @@ class DummyCompiler(Compiler):
 
   def getObjectCommands(self, target, source, pch, shared):
     compilerArgs = list(self._getCompileArgs())
+    if pch is not None and pch.forceInclude:
+      compilerArgs.append('/FI' + pch.header)
     compilerArgs += [source, '/o' + target]
     
     def compile():
@@ -86,6 +88,22 @@ class DummyCompiler(Compiler):
       return [target], sources
       
     return archive, scan
+
+  def getLibraryUpdateCommand(self, target, sources):
+    args = ['ar', '/u', '/o' + target]
+
+    @makeCommand(args)
+    def update(changed, removed):
+      updateArgs = args + changed + ['/r' + p for p in removed]
+      self.engine.logger.outputDebug("run", "%s\n" % " ".join(updateArgs))
+      absTarget = self.configuration.abspath(target)
+      cake.filesys.writeFile(absTarget, "".encode("latin1"))
+
+    @makeCommand("dummy-scanner")
+    def scan():
+      return [target], sources
+
+    return update, scan
  
   def getProgramCommands(self, target, sources):
     return self._getLinkCommands(target, sources, dll=False)
@@ -11,6 +11,7 @@ from cake.library.compilers import Compiler, makeCommand, CompilerNotFoundError
 import cake.filesys
 import cake.path
 import cake.system
+import cake.toolcache
 import os
 import os.path
 import re
@@ -47,7 +48,16 @@ def _getMinGWInstallDir():
 
 def _getGccVersion(gccExe):
   """Returns the Gcc version number given an executable.
+
+  The version is cached until the executable changes.
   """
+  return cake.toolcache.cached(
+    ("gccVersion", gccExe),
+    lambda: _runGccVersion(gccExe),
+    files=[gccExe],
+    )
+
+def _runGccVersion(gccExe):
   stdout = tempfile.TemporaryFile(mode="w+t")
   try:
     try:
@@ -270,13 +280,13 @@ class GccCompiler(Compiler):
       args.append('-g')
 
     if language in ['c++', 'c++-header', 'c++-cpp-output']:
-      args.extend(self.cppFlags)
+      args.extend(self._cppFlags)
     elif language in ['c', 'c-header', 'cpp-output']:
-      args.extend(self.cFlags)
+      args.extend(self._cFlags)
     elif language in ['objective-c', 'objective-c-header', 'objc-cpp-output']:
-      args.extend(self.mFlags)
+      args.extend(self._mFlags)
     elif language in ['objective-c++', 'objective-c++-header', 'objective-c++-cpp-output']:
-      args.extend(self.mmFlags)
+      args.extend(self._mmFlags)
 
     if self.enableRtti is not None:
       if self.enableRtti:
@@ -347,10 +357,17 @@ class GccCompiler(Compiler):
     args = list(self._getCompileArgs(cake.path.extension(source), shared=False, pch=True))
     args.extend([source, '-o', target])
 
-    def compile():   
-      dependencies = self._runProcess(args + ['-MF', depPath], target)
-      dependencies.extend(self._scanDependencyFile(depPath, target))
-      return dependencies
+    def compile():
+      compileTask = self._runProcessAsync(args + ['-MF', depPath], target)
+      
+      def scan():
+        dependencies = compileTask.result
+        dependencies.extend(self._scanDependencyFile(depPath, target))
+        return dependencies
+      
+      scanTask = self.engine.createTask(scan)
+      scanTask.startAfter(compileTask, immediate=True)
+      return scanTask
     
     canBeCached = True
     return compile, args, canBeCached
@@ -367,13 +384,20 @@ class GccCompiler(Compiler):
         ])
         
     def compile():
-      dependencies = self._runProcess(args + ['-MF', depPath], target)
-      dependencies.extend(self._scanDependencyFile(depPath, target))
-              
-      if pch is not None:
-        dependencies.append(pch.path)
+      compileTask = self._runProcessAsync(args + ['-MF', depPath], target)
+      
+      def scan():
+        dependencies = compileTask.result
+        dependencies.extend(self._scanDependencyFile(depPath, target))
         
-      return dependencies
+        if pch is not None:
+          dependencies.append(pch.path)
+          
+        return dependencies
+      
+      scanTask = self.engine.createTask(scan)
+      scanTask.startAfter(compileTask, immediate=True)
+      return scanTask
     
     canBeCached = True
     return compile, args, canBeCached
@@ -383,8 +407,12 @@ class GccCompiler(Compiler):
     # q - Quick append file to the end of the archive
     # c - Don't warn if we had to create a new file
     # s - Build an index
-    args = [self._arExe, '-qcs']
-    args.extend(self.libraryFlags)
+    # T - Make a thin archive
+    if self.useThinArchives:
+      args = [self._arExe, '-qcsT']
+    else:
+      args = [self._arExe, '-qcs']
+    args.extend(self._libraryFlags)
     return args
 
   def getLibraryCommand(self, target, sources):
@@ -404,13 +432,48 @@ class GccCompiler(Compiler):
 
     return archive, scan
 
+  def getLibraryUpdateCommand(self, target, sources):
+    # Thin archives only hold the paths of their members so they are
+    # cheap to rewrite, and ar can't reliably replace or delete their
+    # members.
+    if self.useThinArchives:
+      return None
+
+    # ar identifies members by their file name, so objects with the same
+    # name in different directories can't be updated separately.
+    names = set(cake.path.baseName(s) for s in sources)
+    if len(names) != len(sources):
+      return None
+
+    # r - Replace existing members or add new ones
+    # c - Don't warn if we had to create a new file
+    # s - Build an index
+    args = [self._arExe, '-rcs']
+    args.extend(self._libraryFlags)
+    args.append(target)
+
+    @makeCommand(args)
+    def update(changed, removed):
+      if removed:
+        deleteArgs = [self._arExe, '-d', target]
+        deleteArgs.extend(cake.path.baseName(p) for p in removed)
+        self._runProcess(deleteArgs, target)
+      if changed or removed:
+        self._runProcess(args + changed, target)
+
+    @makeCommand("lib-scan")
+    def scan():
+      return [target], [args[0]] + sources
+
+    return update, scan
+
   @memoise
   def _getCommonLinkArgs(self, dll):
     args = [self._gccExe]
     if dll:
-      args.extend(self.moduleFlags)
+      args.extend(self._moduleFlags)
     else:
-      args.extend(self.programFlags)
+      args.extend(self._programFlags)
       
     if dll:
       args.append('-shared')
@@ -513,7 +576,7 @@ class WindowsGccCompiler(GccCompiler):
   @memoise
   def _getCommonResourceArgs(self):
     args = [self.__rcExe]
-    args.extend(self.resourceFlags)
+    args.extend(self._resourceFlags)
     args.extend("-D" + define for define in self.getDefines())
     args.extend("-I" + path for path in self.getIncludePaths())
     return args
@@ -559,7 +622,7 @@ class MacGccCompiler(GccCompiler):
   @memoise
   def _getCommonLibraryArgs(self):
     args = [self._libtoolExe]
-    args.extend(self.libraryFlags)
+    args.extend(self._libraryFlags)
     return args
   
   def getLibraryCommand(self, target, sources):
@@ -579,6 +642,10 @@ class MacGccCompiler(GccCompiler):
       return [target], [args[0]] + sources
 
     return archive, scan
+
+  def getLibraryUpdateCommand(self, target, sources):
+    # libtool can't update an existing static library.
+    return None
     
   @memoise
   def _getCommonLinkArgs(self, dll):
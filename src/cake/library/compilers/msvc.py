@@ -13,6 +13,7 @@ import threading
 import cake.filesys
 import cake.path
 import cake.system
+import cake.toolcache
 from cake.library.compilers import Compiler, makeCommand, CompilerNotFoundError
 from cake.library import memoise
 from cake.target import getPaths, getTasks
@@ -229,6 +230,18 @@ def findWindows10Sdks(windowsKits10Dir=None, targetArchitecture=None):
   if windowsKits10Dir is None:
     windowsKits10Dir = getWindowsKitsDir(version='10')
 
+  # Results are cached until an SDK version is added or removed.
+  return cake.toolcache.cached(
+    ("windows10Sdks", windowsKits10Dir, targetArchitecture),
+    lambda: _findWindows10Sdks(windowsKits10Dir, targetArchitecture),
+    files=[
+      cake.path.join(windowsKits10Dir, 'Include'),
+      cake.path.join(windowsKits10Dir, 'Lib'),
+      cake.path.join(windowsKits10Dir, 'bin'),
+      ],
+    )
+
+def _findWindows10Sdks(windowsKits10Dir, targetArchitecture):
   includeBase = cake.path.join(windowsKits10Dir, 'Include')
   libBase = cake.path.join(windowsKits10Dir, 'Lib')
   binBase = cake.path.join(windowsKits10Dir, 'bin')
@@ -277,6 +290,17 @@ def findUniversalCRuntimes(windowsKits10Dir=None, targetArchitecture=None):
   if windowsKits10Dir is None:
     windowsKits10Dir = getWindowsKitsDir(version='10')
 
+  # Results are cached until a CRT version is added or removed.
+  return cake.toolcache.cached(
+    ("universalCRuntimes", windowsKits10Dir, targetArchitecture),
+    lambda: _findUniversalCRuntimes(windowsKits10Dir, targetArchitecture),
+    files=[
+      cake.path.join(windowsKits10Dir, 'Include'),
+      cake.path.join(windowsKits10Dir, 'Lib'),
+      ],
+    )
+
+def _findUniversalCRuntimes(windowsKits10Dir, targetArchitecture):
   includeBase = cake.path.join(windowsKits10Dir, 'Include')
   libBase = cake.path.join(windowsKits10Dir, 'Lib')
 
@@ -622,6 +646,24 @@ class MsvcCompiler(Compiler):
     /Gm
   @type: bool
   """
+  useEmbeddedDebugInfo = False
+  """Embed debug info in object files rather than a shared PDB.
+  
+  By default when debugSymbols and pdbFile are both set every object
+  writes its debug info into the pdbFile as it is compiled. Compiles
+  that share the PDB then have to run one at a time and their objects
+  can't be stored in the object cache.
+  
+  When set to True objects embed their own debug info instead, and the
+  linker merges it into the pdbFile when linking. Compiles then run in
+  parallel and objects can be cached, at the cost of larger object
+  files and libraries. Minimal rebuild and edit-and-continue still need
+  a PDB, so this has no effect when either is enabled.
+  
+  Related compiler options::
+    /Z7
+  @type: bool
+  """
   useEditAndContinue = None
   """Use Edit and Continue.
   
@@ -816,11 +858,11 @@ class MsvcCompiler(Compiler):
  
     language = self._getLanguage(suffix)
     if language == 'c++':
-      args.extend(self.cppFlags)
+      args.extend(self._cppFlags)
     elif language == 'c++/cli':
-      args.extend(self.cppFlags)
+      args.extend(self._cppFlags)
     elif language == 'c':
-      args.extend(self.cFlags)
+      args.extend(self._cFlags)
 
     if self.enableRtti is not None:
       if self.enableRtti:
@@ -889,7 +931,8 @@ class MsvcCompiler(Compiler):
   @property
   @memoise
   def _needPdbFile(self):
-    if self.pdbFile is not None and self.debugSymbols:
+    if self.pdbFile is not None and self.debugSymbols and \
+      not self.useEmbeddedDebugInfo:
       return True
     elif self.useMinimalRebuild or self.useEditAndContinue:
       return True
@@ -933,6 +976,8 @@ class MsvcCompiler(Compiler):
       args.append(source)
       
     if pch is not None:
+      if pch.forceInclude:
+        args.append('/FI' + pch.header)
       args.extend([
         '/Yl' + _mungePathToSymbol(pch.path),
         '/Fp' + pch.path,
@@ -1037,7 +1082,7 @@ class MsvcCompiler(Compiler):
     if self.warningsAsErrors:
       args.append('/WX')
 
-    args.extend(self.libraryFlags)
+    args.extend(self._libraryFlags)
 
     return args
       
@@ -1060,6 +1105,27 @@ class MsvcCompiler(Compiler):
 
     return archive, scan
 
+  def getLibraryUpdateCommand(self, target, sources):
+    
+    args = list(self._getCommonLibraryArgs())
+
+    args.append('/OUT:' + target)
+    
+    @makeCommand(args)
+    def update(changed, removed):
+      # Passing the existing library as an input replaces any members
+      # with the same name as the changed objects.
+      if changed or removed:
+        updateArgs = args + [target] + changed
+        updateArgs.extend('/REMOVE:' + p for p in removed)
+        self._runProcess(updateArgs, target)
+
+    @makeCommand("lib-scan")
+    def scan():
+      return [target], [self.__libExe] + sources
+
+    return update, scan
+
   @memoise
   def _getLinkCommonArgs(self, dll):
     
@@ -1079,9 +1145,9 @@ class MsvcCompiler(Compiler):
 
     if dll:
       args.append('/DLL')
-      args.extend(self.moduleFlags)
+      args.extend(self._moduleFlags)
     else:
-      args.extend(self.programFlags)
+      args.extend(self._programFlags)
       
     if self.useFunctionLevelLinking is not None:
       if self.useFunctionLevelLinking:
@@ -1381,7 +1447,7 @@ class MsvcCompiler(Compiler):
   @memoise
   def _getCommonResourceArgs(self):
     args = [self.__rcExe] # Cannot use '/nologo' due to WindowsSDK 6.0A rc.exe not supporting it.
-    args.extend(self.resourceFlags)
+    args.extend(self._resourceFlags)
     args.extend("/d" + define for define in self.getDefines())
     args.extend("/i" + path for path in self.getIncludePaths())
     return args
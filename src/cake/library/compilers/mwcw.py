@@ -137,11 +137,11 @@ class MwcwCompiler(Compiler):
 
     language = self._getLanguage(suffix)
     if language in ['c++', 'cplus', 'ec++']:
-      args.extend(self.cppFlags)
+      args.extend(self._cppFlags)
     elif language in ['c', 'c99']:
-      args.extend(self.cFlags)
+      args.extend(self._cFlags)
     elif language == 'objc':
-      args.extend(self.mFlags)
+      args.extend(self._mFlags)
 
     if self.enableRtti is not None:
       if self.enableRtti:
@@ -214,9 +214,16 @@ class MwcwCompiler(Compiler):
     args.extend([source, '-precompile', target])
     
     def compile():
-      dependencies = self._runProcess(args + ['-MF', depPath], target)
-      dependencies.extend(self._scanDependencyFile(depPath, target))
-      return dependencies
+      compileTask = self._runProcessAsync(args + ['-MF', depPath], target)
+      
+      def scan():
+        dependencies = compileTask.result
+        dependencies.extend(self._scanDependencyFile(depPath, target))
+        return dependencies
+      
+      scanTask = self.engine.createTask(scan)
+      scanTask.startAfter(compileTask, immediate=True)
+      return scanTask
 
     canBeCached = True
     return compile, args, canBeCached   
@@ -230,13 +237,20 @@ class MwcwCompiler(Compiler):
       args.extend(['-include', pch.path])
 
     def compile():
-      dependencies = self._runProcess(args + ['-MF', depPath], target)
-      dependencies.extend(self._scanDependencyFile(depPath, target))
+      compileTask = self._runProcessAsync(args + ['-MF', depPath], target)
       
-      if pch is not None:
-        dependencies.append(pch.path)
-
-      return dependencies
+      def scan():
+        dependencies = compileTask.result
+        dependencies.extend(self._scanDependencyFile(depPath, target))
+        
+        if pch is not None:
+          dependencies.append(pch.path)
+          
+        return dependencies
+      
+      scanTask = self.engine.createTask(scan)
+      scanTask.startAfter(compileTask, immediate=True)
+      return scanTask
 
     canBeCached = True
     return compile, args, canBeCached    
@@ -245,7 +259,7 @@ class MwcwCompiler(Compiler):
   def _getCommonLibraryArgs(self):
     args = [self.__ldExe, '-library']
     args.extend(self._getCommonArgs())
-    args.extend(self.libraryFlags)
+    args.extend(self._libraryFlags)
     return args
   
   def getLibraryCommand(self, target, sources):
@@ -274,9 +288,9 @@ class MwcwCompiler(Compiler):
     args.extend(self._getCommonArgs())
     
     if dll:
-      args.extend(self.moduleFlags)
+      args.extend(self._moduleFlags)
     else:
-      args.extend(self.programFlags)
+      args.extend(self._programFlags)
     
     if self.linkerScript is not None:
       args.extend(['-lcf', self.linkerScript])
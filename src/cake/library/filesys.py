@@ -5,15 +5,23 @@
 @license: Licensed under the MIT license.
 """
 
-import glob
+import os
+import os.path
+import stat
+
 import cake.path
 import cake.filesys
+import cake.task
 
 from cake.async import flatten, waitForAsyncResult
 from cake.target import DirectoryTarget, FileTarget, getPath, getTask
 from cake.library import Tool
 from cake.script import Script
 
+# Modification times set with os.utime() may be rounded to the nearest
+# microsecond, so are compared with this tolerance in seconds.
+_timestampTolerance = 0.001
+
 class FileSystemTool(Tool):
   """Tool that provides file system related utilities. 
   """
@@ -44,6 +52,7 @@ class FileSystemTool(Tool):
       path=absPath,
       recursive=recursive,
       includeMatch=includeMatch,
+      listDirectory=self.engine.listDirectory,
       )
 
   def glob(self, pathname):
@@ -58,7 +67,8 @@ class FileSystemTool(Tool):
     absPath = configuration.abspath(basePath)
     offset = len(absPath) - len(pathname)
     
-    return [p[offset:] for p in glob.iglob(absPath)]
+    listDirectory = self.engine.listDirectory
+    return [p[offset:] for p in cake.filesys.iglob(absPath, listDirectory)]
       
   def copyFile(self, source, target, onlyNewer=True):
     """Copy a file from one location to another.
@@ -182,10 +192,17 @@ class FileSystemTool(Tool):
     onlyNewer=True,
     removeStale=False,
     includeMatch=None,
+    bulk=False,
+    listFiles=False,
     ):
     """Copy the contents of a source directory to a target directory.
     
     If the target directory does not exist it will be created.
+
+    By default each file is copied by its own task. For directories
+    containing many files use bulk=True. The source and target
+    directories are then compared by a single task, and the files that
+    have changed are copied across the worker threads.
     
     @param sourceDir: The name of the source directory to copy from.
     @type sourceDir: string
@@ -209,10 +226,22 @@ class FileSystemTool(Tool):
     returns True to copy the file or False to exclude it, or a regular
     expression function such as re.compile().match or re.match.
     @type includeMatch: any callable 
+
+    @param bulk: Copy the directory using a single task rather than a
+    task per file. A file is then copied if its size or modification time
+    differs from the target's, and copied files are given the
+    modification time of their source.
+    @type bulk: bool
+
+    @param listFiles: When copying in bulk, return a target for each file
+    and directory that will be copied rather than a single DirectoryTarget.
+    The source directory is then searched when this function is called.
+    @type listFiles: bool
     
     @return: A list of FileTarget's representing the files that will be
-    copied.
-    @rtype: list of L{FileTarget}
+    copied. If bulk is True and listFiles is False then a single
+    DirectoryTarget representing the target directory.
+    @rtype: list of L{FileTarget} or L{DirectoryTarget}
     """
     if not isinstance(targetDir, basestring):
       raise TypeError("targetDir must be a string")
@@ -223,6 +252,17 @@ class FileSystemTool(Tool):
     
     sourceDir = basePath(sourceDir)
     targetDir = basePath(targetDir)
+
+    if bulk:
+      return self._copyDirectoryBulk(
+        sourceDir,
+        targetDir,
+        recursive,
+        onlyNewer,
+        removeStale,
+        includeMatch,
+        listFiles,
+        )
     
     def doMakeDir(path):
       targetAbsPath = abspath(path)
@@ -286,3 +326,146 @@ class FileSystemTool(Tool):
       return results
     
     return run(sourceDir)
+
+  def _copyDirectoryBulk(
+    self,
+    sourceDir,
+    targetDir,
+    recursive,
+    onlyNewer,
+    removeStale,
+    includeMatch,
+    listFiles,
+    ):
+    abspath = self.configuration.abspath
+    engine = self.engine
+
+    def doCopyFiles(paths):
+      for path in paths:
+        sourcePath = cake.path.join(sourceDir, path)
+        targetPath = cake.path.join(targetDir, path)
+        sourceAbsPath = abspath(sourcePath)
+        targetAbsPath = abspath(targetPath)
+        engine.logger.outputInfo("Copying %s to %s\n" % (sourcePath, targetPath))
+        try:
+          # Stat the source before copying so a source modified while it
+          # is being copied is copied again next time.
+          sourceStat = os.stat(sourceAbsPath)
+          cake.filesys.makeDirs(cake.path.dirName(targetAbsPath))
+          cake.filesys.copyFile(sourceAbsPath, targetAbsPath)
+          os.utime(targetAbsPath, (sourceStat.st_atime, sourceStat.st_mtime))
+        except EnvironmentError, e:
+          engine.raiseError("%s: %s\n" % (targetPath, str(e)), targets=[targetPath])
+        engine.notifyFileChanged(targetAbsPath)
+
+    def doCopy(sources):
+      sourceAbsDir = abspath(sourceDir)
+      targetAbsDir = abspath(targetDir)
+
+      if sources is None:
+        sources = list(cake.filesys.walkTree(
+          path=sourceAbsDir,
+          recursive=recursive,
+          includeMatch=includeMatch,
+          ))
+
+      if removeStale and cake.filesys.isDir(targetAbsDir):
+        targets = cake.filesys.walkTree(path=targetAbsDir, recursive=recursive)
+        for path in set(targets).difference(sources):
+          targetPath = cake.path.join(targetDir, path)
+          absTargetPath = abspath(targetPath)
+          engine.logger.outputInfo("Deleting %s\n" % targetPath)
+          if cake.path.isDir(absTargetPath):
+            cake.filesys.removeTree(absTargetPath)
+          elif cake.path.isFile(absTargetPath):
+            cake.filesys.remove(absTargetPath)
+          else:
+            pass # Skip files that may have been deleted already due to iteration order.
+
+      # Compare the size and modification time of each source file with
+      # its target to find the files that need copying. Copied files are
+      # given the modification time of their source, so any difference
+      # means the source has changed, even to an older time (eg. after
+      # checking out an older revision).
+      alwaysCopy = engine.forceBuild or not onlyNewer
+      toCopy = []
+      for path in sources:
+        sourceStat = os.stat(os.path.join(sourceAbsDir, path))
+        targetAbsPath = os.path.join(targetAbsDir, path)
+        if stat.S_ISDIR(sourceStat.st_mode):
+          if not cake.filesys.isDir(targetAbsPath):
+            engine.logger.outputInfo(
+              "Creating Directory %s\n" % cake.path.join(targetDir, path),
+              )
+            try:
+              cake.filesys.makeDirs(targetAbsPath)
+            except EnvironmentError, e:
+              engine.raiseError("%s: %s\n" % (targetDir, str(e)))
+          continue
+
+        if not alwaysCopy:
+          try:
+            targetStat = os.stat(targetAbsPath)
+          except EnvironmentError:
+            pass # Target doesn't exist
+          else:
+            if targetStat.st_size == sourceStat.st_size and \
+              abs(targetStat.st_mtime - sourceStat.st_mtime) < _timestampTolerance:
+              continue # Target is up to date
+        toCopy.append(path)
+
+      if toCopy:
+        engine.logger.outputDebug(
+          "reason",
+          "Copying %i files from '%s' to '%s'.\n" % (
+            len(toCopy),
+            sourceDir,
+            targetDir,
+            ),
+          )
+
+      # Copy the files across the worker threads.
+      chunkCount = min(
+        cake.task.getDefaultThreadPool().numWorkers,
+        len(toCopy),
+        )
+      for i in xrange(chunkCount):
+        copyTask = engine.createTask(
+          lambda c=toCopy[i::chunkCount]: doCopyFiles(c)
+          )
+        copyTask.parent.completeAfter(copyTask)
+        copyTask.start()
+
+    @waitForAsyncResult
+    def run(sourceDir):
+      if listFiles:
+        sources = list(cake.filesys.walkTree(
+          path=abspath(sourceDir),
+          recursive=recursive,
+          includeMatch=includeMatch,
+          ))
+      else:
+        sources = None
+
+      if self.enabled:
+        copyTask = engine.createTask(lambda: doCopy(sources))
+        copyTask.lazyStart()
+      else:
+        copyTask = None
+
+      if listFiles:
+        results = []
+        for source in sources:
+          targetPath = cake.path.join(targetDir, source)
+          if cake.path.isDir(abspath(cake.path.join(sourceDir, source))):
+            results.append(DirectoryTarget(path=targetPath, task=copyTask))
+          else:
+            results.append(FileTarget(path=targetPath, task=copyTask))
+        Script.getCurrent().getDefaultTarget().addTargets(results)
+        return results
+      else:
+        directoryTarget = DirectoryTarget(path=targetDir, task=copyTask)
+        Script.getCurrent().getDefaultTarget().addTarget(directoryTarget)
+        return directoryTarget
+
+    return run(sourceDir)
@@ -15,6 +15,14 @@ class ScriptTool(Tool):
   """Tool that provides utilities for performing Script operations.
   """
   
+  pool = None
+  """The name of the resource pool that functions are run in.
+  
+  Used by L{run} when it isn't passed a pool. The pool must be declared
+  with L{cake.engine.Engine.addResourcePool}.
+  @type: string or None
+  """
+  
   def __init__(self, *args, **kwargs):
     Tool.__init__(self, *args, **kwargs)
     self._included = {}
@@ -272,13 +280,17 @@ class ScriptTool(Tool):
     else:
       return [_execute(path) for path in scripts]
 
-  def run(self, func, args=None, targets=None, sources=[]):
+  def run(self, func, args=None, targets=None, sources=[], pool=None):
     """Execute the specified python function as a task.
 
     Only executes the function after the sources have been built and only
     if the target exists, args is the same as last run and the sources
     haven't changed.
 
+    @param pool: The name of the resource pool to run the function in. If
+    not specified then uses the tool's L{pool}.
+    @type pool: string or None
+
     @note: I couldn't think of a better class to put this function in so
     for now it's here although it doesn't really belong.
     """
@@ -290,6 +302,9 @@ class ScriptTool(Tool):
     targets = basePath(targets)
     sources = basePath(sources)
 
+    if pool is None:
+      pool = self.pool
+
     def _run():
       sourcePaths = getPaths(sources)
       if targets:
@@ -330,7 +345,7 @@ class ScriptTool(Tool):
       return result
 
     if self.enabled:
-      task = engine.createTask(_run)
+      task = engine.createTask(_run, pool=pool)
       task.lazyStartAfter(getTask(sources))
     else:
       task = None
@@ -7,6 +7,7 @@
 
 import os
 import subprocess
+import time
 import cake.filesys
 import cake.path
 from cake.async import waitForAsyncResult, flatten
@@ -18,6 +19,19 @@ _undefined = object()
 
 class ShellTool(Tool):
 
+  # The environment is only modified through the methods below, so it can
+  # be shared between clones of the tool.
+  _copyOnWrite = frozenset(["_env"])
+
+  pool = None
+  """The name of the resource pool that commands are run in.
+
+  Used by L{run} when it isn't passed a pool. The pool must be declared
+  with L{cake.engine.Engine.addResourcePool}. If None then commands are
+  only limited by the number of jobs.
+  @type: string or None
+  """
+
   def __init__(self, configuration, env=None):
     Tool.__init__(self, configuration)
     if env is None:
@@ -25,7 +39,7 @@ class ShellTool(Tool):
     else:
       self._env = dict(env)
 
-  def run(self, args, targets=[], sources=[], cwd=None, shell=False, removeTargets=False):
+  def run(self, args, targets=[], sources=[], cwd=None, shell=False, removeTargets=False, pool=None):
     """Run a shell command to build specified targets.
 
     @param args: The command-line to run.
@@ -47,14 +61,22 @@ class ShellTool(Tool):
 
     @param removeTargets: If specified then the target files will be removed
     before running the command if they already exist.
+
+    @param pool: The name of the resource pool to run the command in, eg.
+    to limit how many memory hungry asset converters run at once. If not
+    specified then uses the tool's L{pool}.
+    @type pool: string or None
     """
     tool = self.clone()
     
     basePath = self.configuration.basePath
+
+    if pool is None:
+      pool = self.pool
    
-    return tool._run(args, basePath(targets), basePath(sources), basePath(cwd), shell, removeTargets)
+    return tool._run(args, basePath(targets), basePath(sources), basePath(cwd), shell, removeTargets, pool)
   
-  def _run(self, args, targets, sources, cwd, shell, removeTargets):
+  def _run(self, args, targets, sources, cwd, shell, removeTargets, pool):
 
     engine = self.engine
     
@@ -125,6 +147,7 @@ class ShellTool(Tool):
         "run: %s\n" % argsString,
         )
 
+      startTime = time.time()
       try:
         p = subprocess.Popen(
           args=args,
@@ -140,6 +163,9 @@ class ShellTool(Tool):
 
       p.stdin.close()
       exitCode = p.wait()
+
+      engine.stats.add("subprocesses")
+      engine.stats.add("subprocessTime", time.time() - startTime)
       
       if exitCode != 0:
         msg = "%s exited with code %i\n" % (argsList[0], exitCode)
@@ -156,7 +182,10 @@ class ShellTool(Tool):
     @waitForAsyncResult
     def _run(targets, sources, cwd):
       if self.enabled:
-        task = engine.createTask(lambda t=targets, s=sources, c=cwd: spawnProcess(t, s, c))
+        task = engine.createTask(
+          lambda t=targets, s=sources, c=cwd: spawnProcess(t, s, c),
+          pool=pool,
+          )
         task.lazyStartAfter(getTasks(sources))
       else:
         task = None
@@ -182,7 +211,7 @@ class ShellTool(Tool):
     return self._env.items()
 
   def update(self, value):
-    return self._env.update(value)
+    return self._modifiable("_env").update(value)
 
   def get(self, key, default=_undefined):
     if default is _undefined:
@@ -194,10 +223,10 @@ class ShellTool(Tool):
     return self._env[key]
 
   def __setitem__(self, key, value):
-    self._env[key] = value
+    self._modifiable("_env")[key] = value
 
   def __delitem__(self, key):
-    del self._env[key]
+    del self._modifiable("_env")[key]
 
   def appendPath(self, path):
     basePath = self.configuration.basePath
@@ -10,11 +10,15 @@ from cake.target import getPath, getTask, getTasks, DirectoryTarget, FileTarget
 from cake.engine import BuildError
 from cake.script import Script
 import cake.filesys
+import cake.hash
+import cake.path
+import cake.task
 import cake.zipping
 import zipfile
 import os
 import os.path
 import calendar
+import threading
 import time
 
 def _shouldExtractFile(engine, absTargetFile, zipTime, onlyNewer):
@@ -33,58 +37,101 @@ def _shouldExtractFile(engine, absTargetFile, zipTime, onlyNewer):
     
   return None
 
-def _extractFile(configuration, zipFile, zipPath, zipInfo, targetDir, absTargetDir, onlyNewer):
-  """Extract the ZipInfo object to a physical file at targetDir.
+def _getZipTime(zipInfo):
+  """Return the modification time of a zip entry as a UTC timestamp.
   """
-  engine = configuration.engine
-  targetFile = os.path.join(targetDir, zipInfo.filename)
-  absTargetFile = os.path.join(absTargetDir, zipInfo.filename)
-  
-  if cake.zipping.isDirectoryInfo(zipInfo):
-    # The zip info corresponds to a directory.
-    cake.filesys.makeDirs(absTargetFile)
-  else:
-    # The zip info corresponds to a file.
-    year, month, day, hour, minute, second = zipInfo.date_time
-    zipTime = calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
-    
-    buildArgs = []
-    _, reasonToBuild = configuration.checkDependencyInfo(targetFile, buildArgs)
+  year, month, day, hour, minute, second = zipInfo.date_time
+  return calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
 
-    if reasonToBuild is None:
-      reasonToBuild = _shouldExtractFile(engine, absTargetFile, zipTime, onlyNewer)
-      if reasonToBuild is None:
-        return # Target is up to date
+def _getExtractArgs(zipInfos):
+  """Return the build args for extracting the given zip entries.
 
-    engine.logger.outputDebug(
-      "reason",
-      "Extracting '" + targetFile + "' because " + reasonToBuild + ".\n",
-      )
-    
-    engine.logger.outputInfo("Extracting %s\n" % targetFile)
-    
-    try:
-      cake.filesys.writeFile(absTargetFile, zipFile.read(zipInfo.filename))
-    except Exception, e:
-      engine.raiseError(
-        "Failed to extract file %s from zip %s: %s\n" % (
-          zipInfo.filename,
-          zipPath,
-          str(e),
-          ),
-        targets=[targetFile],
-        )
+  The args contain a digest of the entry names rather than the names
+  themselves to keep the dependency info small.
+  """
+  hasher = cake.hash.sha1()
+  for zipInfo in zipInfos:
+    name = zipInfo.filename
+    if isinstance(name, unicode):
+      name = name.encode("utf8")
+    hasher.update(name + "\0")
+  return [cake.hash.hexlify(hasher.digest())]
+
+def _getExtractRecordPath(targetDir, absSourcePath):
+  """Return the path whose dependency info records the extraction of a
+  zip to a directory.
+
+  The path is unique to both the directory and the zip so that several
+  zips can be extracted to the same directory. It is beside the
+  directory rather than in it so that the dependency info isn't deleted
+  as a stale file.
+  """
+  sourceDigest = cake.hash.sha1(
+    os.path.normcase(absSourcePath).encode("utf8")
+    ).digest()
+  return "%s.%s.%s.extract" % (
+    os.path.normpath(targetDir),
+    cake.path.baseName(absSourcePath),
+    cake.hash.hexlify(sourceDigest)[:8],
+    )
+
+def _splitIntoChunks(zipInfos, chunkCount):
+  """Split zip entries into contiguous chunks of similar total size.
+
+  Entries are kept in archive order so that each chunk is read from the
+  zip sequentially.
+  """
+  zipInfos = sorted(zipInfos, key=lambda z: z.header_offset)
+  totalSize = sum(z.file_size for z in zipInfos)
+  chunkSize = max(totalSize // chunkCount, 1)
+
+  chunks = []
+  chunk = []
+  size = 0
+  for zipInfo in zipInfos:
+    chunk.append(zipInfo)
+    size += zipInfo.file_size
+    if size >= chunkSize and len(chunks) < chunkCount - 1:
+      chunks.append(chunk)
+      chunk = []
+      size = 0
+  if chunk:
+    chunks.append(chunk)
+  return chunks
+
+def _extractFiles(configuration, zipPath, zipInfos, targetDir, absTargetDir):
+  """Extract the ZipInfo objects to physical files at targetDir.
+
+  The zip is opened by this function so that it may be called for
+  several sets of files at once from different threads.
+  """
+  engine = configuration.engine
+  zipFile = zipfile.ZipFile(configuration.abspath(zipPath), "r")
+  try:
+    for zipInfo in zipInfos:
+      targetFile = os.path.join(targetDir, zipInfo.filename)
+      absTargetFile = os.path.join(absTargetDir, zipInfo.filename)
+      
+      engine.logger.outputInfo("Extracting %s\n" % targetFile)
       
-    # Now that the file has been written successfully, save the new dependency file 
-    newDependencyInfo = configuration.createDependencyInfo(
-      targets=[targetFile],
-      args=buildArgs,
-      dependencies=[],
-      )
-    configuration.storeDependencyInfo(newDependencyInfo)
+      try:
+        cake.zipping.extractFile(zipFile, zipInfo, absTargetFile)
 
-    # Set the file modification time to match the zip time
-    os.utime(absTargetFile, (zipTime, zipTime))
+        # Set the file modification time to match the zip time
+        zipTime = _getZipTime(zipInfo)
+        os.utime(absTargetFile, (zipTime, zipTime))
+      except Exception, e:
+        engine.raiseError(
+          "Failed to extract file %s from zip %s: %s\n" % (
+            zipInfo.filename,
+            zipPath,
+            str(e),
+            ),
+          targets=[targetFile],
+          )
+      engine.notifyFileChanged(absTargetFile)
+  finally:
+    zipFile.close()
 
 def _shouldCompress(
   configuration,
@@ -94,9 +141,16 @@ def _shouldCompress(
   onlyNewer,
   removeStale,
   ):
+  """Work out which members of an existing zip can be reused.
 
+  @return: A tuple of (toKeep, toCompress, canAppend, reasonToBuild).
+  toKeep is the list of ZipInfos of members of the existing zip that are
+  up to date, or None if the existing zip can't be reused. toCompress is
+  the list of source paths that must be compressed. canAppend is True if
+  no existing members need to be replaced or removed.
+  """
   if not onlyNewer:
-    return None, "onlyNewer is False" # Always rebuild
+    return None, toZip.values(), False, "onlyNewer is False" # Always rebuild
   
   absSourcePath = configuration.abspath(sourcePath)
   absTargetPath = configuration.abspath(targetPath)
@@ -108,49 +162,106 @@ def _shouldCompress(
       zipInfos = file.infolist()
     finally:
       file.close()
-    
-    # Build a list of files/dirs in the current zip
-    fromZip = {}
-    for zipInfo in zipInfos:
-      path = os.path.normpath(os.path.normcase(zipInfo.filename))
-      fromZip[path] = zipInfo
-  except EnvironmentError:
+  except (EnvironmentError, zipfile.BadZipfile):
     # File doesn't exist or is invalid
-    return None, "'" + targetPath + "' doesn't exist" 
+    return None, toZip.values(), False, "'" + targetPath + "' doesn't exist" 
 
-  # Check modification times of source files against those in the zip
-  for casedPath, originalPath in toZip.iteritems():
-    zipInfo = fromZip.get(casedPath, None)
-
-    # Not interested in modified directories
-    if zipInfo is not None and not cake.zipping.isDirectoryInfo(zipInfo):
+  toKeep = []
+  toCompress = []
+  reasonToBuild = None
+  fromZip = set()
+  for zipInfo in zipInfos:
+    casedPath = os.path.normpath(os.path.normcase(zipInfo.filename))
+    fromZip.add(casedPath)
+    originalPath = toZip.get(casedPath, None)
+    if originalPath is None:
+      if removeStale:
+        if reasonToBuild is None:
+          sourceFilePath = os.path.join(sourcePath, zipInfo.filename)
+          reasonToBuild = "'" + sourceFilePath + "' has been removed"
+        continue
+    elif not cake.zipping.isDirectoryInfo(zipInfo):
+      # Check modification time of the source file against that in the
+      # zip. Not interested in modified directories.
       absSourceFilePath = os.path.join(absSourcePath, originalPath)
       utcTime = time.gmtime(os.stat(absSourceFilePath).st_mtime)
       zipTime = utcTime[0:5] + (
         utcTime[5] & 0xFE, # Zip only saves 2 second resolution
         )              
       if zipTime != zipInfo.date_time:
-        sourceFilePath = os.path.join(sourcePath, originalPath)
-        # We must recreate the entire zip to update files
-        return None, "'" + sourceFilePath + "' has been changed"
-      
-  if removeStale:
-    for path, zipInfo in fromZip.iteritems():
-      if path not in toZip:
-        # We must recreate the zip to remove files
-        sourceFilePath = os.path.join(sourcePath, zipInfo.filename)
-        return None, "'" + sourceFilePath + "' has been removed"
-  
-  toAppend = []
-  reasonToBuild = None
+        toCompress.append(originalPath)
+        if reasonToBuild is None:
+          sourceFilePath = os.path.join(sourcePath, originalPath)
+          reasonToBuild = "'" + sourceFilePath + "' has been changed"
+        continue
+    toKeep.append(zipInfo)
+
+  canAppend = len(toKeep) == len(zipInfos)
+
   for casedPath, originalPath in toZip.iteritems():
     if casedPath not in fromZip:
-      toAppend.append(originalPath)
+      toCompress.append(originalPath)
       if reasonToBuild is None:
         sourceFilePath = os.path.join(sourcePath, originalPath)
         reasonToBuild = "'" + sourceFilePath + "' is not in zip"
       
-  return toAppend, reasonToBuild
+  return toKeep, toCompress, canAppend, reasonToBuild
+
+class _ZipWriter(object):
+  """Writes compressed members to a zip as they are compressed.
+
+  Members are written in the order they were given, so the zip is the
+  same however the compression was spread across threads. A member that
+  is compressed before its turn is moved to disk while it waits, so only
+  the members being compressed are held in memory.
+  """
+
+  def __init__(self, zipFile, paths):
+    self._lock = threading.Lock()
+    self._zipFile = zipFile
+    self._indices = dict((p, i) for i, p in enumerate(paths))
+    self._pending = {}
+    self._next = 0
+
+  def add(self, path, zipInfo, data):
+    """Add a compressed member, writing it and any members waiting on it
+    if it is its turn.
+
+    Takes ownership of the data, closing it once it has been written.
+    """
+    self._lock.acquire()
+    try:
+      index = self._indices[path]
+      if index != self._next:
+        data.rollover()
+        self._pending[index] = (zipInfo, data)
+        return
+
+      while True:
+        try:
+          cake.zipping.writeMember(self._zipFile, zipInfo, data)
+        finally:
+          data.close()
+        self._next += 1
+        try:
+          zipInfo, data = self._pending.pop(self._next)
+        except KeyError:
+          break
+    finally:
+      self._lock.release()
+
+  def close(self):
+    """Close the zip, writing its central directory, and discard any
+    members that were not written.
+    """
+    self._lock.acquire()
+    try:
+      for zipInfo, data in self._pending.itervalues():
+        data.close()
+      self._pending.clear()
+      self._zipFile.close()
+    finally:
+      self._lock.release()
 
 class ZipTool(Tool):
   
@@ -203,40 +314,119 @@ class ZipTool(Tool):
       zipFile = zipfile.ZipFile(configuration.abspath(sourcePath), "r")
       try:
         zipInfos = zipFile.infolist()
+      finally:
+        zipFile.close()
         
-        if includeMatch is not None:
-          zipInfos = [z for z in zipInfos if includeMatch(z.filename)]
+      if includeMatch is not None:
+        zipInfos = [z for z in zipInfos if includeMatch(z.filename)]
+      
+      if removeStale:
+        filesInZip = set()
+        for zipInfo in zipInfos:
+          path = os.path.normcase(os.path.normpath(zipInfo.filename))
+          # Parent directories may not have their own entries in the zip.
+          while path and path not in filesInZip:
+            filesInZip.add(path)
+            path = os.path.dirname(path)
         
-        if removeStale:
-          filesInZip = set()
-          for zipInfo in zipInfos:
-            filesInZip.add(os.path.normcase(os.path.normpath(zipInfo.filename)))
-          
-          searchDir = os.path.normpath(absTargetDir)
-          for path in cake.filesys.walkTree(searchDir):
-            normPath = os.path.normcase(path)
-            # Skip files that also exist in the zip.
-            if normPath in filesInZip:
+        searchDir = os.path.normpath(absTargetDir)
+        for path in cake.filesys.walkTree(searchDir):
+          normPath = os.path.normcase(path)
+          # Skip files that also exist in the zip.
+          if normPath in filesInZip:
+            continue
+          if engine.dependencyInfoPath is None:
+            # Skip .dep files that match a file in the zip.
+            p, e = os.path.splitext(normPath)
+            if e == ".dep" and p in filesInZip:
               continue
-            if engine.dependencyInfoPath is None:
-              # Skip .dep files that match a file in the zip.
-              p, e = os.path.splitext(normPath)
-              if e == ".dep" and p in filesInZip:
-                continue
-            
-            absPath = os.path.join(searchDir, path)
-            engine.logger.outputInfo(
-              "Deleting %s\n" % os.path.join(targetDir, path),
-              )
-            if os.path.isdir(absPath):
-              cake.filesys.removeTree(absPath)
-            else:
-              cake.filesys.remove(absPath)
-        
-        for zipinfo in zipInfos:
-          _extractFile(configuration, zipFile, sourcePath, zipinfo, targetDir, absTargetDir, onlyNewer)   
-      finally:
-        zipFile.close()
+          
+          absPath = os.path.join(searchDir, path)
+          engine.logger.outputInfo(
+            "Deleting %s\n" % os.path.join(targetDir, path),
+            )
+          if os.path.isdir(absPath):
+            cake.filesys.removeTree(absPath)
+          else:
+            cake.filesys.remove(absPath)
+
+      dirInfos = []
+      fileInfos = []
+      for zipInfo in zipInfos:
+        if cake.zipping.isDirectoryInfo(zipInfo):
+          dirInfos.append(zipInfo)
+        else:
+          fileInfos.append(zipInfo)
+
+      # A single dependency info records the extraction of the whole zip.
+      # Its dependencies include the extracted files so that modifying or
+      # deleting any of them causes the zip to be checked again.
+      buildArgs = _getExtractArgs(zipInfos)
+      recordPath = _getExtractRecordPath(
+        targetDir,
+        configuration.abspath(sourcePath),
+        )
+      _, reasonToBuild = configuration.checkDependencyInfo(recordPath, buildArgs)
+      if reasonToBuild is None:
+        if onlyNewer:
+          return # Target is up to date
+        reasonToBuild = "onlyNewer is False"
+
+      engine.logger.outputDebug(
+        "reason",
+        "Extracting '" + sourcePath + "' because " + reasonToBuild + ".\n",
+        )
+      
+      for zipInfo in dirInfos:
+        cake.filesys.makeDirs(os.path.join(absTargetDir, zipInfo.filename))
+
+      toExtract = []
+      for zipInfo in fileInfos:
+        absTargetFile = os.path.join(absTargetDir, zipInfo.filename)
+        if _shouldExtractFile(engine, absTargetFile, _getZipTime(zipInfo), onlyNewer):
+          toExtract.append(zipInfo)
+
+      # Extract the files across the worker threads, each with its own
+      # handle to the zip.
+      extractTasks = []
+      if toExtract:
+        chunkCount = min(
+          cake.task.getDefaultThreadPool().numWorkers,
+          len(toExtract),
+          )
+        for chunk in _splitIntoChunks(toExtract, chunkCount):
+          extractTask = engine.createTask(
+            lambda c=chunk: _extractFiles(
+              configuration,
+              sourcePath,
+              c,
+              targetDir,
+              absTargetDir,
+              ))
+          extractTask.parent.completeAfter(extractTask)
+          extractTask.start()
+          extractTasks.append(extractTask)
+
+      def storeDependencyInfo():
+        # Now that the files have been written successfully, save the new
+        # dependency file.
+        newDependencyInfo = configuration.createDependencyInfo(
+          targets=[targetDir] + [
+            os.path.join(targetDir, z.filename) for z in dirInfos
+            ],
+          args=buildArgs,
+          dependencies=[sourcePath] + [
+            os.path.join(targetDir, z.filename) for z in fileInfos
+            ],
+          )
+        engine.storeDependencyInfo(
+          configuration.abspath(recordPath),
+          newDependencyInfo,
+          )
+
+      storeDependencyTask = engine.createTask(storeDependencyInfo)
+      storeDependencyTask.parent.completeAfter(storeDependencyTask)
+      storeDependencyTask.startAfter(extractTasks)
 
     def _run():
       try:
@@ -304,6 +494,15 @@ class ZipTool(Tool):
     target = basePath(target)
     source = basePath(source)
     
+    def _run(func, *args):
+      try:
+        return func(*args)
+      except BuildError:
+        raise
+      except Exception, e:
+        msg = "cake: Error creating %s: %s\n" % (target, str(e))
+        engine.raiseError(msg, targets=[target])
+
     def _compress():
       sourceDir = getPath(source)
       absSourceDir = configuration.abspath(sourceDir)
@@ -311,20 +510,20 @@ class ZipTool(Tool):
       # Build a list of files/dirs to zip
       toZip = cake.zipping.findFilesToCompress(absSourceDir, includeMatch)
 
-      # Check for an existing dependency info file
+      # Check for an existing dependency info file and figure out which
+      # members of the existing zip can be reused.
       buildArgs = []
-      toAppend = None
       _, reasonToBuild = configuration.checkDependencyInfo(target, buildArgs)
+      toKeep, toCompress, canAppend, reason = _shouldCompress(
+        configuration,
+        sourceDir,
+        target,
+        toZip,
+        onlyNewer,
+        removeStale,
+        )
       if reasonToBuild is None:
-        # Figure out if we need to rebuild/append
-        toAppend, reasonToBuild = _shouldCompress(
-          configuration,
-          sourceDir,
-          target,
-          toZip,
-          onlyNewer,
-          removeStale,
-          )
+        reasonToBuild = reason
         if reasonToBuild is None:
           return # Target is up to date
 
@@ -332,55 +531,105 @@ class ZipTool(Tool):
         "reason",
         "Rebuilding '" + target + "' because " + reasonToBuild + ".\n",
         )
-      
+
       absTargetPath = configuration.abspath(target)
-      if toAppend is None:
+      if toKeep is None:
         # Recreate zip
         cake.filesys.makeDirs(os.path.dirname(absTargetPath))
-        f = open(absTargetPath, "wb")
-        try:
-          zipFile = zipfile.ZipFile(f, "w")
-          for originalPath in toZip.itervalues():
-            sourcePath = os.path.join(sourceDir, originalPath)
-            absSourcePath = configuration.abspath(sourcePath)
-            configuration.engine.logger.outputInfo("Adding %s to %s\n" % (sourcePath, target))
-            cake.zipping.writeFileToZip(zipFile, absSourcePath, originalPath)
-          zipFile.close()
-        finally:
-          f.close()
-      else:
+        zipPath, fileMode, zipMode = absTargetPath, "wb", "w"
+      elif canAppend:
         # Append to existing zip
-        f = open(absTargetPath, "r+b")
+        zipPath, fileMode, zipMode = absTargetPath, "r+b", "a"
+      else:
+        # Write a new zip, copying the compressed data of unchanged
+        # members from the existing zip.
+        zipPath, fileMode, zipMode = absTargetPath + ".tmp", "wb", "w"
+
+      f = None
+      writer = None
+      if toCompress or not canAppend:
+        f = open(zipPath, fileMode)
         try:
-          zipFile = zipfile.ZipFile(f, "a")
-          for originalPath in toAppend:
-            sourcePath = os.path.join(sourceDir, originalPath)
-            absSourcePath = configuration.abspath(sourcePath)
-            configuration.engine.logger.outputInfo("Adding %s to %s\n" % (sourcePath, target))
-            cake.zipping.writeFileToZip(zipFile, absSourcePath, originalPath)
-          zipFile.close()
-        finally:
+          zipFile = zipfile.ZipFile(f, zipMode, allowZip64=True)
+          if zipPath != absTargetPath:
+            oldZipFile = zipfile.ZipFile(absTargetPath, "r")
+            try:
+              for zipInfo in toKeep:
+                cake.zipping.copyMember(zipFile, oldZipFile, zipInfo)
+            finally:
+              oldZipFile.close()
+          writer = _ZipWriter(zipFile, toCompress)
+        except:
           f.close()
+          raise
 
-      # Now that the zip has been written successfully, save the new dependency file 
-      newDependencyInfo = configuration.createDependencyInfo(
-        targets=[target],
-        args=buildArgs,
-        dependencies=[],
-        )
-      configuration.storeDependencyInfo(newDependencyInfo)
+      def compressFiles(originalPaths):
+        for originalPath in originalPaths:
+          sourcePath = os.path.join(sourceDir, originalPath)
+          absSourcePath = configuration.abspath(sourcePath)
+          engine.logger.outputInfo("Adding %s to %s\n" % (sourcePath, target))
+          zipInfo, data = cake.zipping.compressMember(
+            absSourcePath,
+            originalPath,
+            )
+          writer.add(originalPath, zipInfo, data)
+
+      def closeZip():
+        # Close the zip even if compressing failed so that an existing zip
+        # appended to is left with a valid central directory.
+        if f is not None and not f.closed:
+          try:
+            writer.close()
+          finally:
+            f.close()
+
+      def writeZip():
+        closeZip()
+        if zipPath != absTargetPath:
+          # Windows can't rename over an existing file.
+          cake.filesys.remove(absTargetPath)
+          os.rename(zipPath, absTargetPath)
+        engine.notifyFileChanged(absTargetPath)
+
+        # Now that the zip has been written successfully, save the new dependency file 
+        newDependencyInfo = configuration.createDependencyInfo(
+          targets=[target],
+          args=buildArgs,
+          dependencies=[],
+          )
+        configuration.storeDependencyInfo(newDependencyInfo)
+
+      def cleanUp():
+        if not writeTask.succeeded:
+          try:
+            closeZip()
+          finally:
+            if zipPath != absTargetPath:
+              cake.filesys.remove(zipPath)
+
+      # Compress the new and changed files across the worker threads,
+      # writing each to the zip as soon as it has been compressed.
+      compressTasks = []
+      if toCompress:
+        chunkCount = min(
+          cake.task.getDefaultThreadPool().numWorkers,
+          len(toCompress),
+          )
+        for i in xrange(chunkCount):
+          compressTask = engine.createTask(
+            lambda c=toCompress[i::chunkCount]: _run(compressFiles, c)
+            )
+          compressTask.parent.completeAfter(compressTask)
+          compressTask.start()
+          compressTasks.append(compressTask)
+
+      writeTask = engine.createTask(lambda: _run(writeZip))
+      writeTask.parent.completeAfter(writeTask)
+      writeTask.addCallback(cleanUp)
+      writeTask.startAfter(compressTasks)
 
-    def _run():
-      try:
-        return _compress()
-      except BuildError:
-        raise
-      except Exception, e:
-        msg = "cake: Error creating %s: %s\n" % (target, str(e))
-        engine.raiseError(msg, targets=[target])
-      
     if self.enabled:
-      task = engine.createTask(_run)
+      task = engine.createTask(lambda: _run(_compress))
       task.lazyStartAfter(getTask(source))
     else:
       task = None
@@ -11,6 +11,7 @@ import _winreg as winreg
 
 import cake.path
 import cake.system
+import cake.toolcache
 from cake.registry import queryString, KEY_WOW64_32KEY
   
 def getMsvsInstallDir(version=r'VisualStudio\8.0'):
@@ -173,19 +174,44 @@ def vswhere(args=[]):
   @raise EnvironmentError:
   If there was a problem running vswhere with the provided arguments.
   """
+  # Results are cached until vswhere, the list of installed instances
+  # or the state of any instance changes. Modifying or updating an
+  # instance rewrites its state.json without touching the directory.
+  programData = os.environ.get('ProgramData', r'C:\ProgramData')
+  instancesDir = cake.path.join(
+    programData, 'Microsoft', 'VisualStudio', 'Packages', '_Instances'
+    )
+  try:
+    instances = sorted(os.listdir(instancesDir))
+  except EnvironmentError:
+    instances = []
+  vsWherePath = _getVswherePath()
+  files = [vsWherePath, instancesDir]
+  files.extend(
+    cake.path.join(instancesDir, i, 'state.json') for i in instances
+    )
+  return cake.toolcache.cached(
+    ("vswhere", tuple(args)),
+    lambda: _runVswhere(vsWherePath, args),
+    files=files,
+    )
+
+def _getVswherePath():
   if cake.system.isWindows64():
     programFiles = os.environ.get('ProgramFiles(x86)', r'C:\Program Files (x86)')
   else:
     programFiles = os.environ.get('ProgramFiles', r'C:\Program Files')
   vsInstaller = cake.path.join(programFiles, 'Microsoft Visual Studio', 'Installer')
-  vsWherePath = cake.path.join(vsInstaller, 'vswhere.exe')
+  return cake.path.join(vsInstaller, 'vswhere.exe')
+
+def _runVswhere(vsWherePath, args):
   if not os.path.isfile(vsWherePath):
     raise EnvironmentError("vswhere not found at " + vsWherePath)
 
   p = subprocess.Popen(
     args=["vswhere", "-format", "json"] + args,
     executable=vsWherePath,
-    cwd=vsInstaller,
+    cwd=cake.path.dirName(vsWherePath),
     stdout=subprocess.PIPE,
     stderr=subprocess.STDOUT,
     stdin=subprocess.PIPE,
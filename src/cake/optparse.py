@@ -73,7 +73,6 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
 import sys, os
-import textwrap
 
 def _repr(self):
     return "<%s at 0x%x: %s>" % (self.__class__.__name__, id(self), self)
@@ -85,11 +84,14 @@ def _repr(self):
 #   Id: help.py 527 2006-07-23 15:21:30Z greg
 #   Id: errors.py 509 2006-04-20 00:58:24Z gward
 
-try:
-    from gettext import gettext
-except ImportError:
-    def gettext(message):
+# gettext and textwrap are imported when first needed as they are slow
+# to import and aren't used unless there is help or an error to print.
+def gettext(message):
+    try:
+        from gettext import gettext as _gettext
+    except ImportError:
         return message
+    return _gettext(message)
 _ = gettext
 
 
@@ -257,6 +259,7 @@ class HelpFormatter:
         """
         text_width = self.width - self.current_indent
         indent = " "*self.current_indent
+        import textwrap
         return textwrap.fill(text,
                              text_width,
                              initial_indent=indent,
@@ -312,6 +315,7 @@ class HelpFormatter:
         result.append(opts)
         if option.help:
             help_text = self.expand_default(option)
+            import textwrap
             help_lines = textwrap.wrap(help_text, self.help_width)
             result.append("%*s%s\n" % (indent_first, "", help_lines[0]))
             result.extend(["%*s%s\n" % (self.help_position, "", line)
@@ -0,0 +1,125 @@
+"""Process Pooling Class and Utilities.
+
+Provides a simple process-pool utility for executing Python-heavy jobs in
+separate worker processes. Unlike the threads of a L{ThreadPool} these
+jobs are not serialised by the GIL (Global Interpreter Lock).
+
+@see: Cake Build System (http://sourceforge.net/projects/cake-build)
+@copyright: Copyright (c) 2010 Lewis Baker, Stuart McMahon.
+@license: Licensed under the MIT license.
+"""
+
+import atexit
+import signal
+
+def _getMultiprocessing():
+  """Import the multiprocessing module.
+
+  The import is deferred until a process pool is needed as it is slow
+  and most builds don't use one.
+
+  @return: The multiprocessing module, or None if it isn't available.
+  """
+  try:
+    import multiprocessing
+  except ImportError:
+    return None
+  return multiprocessing
+
+def isAvailable():
+  """Returns True if process pools are supported by this Python.
+  """
+  return _getMultiprocessing() is not None
+
+def _initWorker():
+  """Initialise a worker process.
+
+  Keyboard interrupts are handled by the parent process, which will
+  terminate the workers.
+  """
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+class ProcessPool(object):
+  """Manages a pool of worker processes that it delegates jobs to.
+
+  Jobs must be module-level functions whose arguments and results can be
+  pickled. Jobs should avoid global state as each call may be executed by
+  a different worker process.
+
+  Usage::
+    pool = ProcessPool(numWorkers=4)
+    digests = pool.map(calculateDigest, paths)
+  """
+  def __init__(self, numWorkers):
+    """Initialise the process pool.
+
+    @param numWorkers: Number of worker processes to start.
+    @type numWorkers: int
+
+    @raise NotImplementedError: If process pools are not supported by
+    this Python.
+    """
+    multiprocessing = _getMultiprocessing()
+    if multiprocessing is None:
+      raise NotImplementedError("multiprocessing module is not available")
+
+    self._numWorkers = numWorkers
+    self._pool = multiprocessing.Pool(
+      processes=numWorkers,
+      initializer=_initWorker,
+      )
+
+    # Make sure the processes are cleaned up before program exit.
+    atexit.register(self._shutdown)
+
+  def _shutdown(self):
+    """Shutdown the ProcessPool.
+
+    Jobs that are still executing will be abandoned.
+    """
+    self._pool.terminate()
+    self._pool.join()
+
+  @property
+  def numWorkers(self):
+    """Returns the number of worker processes available to process jobs.
+
+    @return: The number of worker processes available to process jobs.
+    @rtype: int
+    """
+    return self._numWorkers
+
+  def apply(self, func, args=()):
+    """Execute a job on a worker process and wait for its result.
+
+    This may be called from multiple threads at once. The calling thread
+    is blocked, without holding the GIL, until the result is available.
+
+    @param func: The module-level function to call.
+    @type func: function
+
+    @param args: The arguments to pass to the function.
+    @type args: tuple
+
+    @return: The result of the function call.
+    """
+    return self._pool.apply(func, args)
+
+  def map(self, func, iterable, chunkSize=None):
+    """Execute a job for each item of a sequence across the worker
+    processes and wait for the results.
+
+    @param func: The module-level function to call for each item.
+    @type func: function
+
+    @param iterable: The items to process.
+    @type iterable: any iterable
+
+    @param chunkSize: The number of items to send to a worker process at
+    once. If None then a size is chosen to split the items evenly.
+    @type chunkSize: int or None
+
+    @return: A list of the results, in the same order as the items.
+    @rtype: list
+    """
+    return self._pool.map(func, iterable, chunkSize)
@@ -12,12 +12,13 @@ import threading
 import datetime
 import time
 import traceback
-import platform
 
 import cake.engine
 import cake.logging
 import cake.path
 import cake.script
+import cake.supervisor
+import cake.system
 import cake.task
 import cake.threadpool
 import cake.version
@@ -78,6 +79,7 @@ def _overrideOpen():
   """
   if hasattr(os, "O_NOINHERIT"):
     import __builtin__
+    import platform
     
     if (sys.hexversion >= 0x03000000 or
        platform.python_compiler().startswith("MSC v.1310")):
@@ -152,8 +154,7 @@ def _overridePopen():
   Override the subprocess Popen class due to a bug in Python 2.4
   that can cause an exception if a process finishes too quickly.
   """
-  version = platform.python_version_tuple()
-  if version[0] == "2" and version[1] == "4":
+  if sys.version_info[:2] == (2, 4):
     import subprocess
     
     old_Popen = subprocess.Popen
@@ -177,6 +178,11 @@ def _speedUp():
   Speed up execution by importing Psyco and binding the slowest functions
   with it.
   """ 
+  # Psyco only supports 32-bit Python 2.4 - 2.6 so don't waste time
+  # searching for it on other versions.
+  if sys.version_info[:2] not in [(2, 4), (2, 5), (2, 6)]:
+    return
+
   try:
     import psyco
     psyco.bind(cake.engine.Configuration.checkDependencyInfo)
@@ -186,9 +192,8 @@ def _speedUp():
     #psyco.log()
   except ImportError:
     # Only report import failures on systems we know Psyco supports.
-    version = platform.python_version_tuple()
-    supportsVersion = version[0] == "2" and version[1] in ["5", "6"]
-    if platform.system() == "Windows" and supportsVersion:
+    supportsVersion = sys.version_info[:2] in [(2, 5), (2, 6)]
+    if cake.system.isWindows() and supportsVersion:
       sys.stderr.write(
         "warning: Psyco is not installed. Installing it may halve your incremental build time.\n"
         )
@@ -273,6 +278,14 @@ def run(args=None, cwd=None):
     help="Force rebuild of every target.",
     default=False,
     )
+  parser.add_option(
+    "--check-digests",
+    action="store_true",
+    dest="checkDigests",
+    help="Compare the contents of dependencies whose timestamps have " +
+         "changed and only rebuild if their contents have changed too.",
+    default=False,
+    )
   parser.add_option(
     "-j", "--jobs",
     metavar="JOBCOUNT",
@@ -281,6 +294,22 @@ def run(args=None, cwd=None):
     help="Number of simultaneous jobs to execute.",
     default=cake.threadpool.getProcessorCount(),
     )
+  parser.add_option(
+    "-p", "--processes",
+    metavar="PROCESSCOUNT",
+    type="int",
+    dest="processes",
+    help="Number of worker processes used to check dependencies. " +
+         "Zero disables the use of worker processes.",
+    default=0,
+    )
+  parser.add_option(
+    "--parallel-scripts",
+    action="store_true",
+    dest="parallelScripts",
+    help="Execute independent build scripts concurrently.",
+    default=False,
+    )
   parser.add_option(
     "-k", "--keep-going",
     dest="maximumErrorCount",
@@ -296,6 +325,20 @@ def run(args=None, cwd=None):
     help="Halt the build after a certain number of errors.",
     default=100,
     )
+  parser.add_option(
+    "--stats",
+    action="store_true",
+    dest="outputStats",
+    help="Print a summary of build statistics at the end of the build.",
+    default=False,
+    )
+  parser.add_option(
+    "--metrics-json",
+    metavar="FILE",
+    dest="metricsJson",
+    help="Write build statistics to FILE in JSON format.",
+    default=None,
+    )
   parser.add_option(
     "-l", "--list-targets",
     dest="listTargetsMode",
@@ -408,8 +451,28 @@ def run(args=None, cwd=None):
   
   engine.options = options
   engine.forceBuild = options.forceBuild
+  engine.checkDigests = options.checkDigests
+  engine.parallelScripts = options.parallelScripts
+  engine.stats.enabled = bool(options.outputStats or options.metricsJson)
   engine.maximumErrorCount = options.maximumErrorCount
     
+  # Start any worker processes before the build's worker threads.
+  if options.processes > 0:
+    from cake.processpool import isAvailable, ProcessPool
+    if isAvailable():
+      engine.processPool = ProcessPool(options.processes)
+    else:
+      msg = "Warning: Worker processes are not supported by this Python.\n"
+      logger.outputWarning(msg)
+      engine.warnings.append(msg)
+
+  # Only the gcc and mwcw object and pch compiles wait on the supervisor
+  # without a thread. Links, archives, resources, shell commands and all
+  # MSVC processes still block a worker thread for each process they run,
+  # so the thread pool has to stay as large as the number of jobs.
+  if cake.supervisor.isAvailable():
+    engine.processSupervisor = cake.supervisor.ProcessSupervisor(options.jobs)
+
   threadPool = cake.threadpool.ThreadPool(options.jobs)
   cake.task.setThreadPool(threadPool)
  
@@ -525,9 +588,163 @@ def run(args=None, cwd=None):
   engine.logger.outputInfo(
     "Build took %s.\n" % _formatTimeDelta(endTime - startTime)
     )
+
+  try:
+    engine.saveScriptCache()
+  except EnvironmentError, e:
+    msg = "cake: Warning: Could not write script cache to %s: %s\n" % (
+      engine.scriptCachePath, str(e))
+    engine.logger.outputWarning(msg)
+    engine.warnings.append(msg)
+
+  try:
+    engine.saveDirectoryCache()
+  except EnvironmentError, e:
+    msg = "cake: Warning: Could not write directory cache to %s: %s\n" % (
+      engine.directoryCachePath, str(e))
+    engine.logger.outputWarning(msg)
+    engine.warnings.append(msg)
+
+  # Only save the toolchain cache if a config script used it.
+  toolcache = sys.modules.get("cake.toolcache", None)
+  if toolcache is not None:
+    try:
+      toolcache.save()
+    except EnvironmentError, e:
+      msg = "cake: Warning: Could not write toolchain cache to %s: %s\n" % (
+        toolcache.cachePath, str(e))
+      engine.logger.outputWarning(msg)
+      engine.warnings.append(msg)
+
+  if options.outputStats or options.metricsJson:
+    metrics = dict.fromkeys(_statisticNames, 0)
+    metrics.update(engine.stats.getAll())
+    metrics["buildTime"] = _totalSeconds(endTime - startTime)
+    metrics["workers"] = threadPool.numWorkers
+    metrics["idleWorkerTime"] = threadPool.idleTime
+
+    if options.outputStats:
+      engine.logger.outputInfo(_formatStatistics(metrics))
+
+    if options.metricsJson:
+      try:
+        _writeMetricsJson(options.metricsJson, metrics)
+      except EnvironmentError, e:
+        msg = "cake: Error writing metrics to %s: %s\n" % (
+          options.metricsJson, str(e))
+        engine.logger.outputError(msg)
+        engine.errors.append(msg)
   
   return engine.errorCount
 
+# Statistics that are always reported, even if they were never collected.
+_statisticNames = [
+  "targetsChecked",
+  "targetsRefreshed",
+  "targetsRebuilt",
+  "unchangedTargets",
+  "objectCacheHits",
+  "objectCacheMisses",
+  "objectCacheRestoredBytes",
+  "sharedCompiles",
+  "dependencyInfoLoads",
+  "dependencyInfoLoadTime",
+  "timestampCacheHits",
+  "timestampCacheMisses",
+  "digestCacheHits",
+  "digestCacheMisses",
+  "directoryCacheHits",
+  "directoryCacheMisses",
+  "scriptsExecuted",
+  "scriptExecutionTime",
+  "subprocesses",
+  "subprocessTime",
+  ]
+
+def _totalSeconds(t):
+  """Return the total number of seconds in a timedelta as a float."""
+  return t.days * 86400.0 + t.seconds + t.microseconds / 1000000.0
+
+def _hitRate(hits, misses):
+  """Return the percentage of lookups that were cache hits."""
+  total = hits + misses
+  if total:
+    return 100.0 * hits / total
+  else:
+    return 0.0
+
+def _formatStatistics(metrics):
+  """Return a human readable summary of the build statistics."""
+  get = metrics.get
+  stats = [
+    ("Targets checked", "%i (%i refreshed)" % (
+      get("targetsChecked"),
+      get("targetsRefreshed"),
+      )),
+    ("Targets rebuilt", "%i (%i unchanged)" % (
+      get("targetsRebuilt"),
+      get("unchangedTargets"),
+      )),
+    ("Object cache", "%i hits, %i misses, %i bytes restored" % (
+      get("objectCacheHits"),
+      get("objectCacheMisses"),
+      get("objectCacheRestoredBytes"),
+      )),
+    ("Shared compiles", "%i" % get("sharedCompiles")),
+    ("Dependency info", "%i loaded in %.3fs" % (
+      get("dependencyInfoLoads"),
+      get("dependencyInfoLoadTime"),
+      )),
+    ("File stats", "%i (%.1f%% of lookups cached)" % (
+      get("timestampCacheMisses"),
+      _hitRate(get("timestampCacheHits"), get("timestampCacheMisses")),
+      )),
+    ("File digests", "%i (%.1f%% of lookups cached)" % (
+      get("digestCacheMisses"),
+      _hitRate(get("digestCacheHits"), get("digestCacheMisses")),
+      )),
+    ("Directory listings", "%i (%.1f%% of lookups cached)" % (
+      get("directoryCacheMisses"),
+      _hitRate(get("directoryCacheHits"), get("directoryCacheMisses")),
+      )),
+    ("Script execution", "%i scripts in %.3fs" % (
+      get("scriptsExecuted"),
+      get("scriptExecutionTime"),
+      )),
+    ("Subprocesses", "%i run in %.3fs" % (
+      get("subprocesses"),
+      get("subprocessTime"),
+      )),
+    ("Idle worker time", "%.3fs across %i workers" % (
+      get("idleWorkerTime"),
+      get("workers"),
+      )),
+    ]
+  return "Build statistics:\n" + "".join(
+    "  %-18s %s\n" % (name + ":", value) for name, value in stats
+    )
+
+def _writeMetricsJson(path, metrics):
+  """Write the build statistics to a file in JSON format."""
+  import json
+
+  metrics = dict(metrics)
+  metrics["timestampCacheHitRate"] = _hitRate(
+    metrics["timestampCacheHits"],
+    metrics["timestampCacheMisses"],
+    )
+  metrics["digestCacheHitRate"] = _hitRate(
+    metrics["digestCacheHits"],
+    metrics["digestCacheMisses"],
+    )
+
+  f = open(path, "wt")
+  try:
+    json.dump(metrics, f, indent=2, sort_keys=True, separators=(",", ": "))
+    f.write("\n")
+  finally:
+    f.close()
+
 def _formatTimeDelta(t):
   """Return a string representation of the time to millisecond precision."""
   
@@ -0,0 +1,85 @@
+"""Build Statistics.
+
+Provides a simple thread-safe collection of named counters and timings
+that are accumulated over the course of a build. Collection is disabled
+unless statistics have been asked for, so the counters cost nothing in
+a normal build.
+
+@see: Cake Build System (http://sourceforge.net/projects/cake-build)
+@copyright: Copyright (c) 2010 Lewis Baker, Stuart McMahon.
+@license: Licensed under the MIT license.
+"""
+
+import threading
+
+class Statistics(object):
+  """A set of named values accumulated during a build.
+
+  Values are counts (eg. number of files stat'd) or times in seconds
+  (eg. total time spent executing scripts). Values that have never been
+  added to are zero.
+
+  Usage::
+    stats = Statistics()
+    stats.add("timestampCacheMisses")
+    stats.add("subprocessTime", 1.5)
+  """
+
+  enabled = True
+  """Whether statistics are being collected. While False, L{add} does
+  nothing.
+  @type: bool
+  """
+
+  def __init__(self, enabled=True):
+    """Construct an empty set of statistics.
+
+    @param enabled: Whether to collect statistics.
+    @type enabled: bool
+    """
+    self._lock = threading.Lock()
+    self._values = {}
+    self.enabled = enabled
+
+  def add(self, name, amount=1):
+    """Add to the value of a statistic.
+
+    This may be called from multiple threads at once. Does nothing if
+    the statistics aren't L{enabled}.
+
+    @param name: The name of the statistic.
+    @type name: string
+
+    @param amount: The amount to add to the statistic.
+    @type amount: int or float
+    """
+    if not self.enabled:
+      return
+    self._lock.acquire()
+    try:
+      self._values[name] = self._values.get(name, 0) + amount
+    finally:
+      self._lock.release()
+
+  def get(self, name):
+    """Get the current value of a statistic.
+
+    @param name: The name of the statistic.
+    @type name: string
+
+    @return: The current value of the statistic.
+    @rtype: int or float
+    """
+    return self._values.get(name, 0)
+
+  def getAll(self):
+    """Get a snapshot of the current value of every statistic.
+
+    @return: A dictionary of statistic names to values.
+    @rtype: dict of string->(int or float)
+    """
+    self._lock.acquire()
+    try:
+      return dict(self._values)
+    finally:
+      self._lock.release()
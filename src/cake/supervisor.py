@@ -0,0 +1,447 @@
+"""Process Supervisor Class and Utilities.
+
+Runs child processes without tying up a thread for each one. A single
+supervisor thread launches the processes, collects their output and
+waits for them to exit, calling back when each process has finished.
+Processes started with L{ProcessSupervisor.run} don't need a worker
+thread to sit blocked waiting for them. Those started with
+L{ProcessSupervisor.runAndWait} still block the calling thread.
+
+Currently only the gcc and mwcw compilers' object and pch compiles are
+run asynchronously, so a build still needs a worker thread for each of
+its other processes (links, archives, resources and shell commands).
+
+Only supported on POSIX platforms, where the output pipes of the
+processes can be waited on with select().
+
+@see: Cake Build System (http://sourceforge.net/projects/cake-build)
+@copyright: Copyright (c) 2010 Lewis Baker, Stuart McMahon.
+@license: Licensed under the MIT license.
+"""
+
+import atexit
+import collections
+import errno
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+import cake.system
+
+if not cake.system.isWindows():
+  import fcntl
+
+def isAvailable():
+  """Returns True if process supervisors are supported on this platform.
+  """
+  return not cake.system.isWindows()
+
+def _setCloseOnExec(fd):
+  """Stop a file descriptor being inherited by other child processes.
+
+  A child that inherited the write end of another child's output pipe
+  would stop the supervisor seeing the end of that output until it too
+  had exited.
+  """
+  flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+  fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+def _retryOnInterrupt(func, *args):
+  """Call a function, retrying it if interrupted by a signal.
+  """
+  while True:
+    try:
+      return func(*args)
+    except (EnvironmentError, select.error), e:
+      if e.args[0] != errno.EINTR:
+        raise
+
+class ProcessResult(object):
+  """The outcome of running a process.
+  """
+
+  exitCode = None
+  """The exit code of the process, or None if it couldn't be launched.
+  @type: int or None
+  """
+  stdout = ""
+  """Everything the process wrote to stdout.
+  @type: string
+  """
+  stderr = ""
+  """Everything the process wrote to stderr.
+  @type: string
+  """
+  startTime = None
+  """The time the process was launched.
+  @type: float or None
+  """
+  endTime = None
+  """The time the process was found to have exited.
+  @type: float or None
+  """
+  error = None
+  """The error raised when launching the process, or None if it was
+  launched successfully.
+  @type: Exception or None
+  """
+
+class _Process(object):
+  """A process queued or being run by the supervisor.
+  """
+
+  def __init__(self, args, callback, keywords):
+    self.args = args
+    self.callback = callback
+    self.keywords = keywords
+    self.popen = None
+    self.openPipes = 0
+    self.output = {}
+    self.result = ProcessResult()
+
+class ProcessSupervisor(object):
+  """Runs child processes, calling back as each one finishes.
+
+  Usage::
+    supervisor = ProcessSupervisor(maximumProcesses=64)
+    def finished(result):
+      print result.exitCode, result.stdout
+    supervisor.run(["gcc", "-c", "foo.c"], finished)
+  """
+
+  pollInterval = 0.005
+  """Seconds to wait between checks for a process that has closed its
+  output but not yet exited.
+  @type: float
+  """
+
+  def __init__(self, maximumProcesses):
+    """Initialise the process supervisor.
+
+    @param maximumProcesses: The maximum number of processes to run at
+    once. Processes queued beyond this start as others finish.
+    @type maximumProcesses: int
+
+    @raise NotImplementedError: If process supervisors are not supported
+    on this platform.
+    """
+    if not isAvailable():
+      raise NotImplementedError("process supervisors require POSIX pipes")
+
+    self._maximumProcesses = max(1, maximumProcesses)
+    self._lock = threading.Lock()
+    self._queue = collections.deque()
+    self._finished = False
+
+    self._wakeRead, self._wakeWrite = os.pipe()
+    for fd in (self._wakeRead, self._wakeWrite):
+      _setCloseOnExec(fd)
+      fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    self._thread = threading.Thread(target=self._runThread)
+    self._thread.daemon = True
+    self._thread.start()
+
+    # Make sure the thread is joined before program exit.
+    atexit.register(self._shutdown)
+
+  def _shutdown(self):
+    """Shutdown the ProcessSupervisor.
+
+    Processes that are still running or queued are abandoned and their
+    callbacks won't be called.
+    """
+    self._lock.acquire()
+    try:
+      self._finished = True
+      self._queue.clear()
+    finally:
+      self._lock.release()
+    self._wake()
+    self._thread.join()
+
+  @property
+  def maximumProcesses(self):
+    """Returns the maximum number of processes run at once.
+
+    @rtype: int
+    """
+    return self._maximumProcesses
+
+  def run(self, args, callback, **keywords):
+    """Queue a process to be run.
+
+    @param args: The arguments of the process, as passed to
+    subprocess.Popen().
+    @type args: list of string or string
+
+    @param callback: Called with the L{ProcessResult} once the process
+    has exited or failed to launch. It is called from the supervisor
+    thread so must not block.
+    @type callback: any callable
+
+    @param keywords: Other arguments passed to subprocess.Popen(), eg.
+    cwd, env, executable or shell.
+    """
+    process = _Process(args, callback, keywords)
+    self._lock.acquire()
+    try:
+      finished = self._finished
+      if not finished:
+        self._queue.append(process)
+    finally:
+      self._lock.release()
+    
+    if finished:
+      # Don't run processes if we've shutdown.
+      process.result.error = EnvironmentError("process supervisor has shutdown")
+      self._callback(process)
+    else:
+      self._wake()
+
+  def runAndWait(self, args, **keywords):
+    """Run a process and wait for it to finish.
+
+    @param args: The arguments of the process, as passed to
+    subprocess.Popen().
+    @type args: list of string or string
+
+    @param keywords: Other arguments passed to subprocess.Popen().
+
+    @return: The outcome of running the process.
+    @rtype: L{ProcessResult}
+    """
+    results = []
+    finished = threading.Event()
+    def callback(result):
+      results.append(result)
+      finished.set()
+    self.run(args, callback, **keywords)
+    finished.wait()
+    return results[0]
+
+  def _wake(self):
+    try:
+      os.write(self._wakeWrite, "x")
+    except EnvironmentError, e:
+      if e.errno != errno.EAGAIN: # Already woken if the pipe is full.
+        raise
+
+  def _runThread(self):
+    """Supervise processes until shutdown.
+
+    If supervising fails unexpectedly all queued and running processes
+    are failed and no more processes are accepted, so that nothing
+    waits forever for a callback.
+    """
+    running = set()
+    try:
+      self._supervise(running)
+    except Exception:
+      sys.stderr.write("Uncaught Exception in process supervisor:\n")
+      sys.stderr.write(traceback.format_exc())
+      self._failAll(running, sys.exc_info()[1])
+
+  def _supervise(self, running):
+    """Launch queued processes and collect their output until shutdown.
+
+    @param running: The set of processes that are being launched or have
+    been launched but not yet called back. Updated as processes are
+    launched and finish.
+    @type running: set of L{_Process}
+    """
+    poller = _Poller()
+    poller.register(self._wakeRead)
+    processes = {} # Output pipe fd -> _Process
+    exiting = []
+
+    while not self._finished:
+      # Launch as many queued processes as we can.
+      while len(running) < self._maximumProcesses:
+        self._lock.acquire()
+        try:
+          if not self._queue:
+            break
+          process = self._queue.popleft()
+        finally:
+          self._lock.release()
+
+        running.add(process)
+        if self._launch(process):
+          for pipe in (process.popen.stdout, process.popen.stderr):
+            fd = pipe.fileno()
+            processes[fd] = process
+            process.output[fd] = []
+            poller.register(fd)
+        else:
+          running.discard(process)
+          self._callback(process)
+
+      if exiting:
+        timeout = self.pollInterval
+      else:
+        timeout = None
+
+      for fd in poller.poll(timeout):
+        if fd == self._wakeRead:
+          try:
+            while os.read(fd, 4096):
+              pass
+          except EnvironmentError, e:
+            if e.errno != errno.EAGAIN:
+              raise
+          continue
+
+        process = processes[fd]
+        data = _retryOnInterrupt(os.read, fd, 65536)
+        if data:
+          process.output[fd].append(data)
+        else:
+          poller.unregister(fd)
+          del processes[fd]
+          process.openPipes -= 1
+          if not process.openPipes:
+            exiting.append(process)
+
+      # Reap the processes that have closed their output. Only wait on
+      # our own children so the exit status of any other child
+      # processes isn't stolen.
+      stillExiting = []
+      for process in exiting:
+        popen = process.popen
+        exitCode = _retryOnInterrupt(popen.poll)
+        if exitCode is None:
+          stillExiting.append(process)
+          continue
+
+        result = process.result
+        result.exitCode = exitCode
+        result.endTime = time.time()
+        result.stdout = "".join(process.output[popen.stdout.fileno()])
+        result.stderr = "".join(process.output[popen.stderr.fileno()])
+        popen.stdout.close()
+        popen.stderr.close()
+        running.discard(process)
+        self._callback(process)
+      exiting = stillExiting
+
+  def _failAll(self, running, error):
+    """Fail the running and queued processes and refuse any more.
+
+    @param running: The processes that are being launched or have been
+    launched but not yet called back. Any that were launched are killed.
+    @type running: set of L{_Process}
+
+    @param error: The error that stopped the supervisor.
+    @type error: Exception
+    """
+    self._lock.acquire()
+    try:
+      self._finished = True
+      queued = list(self._queue)
+      self._queue.clear()
+    finally:
+      self._lock.release()
+
+    error = EnvironmentError("process supervisor failed: %s" % str(error))
+    for process in list(running) + queued:
+      popen = process.popen
+      if popen is not None:
+        try:
+          popen.kill()
+          popen.stdout.close()
+          popen.stderr.close()
+          _retryOnInterrupt(popen.wait)
+        except EnvironmentError:
+          pass
+      if process.result.exitCode is None:
+        process.result.error = error
+      self._callback(process)
+
+  def _launch(self, process):
+    """Launch a process.
+
+    @return: True if the process was launched, otherwise False and the
+    launch error is stored in the process's result.
+    @rtype: bool
+    """
+    process.result.startTime = time.time()
+    try:
+      popen = subprocess.Popen(
+        args=process.args,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        **process.keywords
+        )
+    except Exception, e:
+      # Bad arguments raise TypeError or ValueError rather than
+      # EnvironmentError.
+      process.result.error = e
+      return False
+    popen.stdin.close()
+
+    process.popen = popen
+    process.openPipes = 2
+    for pipe in (popen.stdout, popen.stderr):
+      _setCloseOnExec(pipe.fileno())
+    return True
+
+  def _callback(self, process):
+    callback = process.callback
+    result = process.result
+    process.callback = None
+    process.popen = None
+    try:
+      callback(result)
+    except Exception:
+      sys.stderr.write("Uncaught Exception:\n")
+      sys.stderr.write(traceback.format_exc())
+
+class _Poller(object):
+  """Waits for file descriptors to become readable.
+
+  Uses poll() where available as select() is limited to file
+  descriptors below FD_SETSIZE.
+  """
+
+  def __init__(self):
+    if hasattr(select, "poll"):
+      self._poll = select.poll()
+    else:
+      self._poll = None
+    self._fds = set()
+
+  def register(self, fd):
+    self._fds.add(fd)
+    if self._poll is not None:
+      self._poll.register(fd, select.POLLIN | select.POLLPRI)
+
+  def unregister(self, fd):
+    self._fds.discard(fd)
+    if self._poll is not None:
+      self._poll.unregister(fd)
+
+  def poll(self, timeout):
+    """Wait for file descriptors to become readable.
+
+    @param timeout: Seconds to wait, or None to wait indefinitely.
+    @type timeout: float or None
+
+    @return: The file descriptors that are readable or closed.
+    @rtype: list of int
+    """
+    if self._poll is not None:
+      if timeout is not None:
+        timeout = timeout * 1000.0
+      events = _retryOnInterrupt(self._poll.poll, timeout)
+      return [fd for fd, _ in events]
+    else:
+      readable, _, _ = _retryOnInterrupt(
+        select.select, list(self._fds), [], [], timeout
+        )
+      return readable
@@ -7,9 +7,15 @@
 
 import os
 import os.path
-import platform as platty
 
-_platform = platty.system()
+# Use os.uname() where available. Python 2's platform.system() launches
+# a 'uname -p' process, and importing platform is slow.
+if hasattr(os, "uname"):
+  _platform, _, _, _, _machine = os.uname()
+else:
+  import platform as platty
+  _platform = platty.system()
+  _machine = None
 
 # Some builds of Python can have platform.system() -> "Windows"
 # while others have platform.system() -> "Microsoft".
@@ -31,8 +37,11 @@ if _isWindows or _isCygwin:
     try:
       _architecture = os.environ['PROCESSOR_ARCHITECTURE']
     except KeyError:
-      _architecture = platty.machine()
+      _architecture = _machine
 else:
+  _architecture = _machine
+if _architecture is None:
+  import platform as platty
   _architecture = platty.machine()
 if not _architecture:
   _architecture = 'unknown'
@@ -7,6 +7,7 @@
 
 import sys
 import threading
+import itertools
 
 _threadPool = None
 _threadPoolLock = threading.Lock()
@@ -61,6 +62,28 @@ def _makeTasks(value):
   else:
     return list(value)
 
+def _queueTasks(tasks):
+  """Queue a list of tasks that are ready to execute.
+
+  Tasks are grouped by thread-pool so that completing a task with many
+  dependents wakes each thread-pool once rather than once per task.
+  """
+  if len(tasks) == 1:
+    task = tasks[0]
+    task._threadPool.queueJob(task._execute, front=task._immediate)
+    return
+
+  batches = {}
+  for task in tasks:
+    key = (task._threadPool, task._immediate)
+    jobs = batches.get(key, None)
+    if jobs is None:
+      jobs = batches[key] = []
+    jobs.append(task._execute)
+
+  for (threadPool, immediate), jobs in batches.iteritems():
+    threadPool.queueJobs(jobs, front=immediate)
+
 class Task(object):
   """An operation that is performed on a background thread.
   """
@@ -97,12 +120,16 @@ class Task(object):
     self._state = Task.State.NEW
     self._lock = threading.Lock()
     self._startAfterCount = 0
+    self._startAfterCounter = None
     self._startAfterFailures = False
     self._startAfterDependencies = None
     self._completeAfterCount = 0
     self._completeAfterFailures = False
     self._completeAfterDependencies = None
     self._callbacks = []
+    # Reverse adjacency lists of the tasks waiting on this task.
+    self._startAfterDependents = []
+    self._completeAfterDependents = []
 
   @staticmethod
   def getCurrent():
@@ -247,6 +274,7 @@ class Task(object):
         raise TaskError("task already started")
       self._state = Task.State.WAITING_FOR_START
       self._startAfterCount = len(otherTasks) + 1
+      self._startAfterCounter = itertools.count(1)
       self._immediate = immediate
       self._threadPool = threadPool
       if required:
@@ -265,14 +293,15 @@ class Task(object):
     if required:
       for t in otherTasks:
         t._require()
-        t.addCallback(lambda t=t: self._startAfterCallback(t))
+        t._addDependent(self, completeAfter=False)
       
       if completeAfterDependencies:
         for t in completeAfterDependencies:
           t._require()
-          t.addCallback(lambda t=t: self._completeAfterCallback(t))
+          t._addDependent(self, completeAfter=True)
 
-      self._startAfterCallback(self)
+      if self._startAfterCallback(self):
+        _queueTasks([self])
 
   def _require(self):
     """Flag this task as required.
@@ -291,6 +320,9 @@ class Task(object):
     self._lock.acquire()
     try:
       alreadyRequired = self.required
+      # Only tasks that have been lazily started are waiting on the
+      # start-after count. Others will be counted when started.
+      lazilyStarted = self._startAfterCounter is not None
       if not alreadyRequired:
         startAfterDependencies = self._startAfterDependencies
         completeAfterDependencies = self._completeAfterDependencies
@@ -304,51 +336,114 @@ class Task(object):
       if startAfterDependencies:
         for t in startAfterDependencies:
           t._require()
-          t.addCallback(lambda t=t: self._startAfterCallback(t))
+          t._addDependent(self, completeAfter=False)
 
       if completeAfterDependencies:
         for t in completeAfterDependencies:
           t._require()
-          t.addCallback(lambda t=t: self._completeAfterCallback(t))
+          t._addDependent(self, completeAfter=True)
+
+      if lazilyStarted and self._startAfterCallback(self):
+        _queueTasks([self])
+
+  def _addDependent(self, task, completeAfter):
+    """Register a task that is waiting for this task to complete.
+
+    The dependent task is recorded in one of this task's reverse adjacency
+    lists rather than as a per-edge callback. If this task has already
+    completed then the dependent is notified immediately.
+    """
+    if not self.completed:
+      self._lock.acquire()
+      try:
+        if completeAfter:
+          dependents = self._completeAfterDependents
+        else:
+          dependents = self._startAfterDependents
+        if dependents is not None:
+          # Task is not yet complete, notify the dependent later.
+          dependents.append(task)
+          return
+      finally:
+        self._lock.release()
+
+    if completeAfter:
+      task._completeAfterCallback(self)
+    elif task._startAfterCallback(self):
+      _queueTasks([task])
 
-      self._startAfterCallback(self)
+  def _takeListeners(self):
+    """Detach the callbacks and dependents waiting on this task.
+    
+    Must be called with self._lock held.
+    """
+    listeners = (
+      self._callbacks,
+      self._startAfterDependents,
+      self._completeAfterDependents,
+      )
+    self._callbacks = None
+    self._startAfterDependents = None
+    self._completeAfterDependents = None
+    return listeners
+
+  def _notifyListeners(self, listeners):
+    """Notify the callbacks and dependents that this task has completed.
+
+    Dependents that become ready to execute are queued as a single batch.
+    """
+    callbacks, startAfterDependents, completeAfterDependents = listeners
+
+    if callbacks:
+      for callback in callbacks:
+        callback()
+
+    if completeAfterDependents:
+      for t in completeAfterDependents:
+        t._completeAfterCallback(self)
+
+    if startAfterDependents:
+      ready = [t for t in startAfterDependents if t._startAfterCallback(self)]
+      if ready:
+        _queueTasks(ready)
 
   def _startAfterCallback(self, task):
-    """Callback that is called by each task we must start after.
+    """Called once for each task we must start after.
+
+    @return: True if this task is now ready to be queued for execution.
     """
-    callbacks = None
+    # If one task fails we should fail too
+    if task.failed:
+      self._startAfterFailures = True
+
+    # Wait for all other tasks to complete. The counter's next() is atomic
+    # so only the last task to complete will see the total count.
+    if self._startAfterCounter.next() != self._startAfterCount:
+      return False
+    
+    listeners = None
     
     self._lock.acquire()
     try:
-      # If one task fails we should fail too
-      if task.failed:
-        self._startAfterFailures = True
-
-      # Wait for all other tasks to complete 
-      self._startAfterCount -= 1
-      if self._startAfterCount > 0:
-        return
-      
       # Someone may have eg. cancelled us already
       if self._state is not Task.State.WAITING_FOR_START:
-        return
+        return False
 
       if self._startAfterFailures:
         self._state = Task.State.FAILED
-        callbacks = self._callbacks
-        self._callbacks = None
+        listeners = self._takeListeners()
       else:
         self._state = Task.State.RUNNING
     finally:
       self._lock.release()
 
-    if callbacks is None:
-      # Task is ready to start executing, queue to thread-pool.
-      self._threadPool.queueJob(self._execute, front=self._immediate)          
+    if listeners is None:
+      # Task is ready to start executing.
+      return True
     else:
-      # Task was cancelled, call callbacks now
-      for callback in callbacks:
-        callback()
+      # Task was cancelled, notify listeners now
+      self._notifyListeners(listeners)
+      return False
               
   def _execute(self):
     """Actually execute this task.
@@ -359,7 +454,7 @@ class Task(object):
       assert self._state is Task.State.FAILED, "should have been cancelled"
       return
     
-    callbacks = None
+    listeners = None
     
     try:
       old = self.getCurrent()
@@ -388,8 +483,7 @@ class Task(object):
         self._result = result
         if self._state is Task.State.RUNNING:
           if not self._completeAfterCount:
-            callbacks = self._callbacks
-            self._callbacks = None
+            listeners = self._takeListeners()
             if not self._completeAfterFailures:
               self._state = Task.State.SUCCEEDED
             else:
@@ -409,8 +503,7 @@ class Task(object):
         self._trace = trace
         if self._state is Task.State.RUNNING:
           if not self._completeAfterCount:
-            callbacks = self._callbacks
-            self._callbacks = None
+            listeners = self._takeListeners()
             self._state = Task.State.FAILED
           else:
             self._state = Task.State.WAITING_FOR_COMPLETE
@@ -419,9 +512,8 @@ class Task(object):
       finally:
         self._lock.release()
      
-    if callbacks:
-      for callback in callbacks:
-        callback()
+    if listeners:
+      self._notifyListeners(listeners)
 
   def completeAfter(self, other):
     """Make sure this task doesn't complete until other tasks have completed.
@@ -457,12 +549,12 @@ class Task(object):
       # dependencies immediately.
       for t in otherTasks:
         t._require()
-        t.addCallback(lambda t=t: self._completeAfterCallback(t))
+        t._addDependent(self, completeAfter=True)
 
   def _completeAfterCallback(self, task):
-    """Callback that is called by each task we must complete after.
+    """Called once for each task we must complete after.
     """
-    callbacks = None
+    listeners = None
     
     self._lock.acquire()
     try:
@@ -475,14 +567,12 @@ class Task(object):
           self._state = Task.State.SUCCEEDED
         else:
           self._state = Task.State.FAILED
-        callbacks = self._callbacks
-        self._callbacks = None
+        listeners = self._takeListeners()
     finally:
       self._lock.release()
         
-    if callbacks:
-      for callback in callbacks:
-        callback()
+    if listeners:
+      self._notifyListeners(listeners)
 
   def cancel(self):
     """Cancel this task if it hasn't already started.
@@ -497,13 +587,11 @@ class Task(object):
         raise TaskError("Task already completed")
       
       self._state = Task.State.FAILED
-      callbacks = self._callbacks
-      self._callbacks = None
+      listeners = self._takeListeners()
     finally:
       self._lock.release()
     
-    for callback in callbacks:
-      callback()
+    self._notifyListeners(listeners)
   
   def addCallback(self, callback):
     """Register a callback to be run when this task is complete.
@@ -7,6 +7,17 @@ _modules = [
   "cake.test.task",
   "cake.test.path",
   "cake.test.threadpool",
+  "cake.test.processpool",
+  "cake.test.supervisor",
+  "cake.test.gnu",
+  "cake.test.stats",
+  "cake.test.bytecode",
+  "cake.test.engine",
+  "cake.test.startup",
+  "cake.test.library",
+  "cake.test.filesys",
+  "cake.test.toolcache",
+  "cake.test.zipping",
   "cake.test.asyncresult",
   ]
 
@@ -0,0 +1,127 @@
+"""Byte Code Unit Tests.
+"""
+
+import unittest
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+
+import cake.bytecode
+import cake.filesys
+
+def _run(code):
+  scriptGlobals = {}
+  exec code in scriptGlobals
+  return scriptGlobals["value"]
+
+class ByteCodePackTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    self.packPath = os.path.join(self.tempDir, "cache", "scripts.pack")
+    self.scriptPath = os.path.join(self.tempDir, "build.cake")
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _writeScript(self, value, mtime):
+    cake.filesys.writeFile(self.scriptPath, "value = %i\n" % value)
+    os.utime(self.scriptPath, (mtime, mtime))
+
+  def testLoadFromSavedPack(self):
+    self._writeScript(1, time.time() - 60)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    self.assertEqual(_run(pack.loadCode(self.scriptPath)), 1)
+    pack.save()
+
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    self.assertEqual(_run(pack.loadCode(self.scriptPath)), 1)
+    self.assertFalse(pack._modified) # Loaded without reading the script
+
+  def testChangedScript(self):
+    self._writeScript(1, time.time() - 60)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    self._writeScript(2, time.time() - 30)
+    self.assertEqual(_run(pack.loadCode(self.scriptPath)), 2)
+
+  def testRacyScript(self):
+    # A script changed without its size or timestamp changing is only
+    # detected if it was cached soon after it was modified.
+    mtime = time.time()
+    self._writeScript(1, mtime)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    self._writeScript(2, mtime)
+    self.assertEqual(_run(pack.loadCode(self.scriptPath)), 2)
+
+  def testTouchedScript(self):
+    self._writeScript(1, time.time() - 60)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    self._writeScript(1, time.time() - 30)
+    self.assertEqual(_run(pack.loadCode(self.scriptPath)), 1)
+
+  def testInvalidPack(self):
+    cake.filesys.writeFile(self.packPath, "not a pack")
+    self._writeScript(1, time.time() - 60)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    self.assertEqual(_run(pack.loadCode(self.scriptPath)), 1)
+    pack.save()
+    self.assertEqual(
+      _run(cake.bytecode.ByteCodePack(self.packPath).loadCode(self.scriptPath)),
+      1,
+      )
+
+  def testUnusedScriptsKept(self):
+    otherPath = os.path.join(self.tempDir, "other.cake")
+    cake.filesys.writeFile(otherPath, "value = 2\n")
+    self._writeScript(1, time.time() - 60)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    pack.loadCode(otherPath)
+    pack.save()
+
+    # A build that doesn't load other.cake shouldn't drop it.
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    pack.save()
+
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    self.assertEqual(
+      sorted(pack._getEntries().keys()),
+      sorted([self.scriptPath, otherPath]),
+      )
+
+  def testDeletedScriptsPruned(self):
+    otherPath = os.path.join(self.tempDir, "other.cake")
+    cake.filesys.writeFile(otherPath, "value = 2\n")
+    self._writeScript(1, time.time() - 60)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    pack.loadCode(otherPath)
+    pack.save()
+
+    # Nothing was recompiled but other.cake was deleted so is dropped.
+    os.remove(otherPath)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    pack.save()
+
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    self.assertEqual(pack._getEntries().keys(), [self.scriptPath])
+
+  def testSaveLeavesNoTemporaryFiles(self):
+    self._writeScript(1, time.time() - 60)
+    pack = cake.bytecode.ByteCodePack(self.packPath)
+    pack.loadCode(self.scriptPath)
+    pack.save()
+    self.assertEqual(os.listdir(os.path.dirname(self.packPath)), ["scripts.pack"])
+
+if __name__ == "__main__":
+  suite = unittest.TestLoader().loadTestsFromTestCase(ByteCodePackTests)
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
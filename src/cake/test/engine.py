@@ -0,0 +1,394 @@
+"""Engine Unit Tests.
+"""
+
+import unittest
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import cake.engine
+import cake.filesys
+import cake.logging
+import cake.task
+import cake.threadpool
+
+from cake.library.script import ScriptTool
+
+def _createConfiguration():
+  path = os.path.join(os.path.abspath(os.sep), "project", "config.cake")
+  return cake.engine.Configuration(path, None)
+
+class AbspathTests(unittest.TestCase):
+
+  def testAbspath(self):
+    configuration = _createConfiguration()
+    baseDir = configuration.baseDir
+    self.assertEqual(
+      configuration.abspath("src/foo.c"),
+      os.path.join(baseDir, "src/foo.c"),
+      )
+    absPath = os.path.join(baseDir, "include", "foo.h")
+    self.assertEqual(configuration.abspath(absPath), absPath)
+
+  def testAbspathIsInterned(self):
+    configuration = _createConfiguration()
+    first = configuration.abspath("".join(["src/", "foo.c"]))
+    second = configuration.abspath("".join(["src/", "foo.c"]))
+    self.assertTrue(first is second)
+
+  def testNormAbspath(self):
+    configuration = _createConfiguration()
+    self.assertEqual(
+      configuration.normAbspath("src/../include/./foo.h"),
+      os.path.normpath(os.path.join(configuration.baseDir, "include/foo.h")),
+      )
+
+  def testSetBaseDir(self):
+    configuration = _createConfiguration()
+    configuration.abspath("foo.c")
+    configuration.normAbspath("foo.c")
+    newBaseDir = os.path.join(configuration.baseDir, "sub")
+    configuration.baseDir = newBaseDir
+    self.assertEqual(
+      configuration.abspath("foo.c"),
+      os.path.join(newBaseDir, "foo.c"),
+      )
+    self.assertEqual(
+      configuration.normAbspath("foo.c"),
+      os.path.join(newBaseDir, "foo.c"),
+      )
+
+class AbspathBenchmarks(unittest.TestCase):
+  """Benchmarks of cached path normalisation against os.path.
+  """
+
+  def testNormAbspath(self):
+    configuration = _createConfiguration()
+    baseDir = configuration.baseDir
+    paths = ["include/dir%i/../header%i.h" % (i % 50, i) for i in xrange(500)]
+    count = 200
+
+    startTime = time.time()
+    for _ in xrange(count):
+      for p in paths:
+        os.path.normpath(os.path.join(baseDir, p))
+    uncachedTime = time.time() - startTime
+
+    normAbspath = configuration.normAbspath
+    startTime = time.time()
+    for _ in xrange(count):
+      for p in paths:
+        normAbspath(p)
+    cachedTime = time.time() - startTime
+
+    sys.stderr.write("os.path: %.3fs, normAbspath: %.3fs ... " % (
+      uncachedTime, cachedTime))
+
+class PreserveUnchangedTargetsTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+    self.configuration = cake.engine.Configuration(
+      os.path.join(self.tempDir, "config.cake"),
+      engine,
+      )
+    self.targetPath = os.path.join(self.tempDir, "foo.o")
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _build(self, contents, oldDependencyInfo, timestamp):
+    cake.filesys.writeFile(self.targetPath, contents)
+    os.utime(self.targetPath, (timestamp, timestamp))
+    dependencyInfo = self.configuration.createDependencyInfo(
+      targets=["foo.o"],
+      args=[],
+      dependencies=[],
+      )
+    self.configuration.preserveUnchangedTargets(dependencyInfo, oldDependencyInfo)
+    return dependencyInfo
+
+  def testUnchangedTargetKeepsTimestamp(self):
+    oldDependencyInfo = self._build("object", None, 1000000000)
+    self.assertEqual(oldDependencyInfo.targetTimestamps, [1000000000])
+
+    dependencyInfo = self._build("object", oldDependencyInfo, 1000000100)
+    self.assertEqual(os.stat(self.targetPath).st_mtime, 1000000000)
+    self.assertEqual(dependencyInfo.targetTimestamps, [1000000000])
+    self.assertEqual(
+      self.configuration.engine.getTimestamp(self.targetPath),
+      1000000000,
+      )
+
+  def testChangedTargetGetsNewTimestamp(self):
+    oldDependencyInfo = self._build("object", None, 1000000000)
+
+    dependencyInfo = self._build("changed", oldDependencyInfo, 1000000100)
+    self.assertEqual(os.stat(self.targetPath).st_mtime, 1000000100)
+    self.assertEqual(dependencyInfo.targetTimestamps, [1000000100])
+    self.assertNotEqual(dependencyInfo.targetDigests, oldDependencyInfo.targetDigests)
+
+  def testOldDependencyInfoWithoutDigests(self):
+    oldDependencyInfo = self._build("object", None, 1000000000)
+    del oldDependencyInfo.targetDigests # As loaded from an older version
+
+    self._build("object", oldDependencyInfo, 1000000100)
+    self.assertEqual(os.stat(self.targetPath).st_mtime, 1000000100)
+
+class CheckDigestsTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    self.engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+    self.engine.checkDigests = True
+    self.configuration = cake.engine.Configuration(
+      os.path.join(self.tempDir, "config.cake"),
+      self.engine,
+      )
+    self.sourcePath = os.path.join(self.tempDir, "foo.c")
+    self._write(self.sourcePath, "source", 1000000000)
+    self._write(os.path.join(self.tempDir, "foo.o"), "object", 1000000000)
+    dependencyInfo = self.configuration.createDependencyInfo(
+      targets=["foo.o"],
+      args=["cc"],
+      dependencies=["foo.c"],
+      )
+    self.configuration.storeDependencyInfo(dependencyInfo)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _write(self, path, contents, timestamp):
+    cake.filesys.writeFile(path, contents)
+    os.utime(path, (timestamp, timestamp))
+    self.engine.notifyFileChanged(path)
+
+  def testTimestampChanged(self):
+    self._write(self.sourcePath, "source", 1000000100)
+    _, reasonToBuild = self.configuration.checkDependencyInfo("foo.o", ["cc"])
+    self.assertEqual(reasonToBuild, None)
+
+    # The new timestamp should have been recorded.
+    dependencyInfo = self.engine.getDependencyInfo(
+      os.path.join(self.tempDir, "foo.o"),
+      )
+    self.assertEqual(dependencyInfo.depTimestamps, [1000000100])
+
+  def testContentsChanged(self):
+    self._write(self.sourcePath, "changed", 1000000100)
+    _, reasonToBuild = self.configuration.checkDependencyInfo("foo.o", ["cc"])
+    self.assertEqual(reasonToBuild, "'foo.c' has been changed")
+
+  def testDisabled(self):
+    self.engine.checkDigests = False
+    self._write(self.sourcePath, "source", 1000000100)
+    _, reasonToBuild = self.configuration.checkDependencyInfo("foo.o", ["cc"])
+    self.assertEqual(reasonToBuild, "'foo.c' has been changed")
+
+  def testProcessPoolJob(self):
+    self._write(self.sourcePath, "source", 1000000100)
+    depPath = self.engine.getDependencyInfoPath(os.path.join(self.tempDir, "foo.o"))
+    result = cake.engine._checkDependencyInfoJob(
+      depPath,
+      "foo.o",
+      ["cc"],
+      self.tempDir,
+      True,
+      )
+    self.assertEqual(result, (None, True))
+    result = cake.engine._checkDependencyInfoJob(
+      depPath,
+      "foo.o",
+      ["cc"],
+      self.tempDir,
+      True,
+      )
+    self.assertEqual(result, (None, False))
+
+class ResourcePoolTests(unittest.TestCase):
+
+  def setUp(self):
+    self.engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+
+  def _waitFor(self, condition):
+    endTime = time.time() + 5.0
+    while not condition() and time.time() < endTime:
+      time.sleep(0.001)
+    return condition()
+
+  def testPoolLimitsConcurrency(self):
+    self.engine.addResourcePool("link", 2)
+    
+    # Each link completes once its process task is started by the test,
+    # so links in the pool don't occupy a worker thread.
+    processes = []
+    def link():
+      process = self.engine.createTask()
+      processes.append(process)
+      return process
+
+    tasks = [self.engine.createTask(link, pool="link") for _ in xrange(5)]
+    for task in tasks:
+      task.start()
+
+    self.assertTrue(self._waitFor(lambda: len(processes) == 2))
+    time.sleep(0.05)
+    self.assertEqual(len(processes), 2)
+
+    processes[0].start()
+    self.assertTrue(self._waitFor(lambda: len(processes) == 3))
+    for i in xrange(1, 5):
+      processes[i].start()
+      self.assertTrue(self._waitFor(lambda: len(processes) == min(i + 3, 5)))
+
+    self.assertTrue(self._waitFor(lambda: all(t.succeeded for t in tasks)))
+
+  def testResultIsChained(self):
+    self.engine.addResourcePool("heavy_io", 1)
+    task = self.engine.createTask(lambda: 42, pool="heavy_io")
+    finished = threading.Event()
+    task.addCallback(finished.set)
+    task.start()
+    finished.wait()
+    self.assertEqual(task.result, 42)
+
+  def testUnknownPool(self):
+    self.assertRaises(
+      cake.engine.BuildError,
+      self.engine.createTask,
+      lambda: None,
+      pool="missing",
+      )
+
+class ParallelScriptTests(unittest.TestCase):
+
+  siblings = ["a", "b", "c", "d"]
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    self.threadPool = cake.threadpool.ThreadPool(len(self.siblings) + 2)
+    self.oldThreadPool = cake.task.setThreadPool(self.threadPool)
+
+    self.engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+    self.engine.parallelScripts = True
+    self.configuration = cake.engine.Configuration(
+      os.path.join(self.tempDir, "config.cake"),
+      self.engine,
+      )
+    self.variant = cake.engine.Variant()
+    self.variant.tools["script"] = ScriptTool(configuration=self.configuration)
+    self.configuration.addVariant(self.variant)
+
+    self.lock = threading.Lock()
+    self.started = threading.Condition(self.lock)
+    self.records = []
+    self.configuration.scriptGlobals["record"] = self._record
+    self.configuration.scriptGlobals["waitForSiblings"] = self._waitForSiblings
+
+  def tearDown(self):
+    cake.task.setThreadPool(self.oldThreadPool)
+    self.threadPool._shutdown()
+    self.engine.scriptThreadPool._shutdown()
+    shutil.rmtree(self.tempDir)
+
+  def _record(self, event):
+    from cake.script import Script
+    self.started.acquire()
+    try:
+      self.records.append((event, Script.getCurrent()))
+      self.started.notifyAll()
+    finally:
+      self.started.release()
+
+  def _waitForSiblings(self):
+    """Wait until every sibling script has started, which only happens if
+    they're executing concurrently.
+    """
+    endTime = time.time() + 5.0
+    self.started.acquire()
+    try:
+      while len(self._getRecords("start")) < len(self.siblings):
+        remaining = endTime - time.time()
+        if remaining <= 0:
+          return False
+        self.started.wait(remaining)
+      return True
+    finally:
+      self.started.release()
+
+  def _getRecords(self, event):
+    return [script for e, script in self.records if e == event]
+
+  def _write(self, path, lines):
+    cake.filesys.writeFile(
+      os.path.join(self.tempDir, path),
+      "\n".join(lines) + "\n",
+      )
+
+  def _build(self):
+    script = self.configuration.execute("build.cake", self.variant)
+    finished = threading.Event()
+    task = self.engine.createTask()
+    task.addCallback(finished.set)
+    task.startAfter(script.getDefaultTarget().task)
+    finished.wait(10.0)
+    self.assertTrue(task.succeeded, self.engine.errors)
+    return script
+
+  def testSiblingScripts(self):
+    self._write("build.cake", [
+      "from cake.tools import script",
+      "script.execute(%r)" % ["%s/build.cake" % n for n in self.siblings],
+      ])
+    for name in self.siblings:
+      self._write("%s/build.cake" % name, [
+        "from cake.script import Script",
+        "from cake.tools import script",
+        "current = Script.getCurrent()",
+        "record('start')",
+        "script.include('common.cake')",
+        "script.include('common.cake')",
+        "script.execute('shared/build.cake')",
+        "current.setResult(",
+        "  concurrent=waitForSiblings(),",
+        "  current=Script.getCurrent(),",
+        "  )",
+        ])
+    self._write("common.cake", ["record('common')"])
+    self._write("shared/build.cake", ["record('shared')"])
+
+    self._build()
+
+    siblingScripts = self._getRecords("start")
+    self.assertEqual(
+      sorted(s.path for s in siblingScripts),
+      ["%s/build.cake" % n for n in self.siblings],
+      )
+    for script in siblingScripts:
+      self.assertTrue(script._getResult("concurrent"))
+      self.assertTrue(script._getResult("current") is script)
+
+    # Each sibling includes the common script once, in its own context.
+    includers = [s.parent for s in self._getRecords("common")]
+    self.assertEqual(len(includers), len(self.siblings))
+    self.assertEqual(set(includers), set(siblingScripts))
+
+    # A script executed by every sibling is only executed once.
+    shared = self._getRecords("shared")
+    self.assertEqual([s.path for s in shared], ["shared/build.cake"])
+
+if __name__ == "__main__":
+  suite = unittest.TestSuite()
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(AbspathTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(AbspathBenchmarks))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(PreserveUnchangedTargetsTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(CheckDigestsTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ResourcePoolTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ParallelScriptTests))
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
@@ -0,0 +1,104 @@
+"""File System Unit Tests.
+"""
+
+import unittest
+import glob
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+
+import cake.engine
+import cake.filesys
+
+class FileSystemTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    for path in ["a.txt", "b.c", ".hidden", "x/c.txt", "x/y/d.c", "z/e.txt"]:
+      cake.filesys.writeFile(os.path.join(self.tempDir, path), path)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _osWalk(self, recursive=True):
+    paths = []
+    firstChar = len(self.tempDir) + 1
+    for dirPath, dirNames, fileNames in os.walk(self.tempDir):
+      dirPath = dirPath[firstChar:]
+      paths.extend(os.path.join(dirPath, n) for n in dirNames)
+      paths.extend(os.path.join(dirPath, n) for n in fileNames)
+      if not recursive:
+        break
+    return paths
+
+  def testWalkTree(self):
+    self.assertEqual(
+      list(cake.filesys.walkTree(self.tempDir)),
+      self._osWalk(),
+      )
+    self.assertEqual(
+      sorted(cake.filesys.walkTree(self.tempDir, recursive=False)),
+      sorted(self._osWalk(recursive=False)),
+      )
+    self.assertEqual(
+      list(cake.filesys.walkTree(
+        self.tempDir,
+        includeMatch=lambda p: not p.startswith("x"),
+        )),
+      [p for p in self._osWalk() if not p.startswith("x")],
+      )
+
+  def testIGlob(self):
+    for pattern in ["*", "*.txt", "*/*.txt", "*/*/*.c", "x/*", "x/", "b.c", ".*", "missing/*"]:
+      pathname = os.path.join(self.tempDir, pattern)
+      self.assertEqual(
+        sorted(cake.filesys.iglob(pathname)),
+        sorted(glob.glob(pathname)),
+        pattern,
+        )
+
+  def testEngineListDirectory(self):
+    # Make the directories old enough to be cached.
+    oldTime = time.time() - 60
+    os.utime(self.tempDir, (oldTime, oldTime))
+    
+    engine = cake.engine.Engine(None, None, [])
+    engine.stats.enabled = True
+    entries = engine.listDirectory(self.tempDir)
+    self.assertEqual(
+      sorted(entries),
+      sorted(cake.filesys.listDirectory(self.tempDir)),
+      )
+    self.assertTrue(engine.listDirectory(self.tempDir) is entries)
+    self.assertEqual(engine.stats.get("directoryCacheHits"), 1)
+
+    # Adding a file changes the directory timestamp.
+    cake.filesys.writeFile(os.path.join(self.tempDir, "new.txt"), "")
+    os.utime(self.tempDir, (oldTime + 1, oldTime + 1))
+    self.assertTrue("new.txt" in [e[0] for e in engine.listDirectory(self.tempDir)])
+
+  def testSaveDirectoryCache(self):
+    dirPath = os.path.join(self.tempDir, "x")
+    oldTime = time.time() - 60
+    os.utime(dirPath, (oldTime, oldTime))
+    cachePath = os.path.join(self.tempDir, "cache", "dirs.cache")
+
+    engine = cake.engine.Engine(None, None, [])
+    engine.directoryCachePath = cachePath
+    entries = engine.listDirectory(dirPath)
+    engine.saveDirectoryCache()
+
+    engine = cake.engine.Engine(None, None, [])
+    engine.stats.enabled = True
+    engine.directoryCachePath = cachePath
+    self.assertEqual(engine.listDirectory(dirPath), entries)
+    self.assertEqual(engine.stats.get("directoryCacheHits"), 1)
+    self.assertEqual(engine.stats.get("directoryCacheMisses"), 0)
+
+if __name__ == "__main__":
+  suite = unittest.TestLoader().loadTestsFromTestCase(FileSystemTests)
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
@@ -0,0 +1,97 @@
+"""GNU Utilities Unit Tests.
+"""
+
+import unittest
+import os
+import sys
+import time
+import tempfile
+
+from cake.gnu import parseDependencies, parseDependencyFile
+
+class ParseDependenciesTests(unittest.TestCase):
+
+  def testSimpleRule(self):
+    text = "foo.o: foo.c foo.h\n"
+    self.assertEqual(parseDependencies(text, ".o"), ["foo.c", "foo.h"])
+
+  def testContinuationLines(self):
+    text = "foo.o: foo.c \\\n  foo.h \\\r\n  bar.h\n"
+    self.assertEqual(
+      parseDependencies(text, ".o"),
+      ["foo.c", "foo.h", "bar.h"],
+      )
+
+  def testEscapedSpaces(self):
+    text = "foo.o: my\\ dir/foo.c include/a\\ b.h\n"
+    self.assertEqual(
+      parseDependencies(text, ".o"),
+      ["my dir/foo.c", "include/a b.h"],
+      )
+
+  def testDuplicatesRemoved(self):
+    text = "foo.o: foo.c foo.h foo.h foo.c\n"
+    self.assertEqual(parseDependencies(text, ".o"), ["foo.c", "foo.h"])
+
+  def testMultipleTargets(self):
+    text = "foo.d foo.o: foo.c foo.h\n"
+    self.assertEqual(parseDependencies(text, ".o"), ["foo.c", "foo.h"])
+
+  def testPhonyRulesIgnored(self):
+    text = "foo.o: foo.c foo.h\n\nfoo.h:\n"
+    self.assertEqual(parseDependencies(text, ".o"), ["foo.c", "foo.h"])
+
+  def testOtherTargetsIgnored(self):
+    text = "bar.d: bar.c\nfoo.o: foo.c\n"
+    self.assertEqual(parseDependencies(text, ".o"), ["foo.c"])
+
+  def testDriveLetters(self):
+    text = "c:/foo.o: c:/foo.c c:\\include\\foo.h\n"
+    self.assertEqual(
+      parseDependencies(text, ".o"),
+      ["c:/foo.c", "c:\\include\\foo.h"],
+      )
+
+  def testNoRule(self):
+    self.assertEqual(parseDependencies("", ".o"), [])
+    self.assertEqual(parseDependencies("foo.c foo.h\n", ".o"), [])
+
+  def testParseDependencyFile(self):
+    fd, path = tempfile.mkstemp()
+    try:
+      os.write(fd, "foo.o: foo.c \\\n foo.h\n")
+      os.close(fd)
+      self.assertEqual(parseDependencyFile(path, ".o"), ["foo.c", "foo.h"])
+    finally:
+      os.remove(path)
+
+class ParseDependenciesBenchmarks(unittest.TestCase):
+  """Benchmarks of parsing large generated dependency files.
+  """
+
+  def _generate(self, count):
+    lines = ["/src/project/foo.o: /src/project/foo.cpp"]
+    for i in xrange(count):
+      lines.append(
+        "  /usr/include/boost-1_%i/boost/some\\ dir/detail/header_%i.hpp" % (
+          i % 50, i))
+    return " \\\n".join(lines) + "\n"
+
+  def testLargeDependencyFile(self):
+    count = 20000
+    text = self._generate(count)
+
+    startTime = time.time()
+    dependencies = parseDependencies(text, ".o")
+    sys.stderr.write("%i KB .d file: %.3fs ... " % (
+      len(text) // 1024, time.time() - startTime))
+
+    self.assertEqual(len(dependencies), count + 1)
+    self.assertTrue(dependencies[-1].endswith("some dir/detail/header_19999.hpp"))
+
+if __name__ == "__main__":
+  suite = unittest.TestSuite()
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ParseDependenciesTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ParseDependenciesBenchmarks))
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
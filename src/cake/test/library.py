@@ -0,0 +1,1015 @@
+"""Tool Unit Tests.
+"""
+
+import unittest
+import os.path
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+import cake.engine
+import cake.filesys
+import cake.logging
+import cake.path
+import cake.library
+import cake.library.compilers
+import cake.library.compilers.dummy
+import cake.library.filesys
+import cake.library.zipping
+import cake.system
+import cake.target
+import cake.zipping
+
+from cake.script import Script
+
+def _createConfiguration():
+  engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+  return cake.engine.Configuration("/project/config.cake", engine)
+
+def _createCompiler():
+  configuration = _createConfiguration()
+  compiler = cake.library.compilers.dummy.DummyCompiler(configuration)
+  for i in xrange(40):
+    compiler.addCFlag("-cflag%i" % i)
+    compiler.addCppFlag("-cppflag%i" % i)
+    compiler.addIncludePath("include/path%i" % i)
+    compiler.addDefine("DEFINE%i" % i, str(i))
+    compiler.addLibraryPath("lib/path%i" % i)
+    compiler.addLibrary("library%i" % i)
+  return compiler
+
+class CloneTests(unittest.TestCase):
+
+  def testCloneHasSameState(self):
+    compiler = _createCompiler()
+    clone = compiler.clone()
+    self.assertEqual(clone.cFlags, compiler.cFlags)
+    self.assertEqual(clone.getIncludePaths(), compiler.getIncludePaths())
+    self.assertEqual(clone.getDefines(), compiler.getDefines())
+
+  def testModifyClone(self):
+    compiler = _createCompiler()
+    cFlags = list(compiler.cFlags)
+    clone = compiler.clone()
+    clone.addCFlag("-clone")
+    clone.insertIncludePath(0, "clone")
+    self.assertEqual(compiler.cFlags, cFlags)
+    self.assertEqual(clone.cFlags, cFlags + ["-clone"])
+    self.assertFalse("clone" in compiler.getIncludePaths())
+    self.assertEqual(clone.getIncludePaths()[0], "clone")
+
+  def testModifyOriginal(self):
+    compiler = _createCompiler()
+    clone = compiler.clone()
+    compiler.addDefine("ORIGINAL")
+    self.assertTrue("ORIGINAL" in compiler.getDefines())
+    self.assertFalse("ORIGINAL" in clone.getDefines())
+
+  def testModifyCloneOfClone(self):
+    compiler = _createCompiler()
+    clone = compiler.clone()
+    cloneOfClone = clone.clone()
+    clone.addLibrary("clone")
+    cloneOfClone.addLibrary("cloneOfClone")
+    self.assertFalse("clone" in compiler.getLibraries())
+    self.assertFalse("cloneOfClone" in compiler.getLibraries())
+    self.assertTrue("clone" in clone.getLibraries())
+    self.assertFalse("cloneOfClone" in clone.getLibraries())
+    self.assertTrue("cloneOfClone" in cloneOfClone.getLibraries())
+
+  def testModifyAttributeInPlace(self):
+    compiler = _createCompiler()
+    clone = compiler.clone()
+    sibling = compiler.clone()
+    clone.includePaths.append("clone")
+    clone.cFlags.insert(0, "-clone")
+    self.assertEqual(clone.getIncludePaths()[-1], "clone")
+    self.assertEqual(clone.cFlags[0], "-clone")
+    for other in (compiler, sibling):
+      self.assertFalse("clone" in other.getIncludePaths())
+      self.assertFalse("-clone" in other.cFlags)
+
+  def testGettersCantModify(self):
+    compiler = _createCompiler()
+    self.assertTrue(isinstance(compiler.getIncludePaths(), tuple))
+    self.assertTrue(isinstance(compiler.getDefines(), tuple))
+    self.assertTrue(isinstance(compiler.getLibraries(), tuple))
+
+  def testAssignedValueIsNotCopied(self):
+    compiler = _createCompiler()
+    compiler.clone()
+    cFlags = ["-assigned"]
+    compiler.cFlags = cFlags
+    compiler.addCFlag("-added")
+    self.assertTrue(compiler.cFlags is cFlags)
+    self.assertEqual(cFlags, ["-assigned", "-added"])
+
+class CloneBenchmarks(unittest.TestCase):
+  """Benchmarks of copy-on-write cloning against deep copying.
+  """
+
+  def testCloneCompiler(self):
+    compiler = _createCompiler()
+    count = 2000
+
+    startTime = time.time()
+    for _ in xrange(count):
+      new = object.__new__(compiler.__class__)
+      new.__dict__ = cake.library.cloneTools(compiler.__dict__)
+    deepCopyTime = time.time() - startTime
+
+    startTime = time.time()
+    for _ in xrange(count):
+      compiler.clone()
+    cloneTime = time.time() - startTime
+
+    sys.stderr.write("cloneTools: %.3fs, clone: %.3fs ... " % (
+      deepCopyTime, cloneTime))
+
+class CacheEntryTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+    configuration = cake.engine.Configuration(
+      os.path.join(self.tempDir, "config.cake"),
+      engine,
+      )
+    self.compiler = cake.library.compilers.dummy.DummyCompiler(configuration)
+    self.compiler.objectCachePath = "cache"
+    self.entryPath = self.compiler._getCacheEntryPath("\x12" * 20)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _write(self, path, data):
+    cake.filesys.writeFile(os.path.join(self.tempDir, path), data)
+
+  def _read(self, path):
+    return cake.filesys.readFile(os.path.join(self.tempDir, path))
+
+  def testRestoreAllOutputs(self):
+    self._write("build/a.dll", "dll")
+    self._write("build/a.lib", "lib")
+    self._write("build/a.pdb", "pdb")
+    targets = ["build/a.dll", "build/a.lib", "build/a.pdb"]
+    self.compiler._storeCacheEntry(self.entryPath, targets)
+    shutil.rmtree(os.path.join(self.tempDir, "build"))
+
+    restored = self.compiler._restoreCacheEntry(self.entryPath, ["build/a.dll"], "")
+    self.assertEqual(restored, targets)
+    self.assertEqual(self._read("build/a.dll"), "dll")
+    self.assertEqual(self._read("build/a.lib"), "lib")
+    self.assertEqual(self._read("build/a.pdb"), "pdb")
+
+  def testRestoreSingleOutput(self):
+    self._write("build/a.o", "object")
+    self.compiler._storeCacheEntry(self.entryPath, ["build/a.o"])
+    self.assertFalse(os.path.exists(self.entryPath + ".outputs"))
+    self._write("build/a.o", "changed")
+
+    restored = self.compiler._restoreCacheEntry(self.entryPath, ["build/a.o"], "")
+    self.assertEqual(restored, ["build/a.o"])
+    self.assertEqual(self._read("build/a.o"), "object")
+
+  def testMissingEntry(self):
+    restored = self.compiler._restoreCacheEntry(self.entryPath, ["build/a.o"], "")
+    self.assertEqual(restored, None)
+
+  def testEntryMissingRequiredOutput(self):
+    self._write("build/a.pch", "pch")
+    self.compiler._storeCacheEntry(self.entryPath, ["build/a.pch"])
+
+    restored = self.compiler._restoreCacheEntry(
+      self.entryPath,
+      ["build/a.pch", "build/a.obj"],
+      "",
+      )
+    self.assertEqual(restored, None)
+
+  def testCorruptOutputsList(self):
+    self._write("build/a.dll", "dll")
+    self._write("build/a.lib", "lib")
+    self.compiler._storeCacheEntry(self.entryPath, ["build/a.dll", "build/a.lib"])
+    cake.filesys.writeFile(self.entryPath + ".outputs", "corrupt")
+
+    restored = self.compiler._restoreCacheEntry(self.entryPath, ["build/a.dll"], "")
+    self.assertEqual(restored, None)
+
+class IncrementalArchivingTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+    self.configuration = cake.engine.Configuration(
+      os.path.join(self.tempDir, "config.cake"),
+      engine,
+      )
+    self.compiler = cake.library.compilers.dummy.DummyCompiler(self.configuration)
+    self.compiler.useIncrementalArchiving = True
+    for name in ["a.o", "b.o", "c.o"]:
+      self._write(name, name)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _write(self, path, data):
+    cake.filesys.writeFile(os.path.join(self.tempDir, path), data)
+
+  def _getArgs(self, sources):
+    update, _ = self.compiler.getLibraryUpdateCommand("lib.a", sources)
+    return [repr(update), list(sources)]
+
+  def _getOldDependencyInfo(self, sources):
+    return self.configuration.createDependencyInfo(
+      targets=["lib.a"],
+      args=self._getArgs(sources),
+      dependencies=sources,
+      calculateDigests=True,
+      )
+
+  def testChangedMembers(self):
+    sources = ["a.o", "b.o", "c.o"]
+    oldDependencyInfo = self._getOldDependencyInfo(sources)
+    self._write("b.o", "changed")
+    self.configuration.engine.notifyFileChanged(os.path.join(self.tempDir, "b.o"))
+
+    members = self.compiler._getChangedLibraryMembers(
+      oldDependencyInfo,
+      self._getArgs(sources),
+      sources,
+      )
+    self.assertEqual(members, (["b.o"], []))
+
+  def testAddedAndRemovedMembers(self):
+    oldDependencyInfo = self._getOldDependencyInfo(["a.o", "b.o"])
+    sources = ["a.o", "c.o"]
+
+    members = self.compiler._getChangedLibraryMembers(
+      oldDependencyInfo,
+      self._getArgs(sources),
+      sources,
+      )
+    self.assertEqual(members, (["c.o"], ["b.o"]))
+
+  def testCommandChanged(self):
+    sources = ["a.o", "b.o"]
+    oldDependencyInfo = self._getOldDependencyInfo(sources)
+    args = self._getArgs(sources)
+    args[0] = repr(["ar", "/different"])
+
+    members = self.compiler._getChangedLibraryMembers(
+      oldDependencyInfo,
+      args,
+      sources,
+      )
+    self.assertEqual(members, None)
+
+  def testNotBuiltIncrementally(self):
+    sources = ["a.o", "b.o"]
+    archive, _ = self.compiler.getLibraryCommand("lib.a", sources)
+    oldDependencyInfo = self.configuration.createDependencyInfo(
+      targets=["lib.a"],
+      args=repr(archive),
+      dependencies=sources,
+      calculateDigests=True,
+      )
+
+    members = self.compiler._getChangedLibraryMembers(
+      oldDependencyInfo,
+      self._getArgs(sources),
+      sources,
+      )
+    self.assertEqual(members, None)
+
+class SharedCompileTests(unittest.TestCase):
+
+  def setUp(self):
+    self.compiler = _createCompiler()
+    self.compiler.shareIdenticalObjects = True
+
+  def _getArgs(self, compiler, target):
+    _, args, _ = compiler.getObjectCommands(target, "src/foo.c", None, False)
+    return args
+
+  def testIdenticalCompilesAreShared(self):
+    clone = self.compiler.clone()
+    first, isOwner = self.compiler._getSharedCompile(
+      "release/foo.o",
+      self._getArgs(self.compiler, "release/foo.o"),
+      )
+    self.assertTrue(isOwner)
+    second, isOwner = clone._getSharedCompile(
+      "profile/foo.o",
+      self._getArgs(clone, "profile/foo.o"),
+      )
+    self.assertFalse(isOwner)
+    self.assertTrue(second is first)
+    self.assertEqual(second.target, "release/foo.o")
+
+  def testDifferentEnvironmentsAreNotShared(self):
+    clone = self.compiler.clone()
+    clone._Compiler__binPaths = ["/other/bin"]
+    self.compiler._getSharedCompile(
+      "release/foo.o",
+      self._getArgs(self.compiler, "release/foo.o"),
+      )
+    _, isOwner = clone._getSharedCompile(
+      "profile/foo.o",
+      self._getArgs(clone, "profile/foo.o"),
+      )
+    self.assertTrue(isOwner)
+
+  def testDifferentCompilesAreNotShared(self):
+    clone = self.compiler.clone()
+    clone.addDefine("PROFILE")
+    self.compiler._getSharedCompile(
+      "release/foo.o",
+      self._getArgs(self.compiler, "release/foo.o"),
+      )
+    _, isOwner = clone._getSharedCompile(
+      "profile/foo.o",
+      self._getArgs(clone, "profile/foo.o"),
+      )
+    self.assertTrue(isOwner)
+
+class ProcessLaunchTests(unittest.TestCase):
+
+  def testPlainArgsDontNeedShell(self):
+    self.assertFalse(cake.library.compilers._needsShell([
+      "/usr/bin/gcc", "-c", "-DFOO=1", "src/my file.c", "-o", "obj/a.o", "@args",
+      ]))
+
+  def testSpecialArgsNeedShell(self):
+    for arg in ['-DSTR=\\"x\\"', "$HOME", "*.c", "a;b", "~/x", "", "a\n"]:
+      self.assertTrue(cake.library.compilers._needsShell(["/usr/bin/gcc", arg]), repr(arg))
+
+  def testDirectExecution(self):
+    compiler = _createCompiler()
+    compiler.useResponseFile = False
+    command = compiler._prepareProcess(["/usr/bin/gcc", "-c", "a b.c"], None, True)
+    if cake.system.isWindows():
+      self.assertEqual(command.args, '/usr/bin/gcc -c "a b.c"')
+    else:
+      self.assertEqual(command.args, ["/usr/bin/gcc", "-c", "a b.c"])
+      self.assertFalse(command.keywords["shell"])
+
+class _ToolBuildTestCase(unittest.TestCase):
+  """Base class for tests that build with tools in a temporary project.
+  """
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _write(self, path, data):
+    cake.filesys.writeFile(os.path.join(self.tempDir, path), data)
+
+  def _read(self, path):
+    return cake.filesys.readFile(os.path.join(self.tempDir, path))
+
+  def _build(self, createTargets, checkDigests=False, succeeded=True):
+    """Build the targets created by a function with a new engine.
+
+    @param succeeded: Whether the build is expected to succeed.
+
+    @return: The engine's statistics.
+    @rtype: L{cake.stats.Statistics}
+    """
+    engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+    engine.stats.enabled = True
+    engine.checkDigests = checkDigests
+    configuration = cake.engine.Configuration(
+      os.path.join(self.tempDir, "config.cake"),
+      engine,
+      )
+    script = Script(
+      path="build.cake",
+      configuration=configuration,
+      variant=None,
+      engine=engine,
+      task=None,
+      )
+    oldScript = Script.getCurrent()
+    Script._current.value = script
+    try:
+      targets = createTargets(configuration)
+    finally:
+      Script._current.value = oldScript
+
+    finished = threading.Event()
+    task = engine.createTask()
+    task.addCallback(finished.set)
+    task.startAfter([t.task for t in targets])
+    finished.wait(10.0)
+    self.assertEqual(task.succeeded, succeeded, engine.errors)
+    return engine.stats
+
+class ZipToolTests(_ToolBuildTestCase):
+
+  def _writeZip(self, path, members):
+    zipFile = zipfile.ZipFile(os.path.join(self.tempDir, path), "w")
+    try:
+      for name, data in members:
+        zipFile.writestr(name, data)
+    finally:
+      zipFile.close()
+
+  def testExtractZipsToSameDirectory(self):
+    self._writeZip("a.zip", [("a.txt", "a")])
+    self._writeZip("b.zip", [("b.txt", "b")])
+    def extract(configuration):
+      zipTool = cake.library.zipping.ZipTool(configuration)
+      return [
+        zipTool.extract("out", "a.zip", removeStale=False),
+        zipTool.extract("out", "b.zip", removeStale=False),
+        ]
+
+    stats = self._build(extract)
+    self.assertEqual(stats.get("targetsRebuilt"), 2)
+    self.assertEqual(self._read("out/a.txt"), "a")
+    self.assertEqual(self._read("out/b.txt"), "b")
+
+    # Each zip's extraction is recorded separately, so neither
+    # invalidates the other.
+    stats = self._build(extract)
+    self.assertEqual(stats.get("targetsChecked"), 2)
+    self.assertEqual(stats.get("targetsRebuilt"), 0)
+
+  def _touch(self, path, data):
+    # Write the same contents again with a new timestamp, like a fresh
+    # checkout or extraction would.
+    self._write(path, data)
+    newTime = time.time() + 60
+    os.utime(os.path.join(self.tempDir, path), (newTime, newTime))
+
+  def testExtractUnchangedArchiveWithCheckDigests(self):
+    self._writeZip("a.zip", [("a.txt", "a")])
+    def extract(configuration):
+      zipTool = cake.library.zipping.ZipTool(configuration)
+      return [zipTool.extract("out", "a.zip")]
+    stats = self._build(extract, checkDigests=True)
+    self.assertEqual(stats.get("targetsRebuilt"), 1)
+
+    self._touch("a.zip", self._read("a.zip"))
+    stats = self._build(extract, checkDigests=True)
+    self.assertEqual(stats.get("targetsRebuilt"), 0)
+    self.assertEqual(stats.get("targetsRefreshed"), 1)
+    self.assertEqual(self._read("out/a.txt"), "a")
+
+  def _compress(self, configuration):
+    zipTool = cake.library.zipping.ZipTool(configuration)
+    return [zipTool.compress("out.zip", "src")]
+
+  def _readZip(self, path):
+    zipFile = zipfile.ZipFile(os.path.join(self.tempDir, path), "r")
+    try:
+      self.assertEqual(zipFile.testzip(), None)
+      return dict((n, zipFile.read(n)) for n in zipFile.namelist())
+    finally:
+      zipFile.close()
+
+  def _testCompress(self):
+    expected = {}
+    for i in xrange(20):
+      name = "f%02i.txt" % i
+      data = "".join("%s line %i\n" % (name, j) for j in xrange(1000))
+      self._write(os.path.join("src", name), data)
+      expected[name] = data
+    self._build(self._compress)
+    self.assertEqual(self._readZip("out.zip"), expected)
+
+    # Change a member so the zip is rewritten, copying the others.
+    oldTime = time.time() - 60
+    os.utime(os.path.join(self.tempDir, "src", "f03.txt"), (oldTime, oldTime))
+    expected["f03.txt"] = self._read("src/f03.txt")
+    self._build(self._compress)
+    self.assertEqual(self._readZip("out.zip"), expected)
+    self.assertFalse(os.path.exists(os.path.join(self.tempDir, "out.zip.tmp")))
+
+    # Add a member so it is appended.
+    self._write("src/new.txt", "new")
+    expected["new.txt"] = "new"
+    self._build(self._compress)
+    self.assertEqual(self._readZip("out.zip"), expected)
+
+  def testCompress(self):
+    self._testCompress()
+
+  def testCompressWithoutRawWrites(self):
+    canWriteRaw = cake.zipping._canWriteRaw
+    cake.zipping._canWriteRaw = False
+    try:
+      self._testCompress()
+    finally:
+      cake.zipping._canWriteRaw = canWriteRaw
+
+  def testWriterOrdersMembers(self):
+    for name in ["a", "b", "c"]:
+      self._write(name, name * 100)
+    f = open(os.path.join(self.tempDir, "out.zip"), "wb")
+    try:
+      zipFile = zipfile.ZipFile(f, "w")
+      writer = cake.library.zipping._ZipWriter(zipFile, ["a", "b", "c"])
+      members = {}
+      for name in ["c", "b", "a"]:
+        members[name] = cake.zipping.compressMember(
+          os.path.join(self.tempDir, name),
+          name,
+          )
+      writer.add("c", *members["c"])
+      writer.add("b", *members["b"])
+      # Members waiting for their turn are moved out of memory.
+      self.assertTrue(members["c"][1]._rolled)
+      writer.add("a", *members["a"])
+      writer.close()
+    finally:
+      f.close()
+
+    zipFile = zipfile.ZipFile(os.path.join(self.tempDir, "out.zip"), "r")
+    try:
+      self.assertEqual(zipFile.namelist(), ["a", "b", "c"])
+      self.assertEqual(zipFile.read("c"), "c" * 100)
+    finally:
+      zipFile.close()
+
+class BulkCopyTests(_ToolBuildTestCase):
+
+  def setUp(self):
+    _ToolBuildTestCase.setUp(self)
+    self._write("src/a.txt", "aaaa")
+    self._write("src/sub/b.txt", "bbbb")
+
+  def _copy(self, listFiles=False):
+    def copy(configuration):
+      filesys = cake.library.filesys.FileSystemTool(configuration)
+      targets = filesys.copyDirectory(
+        "src",
+        "out",
+        bulk=True,
+        listFiles=listFiles,
+        )
+      if listFiles:
+        return targets
+      return [targets]
+    return copy
+
+  def _setMtime(self, path, mtime):
+    os.utime(os.path.join(self.tempDir, path), (mtime, mtime))
+
+  def _getMtime(self, path):
+    return os.stat(os.path.join(self.tempDir, path)).st_mtime
+
+  def testCopy(self):
+    self._build(self._copy())
+    self.assertEqual(self._read("out/a.txt"), "aaaa")
+    self.assertEqual(self._read("out/sub/b.txt"), "bbbb")
+    self.assertAlmostEqual(
+      self._getMtime("out/a.txt"),
+      self._getMtime("src/a.txt"),
+      places=3,
+      )
+
+  def testListFiles(self):
+    targets = []
+    def copy(configuration):
+      targets.extend(self._copy(listFiles=True)(configuration))
+      return targets
+    self._build(copy)
+    self.assertEqual(
+      sorted(t.path.replace(os.sep, "/") for t in targets),
+      ["out/a.txt", "out/sub", "out/sub/b.txt"],
+      )
+    self.assertEqual(self._read("out/sub/b.txt"), "bbbb")
+
+  def testSkipWhenUnchanged(self):
+    self._build(self._copy())
+    # A target with the same size and time as its source isn't copied.
+    mtime = self._getMtime("src/a.txt")
+    self._write("out/a.txt", "xxxx")
+    self._setMtime("out/a.txt", mtime)
+    self._build(self._copy())
+    self.assertEqual(self._read("out/a.txt"), "xxxx")
+
+  def testRecopyOnChange(self):
+    self._build(self._copy())
+    # A source changed to an older time with the same size is copied.
+    mtime = self._getMtime("src/a.txt") - 60
+    self._write("src/a.txt", "AAAA")
+    self._setMtime("src/a.txt", mtime)
+    self._build(self._copy())
+    self.assertEqual(self._read("out/a.txt"), "AAAA")
+    self.assertAlmostEqual(self._getMtime("out/a.txt"), mtime, places=3)
+
+    # And so is a source changed to a newer time.
+    self._write("src/sub/b.txt", "BBBB")
+    self._setMtime("src/sub/b.txt", mtime + 120)
+    self._build(self._copy())
+    self.assertEqual(self._read("out/sub/b.txt"), "BBBB")
+
+class SharedCompileBuildTests(_ToolBuildTestCase):
+
+  def _buildObjects(self, failOwner=False, canBeCached=True):
+    """Build the same object for two targets, the first being compiled
+    and the second waiting to copy it.
+    """
+    self._write("foo.c", "int x;\n")
+    def createTargets(configuration):
+      self.configuration = configuration
+      engine = configuration.engine
+      owner = cake.library.compilers.dummy.DummyCompiler(configuration)
+      owner.shareIdenticalObjects = True
+      waiter = owner.clone()
+      if failOwner:
+        getObjectCommands = owner.getObjectCommands
+        def failingObjectCommands(target, source, pch, shared):
+          _, args, canBeCached = getObjectCommands(target, source, pch, shared)
+          def compile():
+            engine.raiseError("cake: failed to compile %s\n" % source, targets=[target])
+          return compile, args, canBeCached
+        owner.getObjectCommands = failingObjectCommands
+      if not canBeCached:
+        def makeUncached(getObjectCommands):
+          def uncachedObjectCommands(target, source, pch, shared):
+            compile, args, _ = getObjectCommands(target, source, pch, shared)
+            return compile, args, False
+          return uncachedObjectCommands
+        for compiler in (owner, waiter):
+          compiler.getObjectCommands = makeUncached(compiler.getObjectCommands)
+
+      # Register the owner's compile before the waiter looks for it.
+      self.waiterTask = engine.createTask(
+        lambda: waiter.buildObject("profile/foo.obj", "foo.c", None, False)
+        )
+      def buildOwner():
+        owner.buildObject("release/foo.obj", "foo.c", None, False)
+        self.waiterTask.start()
+      ownerTask = engine.createTask(buildOwner)
+      ownerTask.start()
+      return [cake.target.Target(ownerTask), cake.target.Target(self.waiterTask)]
+    return self._build(createTargets, succeeded=not failOwner)
+
+  def _getDependencyInfo(self, path):
+    absPath = self.configuration.abspath(path)
+    return self.configuration.engine.getDependencyInfo(absPath)
+
+  def testWaiterCopiesObject(self):
+    stats = self._buildObjects()
+    self.assertEqual(stats.get("sharedCompiles"), 1)
+    self.assertTrue(os.path.isfile(os.path.join(self.tempDir, "profile", "foo.obj")))
+
+    ownerInfo = self._getDependencyInfo("release/foo.obj")
+    waiterInfo = self._getDependencyInfo("profile/foo.obj")
+    self.assertTrue(ownerInfo.depPaths)
+    self.assertEqual(waiterInfo.depPaths, ownerInfo.depPaths)
+    self.assertEqual(waiterInfo.targets, ["profile/foo.obj"])
+    _, reason = self.configuration.checkDependencyInfo(
+      "profile/foo.obj",
+      waiterInfo.args,
+      )
+    self.assertEqual(reason, None)
+
+  def testFailedOwnerFailsWaiter(self):
+    stats = self._buildObjects(failOwner=True)
+    self.assertTrue(self.waiterTask.failed)
+    self.assertEqual(stats.get("sharedCompiles"), 0)
+    self.assertFalse(os.path.exists(os.path.join(self.tempDir, "profile", "foo.obj")))
+
+  def testUncacheableObjectNotShared(self):
+    stats = self._buildObjects(canBeCached=False)
+    self.assertEqual(stats.get("sharedCompiles"), 0)
+    self.assertEqual(self._getDependencyInfo("profile/foo.obj").targets, ["profile/foo.obj"])
+    self.assertTrue(os.path.isfile(os.path.join(self.tempDir, "release", "foo.obj")))
+    self.assertTrue(os.path.isfile(os.path.join(self.tempDir, "profile", "foo.obj")))
+
+class PchCacheTests(_ToolBuildTestCase):
+
+  def _buildPch(self, cacheAllOutputs):
+    self._write("a.cpp", "#include \"a.h\"\n")
+    self._write("a.h", "int x;\n")
+    def createTargets(configuration):
+      compiler = cake.library.compilers.dummy.DummyCompiler(configuration)
+      compiler.objectCachePath = os.path.join(self.tempDir, "cache")
+      compiler.cacheAllOutputs = cacheAllOutputs
+      return [compiler.pch("build/a.pch", "a.cpp", "a.h")]
+    self._build(createTargets)
+    self.assertTrue(os.path.isfile(os.path.join(self.tempDir, "build", "a.pch")))
+    cachePath = os.path.join(self.tempDir, "cache")
+    return os.path.isdir(cachePath) and bool(os.listdir(cachePath))
+
+  def testNotCachedByDefault(self):
+    self.assertFalse(self._buildPch(cacheAllOutputs=False))
+
+  def testCachedWithAllOutputs(self):
+    self.assertTrue(self._buildPch(cacheAllOutputs=True))
+
+class AutoPchTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    self.projectDir = os.path.join(self.tempDir, "project")
+    self.externalDir = os.path.join(self.tempDir, "sdk")
+    self.pchCalls = []
+    self._newBuild()
+    for name in ["vector", "string", "map"]:
+      cake.filesys.writeFile(os.path.join(self.externalDir, name), "")
+    cake.filesys.writeFile(os.path.join(self.projectDir, "local.h"), "")
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def _newBuild(self):
+    engine = cake.engine.Engine(cake.logging.Logger(), None, [])
+    self.configuration = cake.engine.Configuration(
+      os.path.join(self.projectDir, "config.cake"),
+      engine,
+      )
+    self.compiler = cake.library.compilers.dummy.DummyCompiler(self.configuration)
+    def pch(target, source, header, prerequisites, forceInclude=False):
+      self.pchCalls.append((target, source, header, forceInclude))
+      return "pch-%i" % len(self.pchCalls)
+    self.compiler._pch = pch
+
+  def _exists(self, path):
+    return os.path.exists(os.path.join(self.projectDir, path))
+
+  def _addSource(self, name, includes, built=True, pch=None):
+    text = "".join("#include %s\n" % i for i in includes) + "int x;\n"
+    cake.filesys.writeFile(os.path.join(self.projectDir, name), text)
+    if built:
+      dependencies = [name]
+      if pch is not None:
+        dependencies.append(pch)
+      for include in includes:
+        include = include[1:-1]
+        if include == "local.h":
+          dependencies.append("local.h")
+        else:
+          dependencies.append(os.path.join(self.externalDir, include))
+      target = self.configuration.abspath(
+        os.path.join("obj", os.path.splitext(name)[0] + ".obj")
+        )
+      self.configuration.engine.storeDependencyInfo(
+        target,
+        self.configuration.createDependencyInfo([target], [], dependencies),
+        )
+    return name
+
+  def testLeadingIncludes(self):
+    text = "\n".join([
+      "// Copyright",
+      "/* multi",
+      "   line */",
+      "#include <vector>",
+      "  #  include \"foo/bar.h\" // trailing",
+      "",
+      "#define X",
+      "#include <map>",
+      ])
+    self.assertEqual(
+      cake.library.compilers._getLeadingIncludes(text),
+      [("vector", True), ("foo/bar.h", False)],
+      )
+
+  def testCommonExternalHeadersArePrecompiled(self):
+    sources = [
+      self._addSource("a.cpp", ["<vector>", "<string>", '"local.h"']),
+      self._addSource("b.cpp", ["<string>", "<vector>"]),
+      self._addSource("c.cpp", ["<vector>", "<string>", "<map>"]),
+      self._addSource("d.cpp", ["<vector>", "<string>"]),
+      self._addSource("e.cpp", ['"local.h"', "<vector>", "<string>"]),
+      self._addSource("f.cpp", ["<vector>", "<string>"], built=False),
+      ]
+    pch, users = self.compiler._getAutoPch("obj", sources, [])
+
+    self.assertEqual(pch, "pch-1")
+    self.assertEqual(users, frozenset(["a.cpp", "b.cpp", "c.cpp", "d.cpp"]))
+    self.assertEqual(len(self.pchCalls), 1)
+    target, source, headerPath, forceInclude = self.pchCalls[0]
+    self.assertTrue(target.startswith("obj/autopch-"))
+    self.assertTrue(target.endswith(".h"))
+    self.assertEqual(source, cake.path.stripExtension(target) + ".cpp")
+    self.assertEqual(headerPath, os.path.join(self.projectDir, target))
+    self.assertTrue(forceInclude)
+    header = cake.filesys.readFile(headerPath)
+    self.assertTrue(header.endswith("#include <vector>\n#include <string>\n"))
+
+  def testSharedTargetDirectory(self):
+    first = [
+      self._addSource("%s.cpp" % n, ["<vector>"]) for n in "abcd"
+      ]
+    second = [
+      self._addSource("%s.cpp" % n, ["<map>"]) for n in "efgh"
+      ]
+    self.compiler._getAutoPch("obj", first, [])
+    self.compiler._getAutoPch("obj", second, [])
+
+    self.assertEqual(len(self.pchCalls), 2)
+    self.assertNotEqual(self.pchCalls[0][0], self.pchCalls[1][0])
+    self.assertTrue(cake.filesys.readFile(self.pchCalls[0][2]).endswith("<vector>\n"))
+    self.assertTrue(cake.filesys.readFile(self.pchCalls[1][2]).endswith("<map>\n"))
+
+  def testIdenticalPchIsShared(self):
+    first = [
+      self._addSource("%s.cpp" % n, ["<vector>"]) for n in "abcd"
+      ]
+    second = [
+      self._addSource("%s.cpp" % n, ["<vector>"]) for n in "efgh"
+      ]
+    self.assertEqual(self.compiler._getAutoPch("obj", first, [])[0], "pch-1")
+    self.assertEqual(self.compiler._getAutoPch("obj", second, [])[0], "pch-1")
+    self.assertEqual(len(self.pchCalls), 1)
+
+  def testNameUnchangedWhenSourcesChange(self):
+    sources = [
+      self._addSource("%s.cpp" % n, ["<vector>"]) for n in "abcd"
+      ]
+    self.compiler._getAutoPch("obj", sources, [])
+
+    self._newBuild()
+    sources.append(self._addSource("e.cpp", ["<vector>"]))
+    self.compiler._getAutoPch("obj", sources, [])
+
+    self._newBuild()
+    self.compiler._getAutoPch("obj", sources[1:], [])
+
+    targets = [call[0] for call in self.pchCalls]
+    self.assertEqual(targets, [targets[0]] * 3)
+
+  def testNameChangedWithArgs(self):
+    sources = [
+      self._addSource("%s.cpp" % n, ["<vector>"]) for n in "abcd"
+      ]
+    self.compiler._getAutoPch("obj", sources, [])
+
+    self._newBuild()
+    self.compiler.addDefine("FOO")
+    self.compiler._getAutoPch("obj", sources, [])
+
+    self.assertNotEqual(self.pchCalls[0][0], self.pchCalls[1][0])
+
+  def testPreviousFilesRemoved(self):
+    oldFiles = [
+      "obj/autopch-00000000.h",
+      "obj/autopch-00000000.cpp",
+      "obj/autopch-00000000.h.pch",
+      ]
+    for path in oldFiles + ["obj/autopch-00000001.h", "obj/other.h"]:
+      cake.filesys.writeFile(os.path.join(self.projectDir, path), "")
+    sources = [
+      self._addSource("%s.cpp" % n, ["<vector>"], pch="obj/autopch-00000000.h.pch")
+      for n in "abcd"
+      ]
+    self.compiler._getAutoPch("obj", sources, [])
+
+    self.assertTrue(self._exists(self.pchCalls[0][0]))
+    for path in oldFiles:
+      self.assertFalse(self._exists(path), path)
+    self.assertTrue(self._exists("obj/autopch-00000001.h"))
+    self.assertTrue(self._exists("obj/other.h"))
+
+  def testFilesInUseNotRemoved(self):
+    other = [
+      self._addSource("%s.cpp" % n, ["<map>"]) for n in "efgh"
+      ]
+    self.compiler._getAutoPch("obj", other, [])
+    otherHeader = self.pchCalls[0][0]
+    cake.filesys.writeFile(os.path.join(self.projectDir, otherHeader + ".pch"), "")
+
+    # These objects used to share the other objects' pch.
+    sources = [
+      self._addSource("%s.cpp" % n, ["<vector>"], pch=otherHeader + ".pch")
+      for n in "abcd"
+      ]
+    self.compiler._getAutoPch("obj", sources, [])
+
+    self.assertNotEqual(self.pchCalls[1][0], otherHeader)
+    self.assertTrue(self._exists(otherHeader))
+
+  def testTooFewObjects(self):
+    sources = [
+      self._addSource("a.cpp", ["<vector>"]),
+      self._addSource("b.cpp", ["<vector>"]),
+      self._addSource("c.cpp", ["<map>"]),
+      ]
+    self.assertEqual(
+      self.compiler._getAutoPch("obj", sources, []),
+      (None, frozenset()),
+      )
+    self.assertEqual(self.pchCalls, [])
+
+class AutoPchCommandTests(unittest.TestCase):
+  """Check that objects using an automatic precompiled header force
+  include it, as their sources don't include it themselves.
+  """
+
+  def setUp(self):
+    self.configuration = _createConfiguration()
+    self.oldScript = Script.getCurrent()
+    Script._current.value = Script(
+      path="build.cake",
+      configuration=self.configuration,
+      variant=None,
+      engine=self.configuration.engine,
+      task=None,
+      )
+
+  def tearDown(self):
+    Script._current.value = self.oldScript
+
+  def _getObjectArgs(self, compiler, forceInclude):
+    compiler.enabled = False # Don't build the pch.
+    pch = compiler._pch(
+      "obj/autopch-x.h",
+      "obj/autopch-x.cpp",
+      "/project/obj/autopch-x.h",
+      [],
+      forceInclude=forceInclude,
+      )
+    _, args, _ = compiler.getObjectCommands("obj/a.obj", "a.cpp", pch, False)
+    return args
+
+  def testDummy(self):
+    compiler = cake.library.compilers.dummy.DummyCompiler(self.configuration)
+    self.assertTrue("/FI/project/obj/autopch-x.h" in self._getObjectArgs(compiler, True))
+    self.assertFalse("/FI/project/obj/autopch-x.h" in self._getObjectArgs(compiler, False))
+
+  def testGcc(self):
+    from cake.library.compilers.gcc import GccCompiler
+    compiler = GccCompiler(self.configuration, gccExe="/usr/bin/gcc")
+    compiler.keepDependencyFile = True
+    args = self._getObjectArgs(compiler, True)
+    # Gcc finds obj/autopch-x.h.gch when including obj/autopch-x.h.
+    index = args.index("-include")
+    self.assertEqual(args[index + 1], "obj/autopch-x.h")
+
+  def testMsvc(self):
+    if not cake.system.isWindows():
+      self.skipTest("the MSVC compiler requires Windows")
+    from cake.library.compilers.msvc import MsvcCompiler
+    compiler = MsvcCompiler(
+      self.configuration,
+      clExe="cl.exe",
+      libExe="lib.exe",
+      linkExe="link.exe",
+      )
+    args = self._getObjectArgs(compiler, True)
+    self.assertTrue("/FI/project/obj/autopch-x.h" in args)
+    self.assertTrue("/Yu/project/obj/autopch-x.h" in args)
+    self.assertTrue("/Fpobj/autopch-x.h.pch" in args)
+    self.assertFalse("/FI/project/obj/autopch-x.h" in self._getObjectArgs(compiler, False))
+
+class MsvcDebugInfoTests(unittest.TestCase):
+
+  def setUp(self):
+    if not cake.system.isWindows():
+      self.skipTest("the MSVC compiler requires Windows")
+    from cake.library.compilers.msvc import MsvcCompiler
+    self.compiler = MsvcCompiler(
+      _createConfiguration(),
+      clExe="cl.exe",
+      libExe="lib.exe",
+      linkExe="link.exe",
+      )
+    self.compiler.debugSymbols = True
+    self.compiler.pdbFile = "build/foo.pdb"
+
+  def _getObjectCommands(self):
+    return self.compiler.getObjectCommands("obj/foo.obj", "src/foo.cpp", None, False)
+
+  def testSharedPdbIsSerialisedAndNotCached(self):
+    _, args, canBeCached = self._getObjectCommands()
+    self.assertTrue("/Zi" in args)
+    self.assertTrue("/Fdbuild/foo.pdb" in args)
+    self.assertFalse(canBeCached)
+
+  def testEmbeddedDebugInfoCanBeCached(self):
+    self.compiler.useEmbeddedDebugInfo = True
+    compile, args, canBeCached = self._getObjectCommands()
+    self.assertTrue("/Z7" in args)
+    self.assertFalse([a for a in args if a.startswith("/Fd")])
+    self.assertTrue(canBeCached)
+    self.assertEqual(compile.__name__, "compile")
+
+if __name__ == "__main__":
+  suite = unittest.TestSuite()
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(CloneTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(CloneBenchmarks))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(CacheEntryTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(IncrementalArchivingTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(SharedCompileTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ProcessLaunchTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(ZipToolTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(BulkCopyTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(SharedCompileBuildTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(PchCacheTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(AutoPchTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(AutoPchCommandTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(MsvcDebugInfoTests))
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
@@ -0,0 +1,30 @@
+"""Process Pool Unit Tests.
+"""
+
+import unittest
+import sys
+
+import cake.processpool
+
+class ProcessPoolTests(unittest.TestCase):
+
+  def testApply(self):
+    processPool = cake.processpool.ProcessPool(numWorkers=2)
+    try:
+      self.assertEqual(processPool.apply(abs, (-3,)), 3)
+    finally:
+      processPool._shutdown()
+
+  def testMap(self):
+    processPool = cake.processpool.ProcessPool(numWorkers=2)
+    try:
+      result = processPool.map(abs, [-i for i in xrange(50)])
+    finally:
+      processPool._shutdown()
+    
+    self.assertEqual(result, range(50))
+
+if __name__ == "__main__":
+  suite = unittest.TestLoader().loadTestsFromTestCase(ProcessPoolTests)
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
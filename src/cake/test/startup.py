@@ -0,0 +1,78 @@
+"""Startup Unit Tests.
+"""
+
+import unittest
+import os
+import os.path
+import subprocess
+import sys
+import time
+
+import cake
+
+srcDir = os.path.dirname(os.path.dirname(os.path.abspath(cake.__file__)))
+
+# Modules that are slow to import and shouldn't be needed until a build
+# actually uses them.
+_deferredModules = [
+  "multiprocessing",
+  "zipfile",
+  "json",
+  "cake.processpool",
+  "cake.toolcache",
+  "cake.zipping",
+  "cake.library.compilers",
+  ]
+
+def _runPython(args):
+  p = subprocess.Popen(
+    args=[sys.executable] + args,
+    cwd=srcDir,
+    stdout=subprocess.PIPE,
+    stderr=subprocess.STDOUT,
+    )
+  out = p.communicate()[0]
+  if p.returncode not in (0, 1):
+    raise AssertionError("python exited with %i:\n%s" % (p.returncode, out))
+  return out
+
+class StartupTests(unittest.TestCase):
+
+  def testDeferredImports(self):
+    out = _runPython([
+      "-c",
+      "import sys, cake.runner; sys.stdout.write('\\n'.join(sys.modules))",
+      ])
+    loadedModules = set(out.splitlines())
+    for name in _deferredModules:
+      self.assertFalse(name in loadedModules, "%s was imported" % name)
+
+class StartupBenchmarks(unittest.TestCase):
+  """Benchmarks of the time taken for Cake to start up.
+  """
+
+  def testStartupTime(self):
+    runScript = os.path.join(srcDir, "run.py")
+
+    def timeRun(args):
+      bestTime = None
+      for _ in xrange(3):
+        startTime = time.time()
+        _runPython(args)
+        elapsed = time.time() - startTime
+        if bestTime is None or elapsed < bestTime:
+          bestTime = elapsed
+      return bestTime
+
+    pythonTime = timeRun(["-c", "pass"])
+    cakeTime = timeRun([runScript, "--version"])
+
+    sys.stderr.write("python: %.0fms, cake: %.0fms ... " % (
+      pythonTime * 1000, cakeTime * 1000))
+
+if __name__ == "__main__":
+  suite = unittest.TestSuite()
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(StartupTests))
+  suite.addTests(unittest.TestLoader().loadTestsFromTestCase(StartupBenchmarks))
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
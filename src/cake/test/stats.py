@@ -0,0 +1,50 @@
+"""Statistics Unit Tests.
+"""
+
+import unittest
+import sys
+import threading
+
+import cake.stats
+
+class StatisticsTests(unittest.TestCase):
+
+  def testDefaultsToZero(self):
+    stats = cake.stats.Statistics()
+    self.assertEqual(stats.get("missing"), 0)
+    self.assertEqual(stats.getAll(), {})
+
+  def testAdd(self):
+    stats = cake.stats.Statistics()
+    stats.add("count")
+    stats.add("count")
+    stats.add("time", 1.5)
+    stats.add("time", 0.25)
+    self.assertEqual(stats.get("count"), 2)
+    self.assertEqual(stats.get("time"), 1.75)
+    self.assertEqual(stats.getAll(), {"count" : 2, "time" : 1.75})
+
+  def testDisabled(self):
+    stats = cake.stats.Statistics(enabled=False)
+    stats.add("count")
+    self.assertEqual(stats.getAll(), {})
+    stats.enabled = True
+    stats.add("count")
+    self.assertEqual(stats.get("count"), 1)
+
+  def testAddFromMultipleThreads(self):
+    stats = cake.stats.Statistics()
+    def job():
+      for _ in xrange(1000):
+        stats.add("count")
+    threads = [threading.Thread(target=job) for _ in xrange(8)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(stats.get("count"), 8000)
+
+if __name__ == "__main__":
+  suite = unittest.TestLoader().loadTestsFromTestCase(StatisticsTests)
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
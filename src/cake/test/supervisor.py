@@ -0,0 +1,135 @@
+"""Process Supervisor Unit Tests.
+"""
+
+import unittest
+import threading
+import sys
+import time
+
+from StringIO import StringIO
+
+import cake.supervisor
+
+_python = sys.executable
+
+class ProcessSupervisorTests(unittest.TestCase):
+
+  def setUp(self):
+    if not cake.supervisor.isAvailable():
+      self.skipTest("process supervisors are not supported")
+    self.supervisor = cake.supervisor.ProcessSupervisor(maximumProcesses=4)
+
+  def tearDown(self):
+    self.supervisor._shutdown()
+
+  def testRunAndWait(self):
+    result = self.supervisor.runAndWait([
+      _python,
+      "-c",
+      "import sys; sys.stdout.write('out'); sys.stderr.write('err'); sys.exit(3)",
+      ])
+    self.assertEqual(result.exitCode, 3)
+    self.assertEqual(result.stdout, "out")
+    self.assertEqual(result.stderr, "err")
+    self.assertEqual(result.error, None)
+    self.assertTrue(result.endTime >= result.startTime)
+
+  def testLargeOutput(self):
+    result = self.supervisor.runAndWait([
+      _python,
+      "-c",
+      "import sys; sys.stdout.write('x' * 1000000)",
+      ])
+    self.assertEqual(result.exitCode, 0)
+    self.assertEqual(len(result.stdout), 1000000)
+
+  def testLaunchFailure(self):
+    result = self.supervisor.runAndWait(["/nonexistent/program"])
+    self.assertEqual(result.exitCode, None)
+    self.assertTrue(isinstance(result.error, EnvironmentError))
+
+  def testInvalidArguments(self):
+    result = self.supervisor.runAndWait([_python, "-c", "pass"], notAnArgument=True)
+    self.assertEqual(result.exitCode, None)
+    self.assertTrue(isinstance(result.error, TypeError))
+
+    # The supervisor keeps running other processes.
+    result = self.supervisor.runAndWait([_python, "-c", "pass"])
+    self.assertEqual(result.exitCode, 0)
+
+  def testUnexpectedErrorFailsProcesses(self):
+    launch = self.supervisor._launch
+    launched = []
+    def failingLaunch(process):
+      launched.append(process)
+      if len(launched) > 1:
+        raise RuntimeError("unexpected")
+      return launch(process)
+    self.supervisor._launch = failingLaunch
+
+    results = []
+    finished = [threading.Event(), threading.Event()]
+    def callback(result):
+      results.append(result)
+      finished[len(results) - 1].set()
+
+    stderr = sys.stderr
+    sys.stderr = StringIO()
+    try:
+      startTime = time.time()
+      self.supervisor.run([_python, "-c", "import time; time.sleep(30)"], callback)
+      self.supervisor.run([_python, "-c", "pass"], callback)
+      for event in finished:
+        event.wait(10.0)
+      output = sys.stderr.getvalue()
+    finally:
+      sys.stderr = stderr
+
+    # The running process is killed rather than waited for.
+    self.assertTrue(time.time() - startTime < 10.0)
+    self.assertEqual(len(results), 2)
+    for result in results:
+      self.assertEqual(result.exitCode, None)
+      self.assertTrue(isinstance(result.error, EnvironmentError))
+    self.assertTrue("unexpected" in output)
+
+    # No more processes are accepted.
+    result = self.supervisor.runAndWait([_python, "-c", "pass"])
+    self.assertTrue(isinstance(result.error, EnvironmentError))
+
+  def testMaximumProcesses(self):
+    processCount = 12
+    results = []
+    s = threading.Semaphore(0)
+    def callback(result):
+      results.append(result)
+      s.release()
+
+    for i in xrange(processCount):
+      self.supervisor.run(
+        [_python, "-c", "import time; time.sleep(0.05); print %i" % i],
+        callback,
+        )
+    for _ in xrange(processCount):
+      s.acquire()
+
+    self.assertEqual(
+      sorted(int(r.stdout) for r in results),
+      range(processCount),
+      )
+    results.sort(key=lambda r: r.startTime)
+    for i in xrange(4, processCount):
+      # A process only starts once an earlier one has finished.
+      earlierEndTimes = [r.endTime for r in results[:i]]
+      finished = [t for t in earlierEndTimes if t <= results[i].startTime]
+      self.assertTrue(len(finished) >= i - 3)
+
+  def testRunAfterShutdown(self):
+    self.supervisor._shutdown()
+    result = self.supervisor.runAndWait([_python, "-c", "pass"])
+    self.assertTrue(isinstance(result.error, EnvironmentError))
+
+if __name__ == "__main__":
+  suite = unittest.TestLoader().loadTestsFromTestCase(ProcessSupervisorTests)
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
@@ -4,8 +4,10 @@
 import unittest
 import threading
 import sys
+import time
 
 import cake.task
+import cake.threadpool
 
 class TaskTests(unittest.TestCase):
 
@@ -459,6 +461,77 @@ class TaskTests(unittest.TestCase):
     self.assertTrue(ta.succeeded)
     self.assertEqual(ta.result, "b")
 
+class TaskGraphBenchmarks(unittest.TestCase):
+  """Microbenchmarks of fan-in and fan-out task graphs.
+
+  Each test checks the graph executes correctly and reports the time
+  taken to build and execute it.
+  """
+
+  edgeCount = 20000
+
+  def _report(self, name, startTime):
+    sys.stderr.write("%s (%i edges): %.3fs ... " % (
+      name, self.edgeCount, time.time() - startTime))
+
+  def testFanIn(self):
+    e = threading.Event()
+    result = []
+    threadPool = cake.threadpool.ThreadPool(numWorkers=4)
+
+    startTime = time.time()
+    tasks = [cake.task.Task() for _ in xrange(self.edgeCount)]
+    link = cake.task.Task(lambda: result.append(None))
+    link.addCallback(e.set)
+    link.startAfter(tasks, threadPool=threadPool)
+    for t in tasks:
+      t.start(threadPool=threadPool)
+    e.wait(30)
+    self._report("fan-in", startTime)
+
+    self.assertTrue(link.succeeded)
+    self.assertEqual(len(result), 1)
+
+  def testFanOut(self):
+    result = []
+    s = threading.Semaphore(0)
+    def f():
+      result.append(None)
+      s.release()
+    threadPool = cake.threadpool.ThreadPool(numWorkers=4)
+
+    startTime = time.time()
+    root = cake.task.Task()
+    tasks = [cake.task.Task(f) for _ in xrange(self.edgeCount)]
+    for t in tasks:
+      t.startAfter(root, threadPool=threadPool)
+    root.start(threadPool=threadPool)
+    for _ in xrange(self.edgeCount):
+      s.acquire()
+    self._report("fan-out", startTime)
+
+    self.assertEqual(len(result), self.edgeCount)
+    self.assertTrue(all(t.succeeded for t in tasks))
+
+  def testFanOutFanIn(self):
+    e = threading.Event()
+    threadPool = cake.threadpool.ThreadPool(numWorkers=4)
+
+    startTime = time.time()
+    root = cake.task.Task()
+    tasks = [cake.task.Task() for _ in xrange(self.edgeCount)]
+    for t in tasks:
+      t.lazyStartAfter(root, threadPool=threadPool)
+    root.lazyStart(threadPool=threadPool)
+    link = cake.task.Task()
+    link.addCallback(e.set)
+    link.startAfter(tasks, threadPool=threadPool)
+    e.wait(30)
+    self._report("fan-out/fan-in", startTime)
+
+    self.assertTrue(link.succeeded)
+    self.assertTrue(root.succeeded)
+
 if __name__ == "__main__":
   suite = unittest.TestLoader().loadTestsFromTestCase(TaskTests)
   runner = unittest.TextTestRunner(verbosity=2)
@@ -4,6 +4,7 @@
 import unittest
 import threading
 import sys
+import time
 
 import cake.threadpool
 
@@ -38,6 +39,32 @@ class ThreadPoolTests(unittest.TestCase):
     
     self.assertEqual(len(result), 50)
 
+  def testQueueJobsFront(self):
+    result = []
+    e = threading.Event()
+    
+    threadPool = cake.threadpool.ThreadPool(numWorkers=1)
+    # Block the only worker while jobs are queued.
+    threadPool.queueJob(e.wait)
+    s = threading.Semaphore(0)
+    def job(i):
+      result.append(i)
+      s.release()
+    threadPool.queueJobs([lambda: job(2), lambda: job(3)])
+    threadPool.queueJobs([lambda: job(0), lambda: job(1)], front=True)
+    e.set()
+    for _ in xrange(4):
+      s.acquire()
+    
+    self.assertEqual(result, [0, 1, 2, 3])
+
+  def testIdleTime(self):
+    threadPool = cake.threadpool.ThreadPool(numWorkers=2)
+    time.sleep(0.1)
+    idleTime = threadPool.idleTime
+    self.assertTrue(idleTime >= 0.15, idleTime)
+    self.assertTrue(threadPool.idleTime >= idleTime)
+
 if __name__ == "__main__":
   suite = unittest.TestLoader().loadTestsFromTestCase(ThreadPoolTests)
   runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,76 @@
+"""Toolchain Cache Unit Tests.
+"""
+
+import unittest
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+
+import cake.filesys
+import cake.toolcache
+
+class ToolCacheTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+    self.exePath = os.path.join(self.tempDir, "gcc")
+    cake.filesys.writeFile(self.exePath, "v1")
+    self.calls = 0
+    self._resetCache(os.path.join(self.tempDir, "toolchains.cache"))
+
+  def tearDown(self):
+    self._resetCache(None)
+    shutil.rmtree(self.tempDir)
+
+  def _resetCache(self, cachePath):
+    cake.toolcache.cachePath = cachePath
+    cake.toolcache._entries = None
+    cake.toolcache._modified = False
+
+  def _query(self):
+    self.calls += 1
+    return [4, 8, self.calls]
+
+  def _cached(self):
+    return cake.toolcache.cached(
+      ("gccVersion", self.exePath),
+      self._query,
+      files=[self.exePath],
+      environment=["CAKE_TEST_TOOLCACHE"],
+      )
+
+  def testCached(self):
+    self.assertEqual(self._cached(), [4, 8, 1])
+    self.assertEqual(self._cached(), [4, 8, 1])
+    self.assertEqual(self.calls, 1)
+
+    # Results are copied so callers may modify them.
+    self._cached().append(0)
+    self.assertEqual(self._cached(), [4, 8, 1])
+
+  def testInvalidatedByFileChange(self):
+    self._cached()
+    cake.filesys.writeFile(self.exePath, "version2")
+    self.assertEqual(self._cached(), [4, 8, 2])
+
+  def testInvalidatedByEnvironmentChange(self):
+    self._cached()
+    os.environ["CAKE_TEST_TOOLCACHE"] = "1"
+    try:
+      self.assertEqual(self._cached(), [4, 8, 2])
+    finally:
+      del os.environ["CAKE_TEST_TOOLCACHE"]
+
+  def testSaveAndLoad(self):
+    self._cached()
+    cake.toolcache.save()
+    self._resetCache(cake.toolcache.cachePath)
+    self.assertEqual(self._cached(), [4, 8, 1])
+    self.assertEqual(self.calls, 1)
+
+if __name__ == "__main__":
+  suite = unittest.TestLoader().loadTestsFromTestCase(ToolCacheTests)
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
@@ -0,0 +1,103 @@
+"""Zipping Unit Tests.
+"""
+
+import unittest
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import zipfile
+
+import cake.zipping
+
+class ZippingTests(unittest.TestCase):
+
+  def setUp(self):
+    self.tempDir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempDir)
+
+  def testExtractFile(self):
+    zipPath = os.path.join(self.tempDir, "test.zip")
+    data = "".join("line %i\n" % i for i in xrange(10000))
+    zipFile = zipfile.ZipFile(zipPath, "w", zipfile.ZIP_DEFLATED)
+    try:
+      zipFile.writestr("dir/file.txt", data)
+    finally:
+      zipFile.close()
+
+    targetPath = os.path.join(self.tempDir, "out", "dir", "file.txt")
+    zipFile = zipfile.ZipFile(zipPath, "r")
+    try:
+      cake.zipping.extractFile(
+        zipFile,
+        zipFile.getinfo("dir/file.txt"),
+        targetPath,
+        blockSize=1024,
+        )
+    finally:
+      zipFile.close()
+
+    f = open(targetPath, "rb")
+    try:
+      self.assertEqual(f.read(), data)
+    finally:
+      f.close()
+
+  def testCompressAndCopyMembers(self):
+    sourcePath = os.path.join(self.tempDir, "source.txt")
+    data = "".join("line %i\n" % i for i in xrange(10000))
+    f = open(sourcePath, "wb")
+    try:
+      f.write(data)
+    finally:
+      f.close()
+
+    firstPath = os.path.join(self.tempDir, "first.zip")
+    zipFile = zipfile.ZipFile(firstPath, "w")
+    try:
+      cake.zipping.writeFileToZip(zipFile, sourcePath, "dir\\first.txt")
+      zipInfo, compressed = cake.zipping.compressMember(
+        sourcePath,
+        "second.txt",
+        blockSize=1024,
+        )
+      try:
+        cake.zipping.writeMember(zipFile, zipInfo, compressed)
+      finally:
+        compressed.close()
+    finally:
+      zipFile.close()
+
+    secondPath = os.path.join(self.tempDir, "second.zip")
+    sourceZipFile = zipfile.ZipFile(firstPath, "r")
+    try:
+      zipFile = zipfile.ZipFile(secondPath, "w")
+      try:
+        cake.zipping.copyMember(
+          zipFile,
+          sourceZipFile,
+          sourceZipFile.getinfo("second.txt"),
+          )
+      finally:
+        zipFile.close()
+
+      self.assertEqual(sourceZipFile.testzip(), None)
+      self.assertEqual(sourceZipFile.read("dir/first.txt"), data)
+    finally:
+      sourceZipFile.close()
+
+    zipFile = zipfile.ZipFile(secondPath, "r")
+    try:
+      self.assertEqual(zipFile.namelist(), ["second.txt"])
+      self.assertEqual(zipFile.testzip(), None)
+      self.assertEqual(zipFile.read("second.txt"), data)
+    finally:
+      zipFile.close()
+
+if __name__ == "__main__":
+  suite = unittest.TestLoader().loadTestsFromTestCase(ZippingTests)
+  runner = unittest.TextTestRunner(verbosity=2)
+  sys.exit(not runner.run(suite).wasSuccessful())
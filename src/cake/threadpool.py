@@ -10,8 +10,8 @@ in parallel on separate threads.
 
 import threading
 import os
+import time
 import sys
-import platform
 import traceback
 import atexit
 import collections
@@ -38,6 +38,13 @@ if cake.system.isWindows():
         return 1
 else:
   def getProcessorCount():
+    # Prefer sysconf() to avoid the cost of importing multiprocessing.
+    try:
+      count = os.sysconf("SC_NPROCESSORS_ONLN")
+      if count > 0:
+        return count
+    except (AttributeError, ValueError, OSError):
+      pass
     try:
       import multiprocessing
       return multiprocessing.cpu_count()
@@ -62,6 +69,9 @@ class ThreadPool(object):
     self._workers = []
     self._wakeCondition = threading.Condition(threading.Lock())
     self._finished = False
+    self._idleWorkers = 0
+    self._idleTime = 0.0
+    self._idleTimeUpdated = time.time()
 
     # Create the worker threads.
     for _ in xrange(numWorkers):
@@ -79,12 +89,12 @@ class ThreadPool(object):
     On shutdown we complete any currently executing jobs then exit. Jobs
     waiting on the queue may not be executed.
     """
-    # Signal that we've finished.
-    self._finished = True
-    
-    # Clear the queue and wake any waiting threads.
+    # Signal that we've finished, clear the queue and wake any waiting
+    # threads. The flag is set under the lock so that a thread about to
+    # wait either sees it or is woken by the notify.
     self._wakeCondition.acquire()
     try:
+      self._finished = True
       self._jobQueue.clear()
       self._wakeCondition.notifyAll()
     finally:      
@@ -102,6 +112,30 @@ class ThreadPool(object):
     @rtype: int
     """
     return len(self._workers)
+
+  @property
+  def idleTime(self):
+    """Returns the total time worker threads have spent waiting for jobs.
+    
+    @return: The sum of the time, in seconds, that each worker thread has
+    spent idle since the thread pool was created.
+    @rtype: float
+    """
+    self._wakeCondition.acquire()
+    try:
+      self._updateIdleTime()
+      return self._idleTime
+    finally:
+      self._wakeCondition.release()
+
+  def _updateIdleTime(self):
+    """Accumulate the idle time of the waiting workers.
+    
+    Must be called with the wake condition's lock held.
+    """
+    now = time.time()
+    self._idleTime += self._idleWorkers * (now - self._idleTimeUpdated)
+    self._idleTimeUpdated = now
   
   def queueJob(self, callable, front=False):
     """Queue a new job to be executed by the thread pool.
@@ -124,19 +158,52 @@ class ThreadPool(object):
           self._jobQueue.append(callable)
         if wasEmpty:
           self._wakeCondition.notifyAll()
-    finally:      
+    finally:
       self._wakeCondition.release()
-      
+
+  def queueJobs(self, callables, front=False):
+    """Queue a batch of jobs to be executed by the thread pool.
+
+    This is cheaper than calling queueJob() for each job as the queue
+    lock is only acquired once.
+
+    @param callables: The jobs to queue.
+    @type callables: list of any callable
+
+    @param front: If True then put the jobs at the front of the
+    thread pool's job queue (preserving their order), otherwise append
+    them to the end of the job queue.
+    @type front: boolean
+    """
+    self._wakeCondition.acquire()
+    try:
+      if not self._finished: # Don't add jobs if we've shutdown.
+        wasEmpty = len(self._jobQueue) == 0
+        if front:
+          self._jobQueue.extendleft(reversed(callables))
+        else:
+          self._jobQueue.extend(callables)
+        if wasEmpty:
+          self._wakeCondition.notifyAll()
+    finally:
+      self._wakeCondition.release()
+
   def _runThread(self):
     """Process jobs continuously until dismissed.
     """
     while not self._finished:
       self._wakeCondition.acquire()
       try:
+        if self._finished:
+          break # Shutdown while we weren't holding the lock.
         try:
           job = self._jobQueue.popleft()
         except IndexError:
+          self._updateIdleTime()
+          self._idleWorkers += 1
           self._wakeCondition.wait() # No more jobs. Sleep until another is pushed.
+          self._updateIdleTime()
+          self._idleWorkers -= 1
           continue
       finally:
         self._wakeCondition.release()
@@ -0,0 +1,147 @@
+"""Toolchain Discovery Cache.
+
+Caches the results of probing for compilers and SDKs, eg. running
+'gcc -dumpversion' or 'vswhere', so that configuration scripts don't
+repeat the probes every time they are run. A cached result is reused
+for as long as the files and environment variables it was found from
+are unchanged.
+
+Usage::
+  import cake.toolcache
+  cake.toolcache.cachePath = configuration.abspath("build/toolchains.cache")
+
+@see: Cake Build System (http://sourceforge.net/projects/cake-build)
+@copyright: Copyright (c) 2010 Lewis Baker, Stuart McMahon.
+@license: Licensed under the MIT license.
+"""
+
+import copy
+import os
+import threading
+
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+
+import cake.filesys
+
+cachePath = None
+"""Path to the toolchain cache file.
+
+The absolute path of a file used to store discovery results between
+builds. If None results are only cached for the lifetime of the process.
+@type: string or None
+"""
+
+# Version of the cache file format.
+_version = 1
+
+_lock = threading.Lock()
+_entries = None
+_modified = False
+
+def getFileSignature(path):
+  """Get a signature that changes when a file or directory changes.
+
+  @param path: The path of the file or directory.
+  @type path: string
+
+  @return: A tuple of the path, modification time and size. The time
+  and size are None if the path doesn't exist.
+  @rtype: tuple
+  """
+  try:
+    stat = os.stat(path)
+  except EnvironmentError:
+    return (path, None, None)
+  return (path, stat.st_mtime, stat.st_size)
+
+def cached(key, func, files=[], environment=[]):
+  """Return the result of a discovery function, reusing a cached result
+  if one is still valid.
+
+  Exceptions raised by the function are not cached.
+
+  @param key: A picklable value that identifies the query, eg.
+  ("gccVersion", gccExe).
+  @type key: any hashable
+
+  @param func: A callable taking no arguments that performs the query.
+  Its result must be picklable.
+  @type func: any callable
+
+  @param files: Paths of files or directories whose modification time
+  or size changing should cause the query to be run again.
+  @type files: list of string
+
+  @param environment: Names of environment variables whose value
+  changing should cause the query to be run again.
+  @type environment: list of string
+
+  @return: A copy of the result of calling func.
+  """
+  global _modified
+
+  signature = (
+    tuple(getFileSignature(p) for p in files),
+    tuple(os.environ.get(n) for n in environment),
+    )
+
+  entries = _getEntries()
+  entry = entries.get(key, None)
+  if entry is None or entry[0] != signature:
+    result = func()
+    _lock.acquire()
+    try:
+      entries[key] = (signature, result)
+      _modified = True
+    finally:
+      _lock.release()
+  else:
+    result = entry[1]
+
+  return copy.deepcopy(result)
+
+def _getEntries():
+  global _entries
+
+  _lock.acquire()
+  try:
+    if _entries is None:
+      _entries = _load()
+    return _entries
+  finally:
+    _lock.release()
+
+def _load():
+  if cachePath is None:
+    return {}
+  try:
+    version, entries = pickle.loads(cake.filesys.readFile(cachePath))
+  except Exception:
+    return {} # Missing or corrupt, start again.
+  if version != _version:
+    return {}
+  return entries
+
+def save():
+  """Save discovery results to the toolchain cache file.
+
+  Does nothing if L{cachePath} is None or nothing new was discovered
+  since the cache was loaded.
+
+  @raise EnvironmentError: If the cache file could not be written.
+  """
+  global _modified
+
+  _lock.acquire()
+  try:
+    if cachePath is None or not _modified:
+      return
+    cacheString = pickle.dumps((_version, _entries), pickle.HIGHEST_PROTOCOL)
+    _modified = False
+  finally:
+    _lock.release()
+
+  cake.filesys.writeFile(cachePath, cacheString)
@@ -8,6 +8,10 @@
 import cake.filesys
 import os
 import os.path
+import shutil
+import struct
+import sys
+import tempfile
 import time
 import zipfile
 import zlib
@@ -62,6 +66,29 @@ def findFilesToCompress(sourcePath, includeMatch=None):
     
   return toZip
 
+def extractFile(zipFile, zipInfo, targetPath, blockSize=1024 * 1024):
+  """Extract a file from a zip without reading it all into memory.
+  
+  @param zipFile: The zip file object to read from.
+  @type zipFile: zipfile.ZipFile
+  @param zipInfo: The ZipInfo of the file to extract.
+  @type zipInfo: zipfile.ZipInfo
+  @param targetPath: The path of the file to write.
+  @type targetPath: string
+  @param blockSize: The number of bytes to decompress at a time.
+  @type blockSize: int
+  """
+  cake.filesys.makeDirs(os.path.dirname(targetPath))
+  source = zipFile.open(zipInfo)
+  try:
+    target = open(targetPath, "wb")
+    try:
+      shutil.copyfileobj(source, target, blockSize)
+    finally:
+      target.close()
+  finally:
+    source.close()
+
 def isDirectoryInfo(zipInfo):
   """Determine whether a ZipInfo structure corresponds to a directory.
   
@@ -73,38 +100,200 @@ def isDirectoryInfo(zipInfo):
   """
   return (zipInfo.external_attr & 0x00000010L) != 0L # FILE_ATTRIBUTE_DIRECTORY
 
-def writeFileToZip(zipFile, sourcePath, targetPath):
-  """Write a source file or directory to a zip.
+# Writing already compressed data to a zip relies on ZipFile internals
+# (fp, _writecheck() and _didModify) that are only known to be present
+# in these versions of Python. Other versions fall back on writestr().
+_canWriteRaw = (
+  sys.version_info[:2] in [(2, 6), (2, 7)] and
+  hasattr(zipfile.ZipFile, "_writecheck")
+  )
+
+def compressMember(sourcePath, targetPath, blockSize=1024 * 1024):
+  """Compress a source file or directory ready to be written to a zip.
+
+  The file is read and compressed a block at a time. The compressed data
+  is held in memory if it is small, otherwise it is written to a
+  temporary file.
   
-  @param zipFile: The zip file object to write to.
-  @type zipFile: zipfile.ZipFile
   @param sourcePath: The path to the source file or directory.
   @type sourcePath: string
   @param targetPath: The target path within the zip.
-  @param targetPath: string 
+  @type targetPath: string
+  @param blockSize: The number of bytes to compress at a time.
+  @type blockSize: int
+
+  @return: A tuple of the ZipInfo describing the member and a file
+  object containing its compressed data. The caller should close the
+  file object when it is no longer needed.
+  @rtype: tuple(zipfile.ZipInfo, file)
   """
   targetPath = targetPath.replace("\\", "/") # Zips use forward slashes
   utcTime = time.gmtime(os.stat(sourcePath).st_mtime)
-  
-  if os.path.isdir(sourcePath):
+  isDir = os.path.isdir(sourcePath)
+
+  if isDir:
     if not targetPath.endswith("/"):
       targetPath += "/" # Trailing slash denotes directory for some zip packages
 
     zi = zipfile.ZipInfo(targetPath, utcTime[0:6])
-    zi.compress_type = zipfile.ZIP_DEFLATED
     zi.external_attr = 0x00000010L # FILE_ATTRIBUTE_DIRECTORY
-    zipFile.writestr(zi, "")
-  else:  
-    f = open(sourcePath, "rb")
-    try:
-      data = f.read()
-    finally:
-      f.close()
-    
+  else:
     zi = zipfile.ZipInfo(targetPath, utcTime[0:6])
-    zi.compress_type = zipfile.ZIP_DEFLATED
     zi.external_attr = 0x00000020L # FILE_ATTRIBUTE_ARCHIVE
-    zipFile.writestr(zi, data)
+  zi.compress_type = zipfile.ZIP_DEFLATED
+
+  compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+  data = tempfile.SpooledTemporaryFile(max_size=blockSize)
+  try:
+    crc = 0
+    fileSize = 0
+    if not isDir:
+      f = open(sourcePath, "rb")
+      try:
+        block = f.read(blockSize)
+        while block:
+          fileSize += len(block)
+          crc = zlib.crc32(block, crc)
+          data.write(compressor.compress(block))
+          block = f.read(blockSize)
+      finally:
+        f.close()
+    data.write(compressor.flush())
+
+    zi.file_size = fileSize
+    zi.CRC = crc & 0xffffffff
+    zi.compress_size = data.tell()
+    data.seek(0)
+  except:
+    data.close()
+    raise
+
+  return zi, data
+
+def _copyData(source, target, size, blockSize=1024 * 1024):
+  """Copy a number of bytes from one file object to another.
+  """
+  while size > 0:
+    block = source.read(min(size, blockSize))
+    if not block:
+      raise zipfile.BadZipfile("Truncated file data")
+    target.write(block)
+    size -= len(block)
+
+def writeMember(zipFile, zipInfo, data):
+  """Write an already compressed member to a zip.
+
+  @param zipFile: The zip file object to write to.
+  @type zipFile: zipfile.ZipFile
+  @param zipInfo: The ZipInfo describing the member. Its compressed
+  size, uncompressed size and CRC must be filled in.
+  @type zipInfo: zipfile.ZipInfo
+  @param data: A file object positioned at the start of the member's
+  compressed data.
+  @type data: file
+  """
+  if not _canWriteRaw:
+    _writeMemberData(zipFile, zipInfo, data.read(zipInfo.compress_size))
+    return
+
+  # The sizes are known up front so they are written to the local header
+  # rather than a data descriptor following the data.
+  zipInfo.flag_bits &= ~0x08
+  zipInfo.header_offset = zipFile.fp.tell()
+  zipFile._writecheck(zipInfo)
+  zipFile._didModify = True
+  zipFile.fp.write(zipInfo.FileHeader())
+  _copyData(data, zipFile.fp, zipInfo.compress_size)
+  zipFile.filelist.append(zipInfo)
+  zipFile.NameToInfo[zipInfo.filename] = zipInfo
+
+def _writeMemberData(zipFile, zipInfo, data):
+  """Write a member's compressed data to a zip using only the public
+  ZipFile interface.
+
+  The data is decompressed and compressed again by ZipFile.writestr().
+  """
+  if zipInfo.compress_type == zipfile.ZIP_DEFLATED:
+    try:
+      data = zlib.decompress(data, -15)
+    except zlib.error, e:
+      raise zipfile.BadZipfile(str(e))
+  elif zipInfo.compress_type != zipfile.ZIP_STORED:
+    raise zipfile.BadZipfile(
+      "Unsupported compression method %i" % zipInfo.compress_type
+      )
+  zipFile.writestr(zipInfo, data)
+
+def _stripZip64Extra(extra):
+  """Remove any Zip64 extra field, as it is rewritten when needed.
+  """
+  fields = []
+  i = 0
+  while i + 4 <= len(extra):
+    fieldId, fieldLength = struct.unpack("<HH", extra[i:i + 4])
+    if fieldId != 0x0001:
+      fields.append(extra[i:i + 4 + fieldLength])
+    i += 4 + fieldLength
+  return "".join(fields)
+
+def copyMember(zipFile, sourceZipFile, zipInfo):
+  """Copy a member from one zip to another without recompressing it.
+
+  @param zipFile: The zip file object to write to.
+  @type zipFile: zipfile.ZipFile
+  @param sourceZipFile: The zip file object to copy from.
+  @type sourceZipFile: zipfile.ZipFile
+  @param zipInfo: The ZipInfo of the member in the source zip.
+  @type zipInfo: zipfile.ZipInfo
+  """
+  if not _canWriteRaw:
+    zi = zipfile.ZipInfo(zipInfo.filename, zipInfo.date_time)
+    zi.compress_type = zipInfo.compress_type
+    zi.comment = zipInfo.comment
+    zi.external_attr = zipInfo.external_attr
+    zipFile.writestr(zi, sourceZipFile.read(zipInfo))
+    return
+
+  # Skip over the local header to the compressed data.
+  fp = sourceZipFile.fp
+  fp.seek(zipInfo.header_offset)
+  header = fp.read(zipfile.sizeFileHeader)
+  if len(header) != zipfile.sizeFileHeader or \
+    header[0:4] != zipfile.stringFileHeader:
+    raise zipfile.BadZipfile("Bad magic number for file header")
+  nameLength, extraLength = struct.unpack("<HH", header[26:30])
+  fp.seek(nameLength + extraLength, 1)
+
+  zi = zipfile.ZipInfo(zipInfo.filename, zipInfo.date_time)
+  zi.compress_type = zipInfo.compress_type
+  zi.comment = zipInfo.comment
+  zi.extra = _stripZip64Extra(zipInfo.extra)
+  zi.create_system = zipInfo.create_system
+  zi.create_version = zipInfo.create_version
+  zi.extract_version = zipInfo.extract_version
+  zi.flag_bits = zipInfo.flag_bits
+  zi.internal_attr = zipInfo.internal_attr
+  zi.external_attr = zipInfo.external_attr
+  zi.CRC = zipInfo.CRC
+  zi.compress_size = zipInfo.compress_size
+  zi.file_size = zipInfo.file_size
+  writeMember(zipFile, zi, fp)
+
+def writeFileToZip(zipFile, sourcePath, targetPath):
+  """Write a source file or directory to a zip.
+  
+  @param zipFile: The zip file object to write to.
+  @type zipFile: zipfile.ZipFile
+  @param sourcePath: The path to the source file or directory.
+  @type sourcePath: string
+  @param targetPath: The target path within the zip.
+  @param targetPath: string 
+  """
+  zipInfo, data = compressMember(sourcePath, targetPath)
+  try:
+    writeMember(zipFile, zipInfo, data)
+  finally:
+    data.close()
     
 def zipFiles(sourcePath, targetZip):
   """Zip a file or the contents of a directory.
@@ -122,7 +311,7 @@ def zipFiles(sourcePath, targetZip):
   cake.filesys.makeDirs(os.path.dirname(targetZip))
   f = open(targetZip, "wb")
   try:
-    zipFile = zipfile.ZipFile(f, "w")
+    zipFile = zipfile.ZipFile(f, "w", allowZip64=True)
     for originalPath in toZip.itervalues():
       sourceFilePath = os.path.join(sourcePath, originalPath)
       writeFileToZip(zipFile, sourceFilePath, originalPath)